@@ -0,0 +1,44 @@
+POLL_KINDS = ("status", "signal", "network", "sms")
+
+
+class AdaptiveInterval:
+    # Période d'une scrutation, bornée par [minimum, maximum]. Un changement
+    # observé (champ publié, SMS reçu) la ramène au minimum ; chaque relevé
+    # sans changement l'allonge du facteur `backoff`. Un routeur plus lent
+    # que la latence cible étire la période d'autant (facteur de latence),
+    # sans dépasser le maximum.
+    def __init__(self, minimum, maximum, backoff=1.5):
+        if minimum <= 0 or maximum < minimum:
+            raise ValueError(f"Bornes de scrutation invalides : {minimum}:{maximum}")
+        self.minimum = minimum
+        self.maximum = maximum
+        self.backoff = max(1.0, backoff)
+        self.base = minimum
+        self.interval = minimum
+
+    def update(self, changed, latency_factor=1.0):
+        if changed:
+            self.base = self.minimum
+        else:
+            self.base = min(self.maximum, self.base * self.backoff)
+        self.interval = round(min(self.maximum, max(self.minimum, self.base * latency_factor)), 3)
+        return self.interval
+
+
+class LatencyAverage:
+    # Moyenne mobile exponentielle de la durée des requêtes au routeur
+    def __init__(self, alpha=0.2):
+        self.alpha = alpha
+        self.value = None
+
+    def observe(self, duration):
+        if self.value is None:
+            self.value = duration
+        else:
+            self.value += self.alpha * (duration - self.value)
+
+    def factor(self, target):
+        # >= 1 : rapport entre la latence observée et la latence cible
+        if not self.value or target <= 0:
+            return 1.0
+        return max(1.0, self.value / target)
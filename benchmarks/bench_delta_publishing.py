@@ -0,0 +1,106 @@
+import argparse
+import os
+import random
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Trafic MQTT généré par les publications statut/signal/réseau sur une journée
+# simulée : ancienne comparaison du dictionnaire complet contre la publication
+# champ par champ (champs volatils exclus, bandes mortes), selon le mode
+# d'instantané. Aucun routeur n'est interrogé : les valeurs sont synthétiques.
+
+STATUS = {"ConnectionStatus": "901", "SignalIcon": "4", "CurrentNetworkType": "19",
+          "RoamingStatus": "0", "SimStatus": "1", "ServiceStatus": "2"}
+NETWORK = {"DeviceName": "E3372h-320", "Imei": "860000000000000", "workmode": "LTE",
+           "Mccmnc": "20801", "SoftwareVersion": "11.0.1.1(H697SP1C983)"}
+
+
+class CountingMQTTClient:
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.messages += 1
+        self.bytes += len(topic) + len(str(payload or ""))
+
+
+def samples(polls, interval, seed=7):
+    rng = random.Random(seed)
+    rsrp = -95.0
+    for poll in range(polls):
+        # Dérive lente du signal + bruit de mesure de ±2 dB
+        rsrp = max(-120.0, min(-75.0, rsrp + rng.uniform(-0.3, 0.3)))
+        signal = {
+            "rsrp": f"{round(rsrp + rng.uniform(-2, 2))}dBm",
+            "rsrq": f"{round(-10 + rng.uniform(-1.5, 1.5), 1)}dB",
+            "rssi": f"{round(rsrp + 30 + rng.uniform(-2, 2))}dBm",
+            "sinr": f"{round(8 + rng.uniform(-2, 2))}dB",
+            "cell_id": "12345678" if poll < polls // 2 else "12345699",
+            "pci": "123", "ecio": None, "mode": "7",
+        }
+        status = dict(STATUS, SignalIcon=str(4 if rsrp > -100 else 3))
+        network = dict(NETWORK, uptime=str(poll * interval))
+        yield poll * interval, status, signal, network
+
+
+def legacy(polls, interval):
+    client = CountingMQTTClient()
+    previous = {}
+    for _, *blocks in samples(polls, interval):
+        for kind, values in zip(("status", "signal", "network"), blocks):
+            if values != previous.get(kind):
+                previous[kind] = values
+                client.publish(f"hilinksms/{kind}", repr(values))
+    return client
+
+
+def delta(polls, interval, field_topics, snapshot_mode, snapshot_interval):
+    os.environ.update({
+        "MQTT_TOPIC": "hilinksms", "MQTT_IP": "127.0.0.1", "CLIENTID": "bench",
+        "MQTT_ACCOUNT": "bench", "MQTT_PASSWORD": "bench", "DEBUG_LEVEL": "ERROR",
+        "HUAWEI_ROUTER_IP_ADDRESS": "127.0.0.1:1", "STATE_DIR": tempfile.mkdtemp(prefix="bench_delta_"),
+        "PUBLISH_FIELD_TOPICS": str(field_topics), "SNAPSHOT_MODE": snapshot_mode,
+        "SNAPSHOT_INTERVAL": str(snapshot_interval),
+    })
+    from huawei_sms_mqtt_bridge import HuaweiSMSMQTTBridge
+
+    bridge = HuaweiSMSMQTTBridge()
+    bridge.mqtt_client = client = CountingMQTTClient()
+    router = bridge.routers[0]
+    now = [0.0]
+    trackers = (router.status_tracker, router.signal_tracker, router.network_tracker)
+    for tracker in trackers:
+        tracker.clock = lambda: now[0]
+    for timestamp, *blocks in samples(polls, interval):
+        now[0] = timestamp
+        for kind, tracker, values in zip(("status", "signal", "network"), trackers, blocks):
+            router.publish_changes(kind, tracker, values)
+    router.close()
+    return client
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Trafic MQTT des publications de statut")
+    parser.add_argument("--hours", type=float, default=24)
+    parser.add_argument("--interval", type=int, default=60, help="CHECK_INTERVAL simulé (secondes)")
+    args = parser.parse_args()
+
+    polls = int(args.hours * 3600 / args.interval)
+    baseline = legacy(polls, args.interval)
+    print(f"{polls} scrutations de statut, signal et réseau")
+    print(f"{'mode':<40} {'messages':>9} {'octets':>10} {'vs ancien':>10}")
+    print(f"{'ancien (dictionnaire complet)':<40} {baseline.messages:>9} {baseline.bytes:>10} {'1.00x':>10}")
+    for label, options in (
+            ("champs + instantané à chaque changement", (True, "change", 900)),
+            ("champs + instantané toutes les 15 min", (True, "interval", 900)),
+            ("champs seuls", (True, "off", 900)),
+            ("instantané à chaque changement seul", (False, "change", 900))):
+        client = delta(polls, args.interval, *options)
+        print(f"{label:<40} {client.messages:>9} {client.bytes:>10} {client.bytes / baseline.bytes:>9.2f}x")
+
+
+if __name__ == "__main__":
+    main()
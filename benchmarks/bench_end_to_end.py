@@ -0,0 +1,313 @@
+import argparse
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_hilink import FakeHiLinkServer  # noqa: E402
+from fake_mqtt import CORRELATION_DATA, MESSAGE_EXPIRY, RESPONSE_TOPIC, FakeMQTTBroker  # noqa: E402
+
+# Banc de mesure de bout en bout, sans matériel : le bridge tourne tel quel
+# dans un processus fils, face à un routeur HiLink émulé et à un broker MQTT
+# minimal exécutés ici. Mesure la latence SMS reçu -> publication MQTT, le
+# débit et la latence d'envoi (demande MQTT -> envoi par le routeur, puis
+# accusé de réception avec --delivery), le nombre de requêtes par endpoint et le CPU/RSS du bridge.
+
+BRIDGE = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "huawei_sms_mqtt_bridge.py")
+PREFIX = "bench"
+REPLY_TOPIC = "bench-client/replies"
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class ProcessSampler(threading.Thread):
+    # CPU et mémoire d'un processus fils lus dans /proc (Linux)
+    def __init__(self, pid, period=0.2):
+        super().__init__(daemon=True)
+        self.pid = pid
+        self.period = period
+        self.ticks = os.sysconf("SC_CLK_TCK")
+        self.stopped = threading.Event()
+        self.cpu = 0.0
+        self.rss_kib = 0
+        self.peak_rss_kib = 0
+
+    def sample(self):
+        try:
+            with open(f"/proc/{self.pid}/stat") as stat:
+                fields = stat.read().rsplit(")", 1)[1].split()
+            self.cpu = (int(fields[11]) + int(fields[12])) / self.ticks
+            with open(f"/proc/{self.pid}/status") as status:
+                for line in status:
+                    if line.startswith("VmRSS:"):
+                        self.rss_kib = int(line.split()[1])
+                    elif line.startswith("VmHWM:"):
+                        self.peak_rss_kib = int(line.split()[1])
+        except (OSError, IndexError, ValueError):
+            pass
+
+    def run(self):
+        while not self.stopped.wait(self.period):
+            self.sample()
+
+    def stop(self):
+        self.sample()
+        self.stopped.set()
+
+
+class Recorder:
+    # Publications du bridge observées sur le broker
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.injected = {}
+        self.received = {}
+        self.duplicates = 0
+        self.sent = []
+        # Destinataire -> instant de la demande d'envoi, puis de son envoi
+        self.requested = {}
+        self.sent_at = {}
+        self.failed = 0
+        self.expired = 0
+        # Suivi des envois (--delivery) : état -> nombre, destinataire -> accusé
+        self.delivery = {}
+        self.delivered_at = {}
+        # Réponses MQTT v5 : données de corrélation -> états reçus
+        self.replies = {}
+
+    def __call__(self, timestamp, topic, payload, properties):
+        if topic == f"{PREFIX}/received":
+            message = json.loads(payload).get("message", "")
+            if message.startswith("bench-in "):
+                with self.lock:
+                    if message in self.received:
+                        self.duplicates += 1
+                    else:
+                        self.received[message] = timestamp
+        elif topic == f"{PREFIX}/sent":
+            result = json.loads(payload)
+            with self.lock:
+                if result.get("status") == "success":
+                    self.sent.append(timestamp)
+                    self.sent_at.setdefault(result.get("recipient"), timestamp)
+                elif result.get("state") == "failed":
+                    self.failed += 1
+                elif result.get("state") == "expired":
+                    self.expired += 1
+        elif topic == f"{PREFIX}/delivery":
+            result = json.loads(payload)
+            with self.lock:
+                self.delivery[result["state"]] = self.delivery.get(result["state"], 0) + 1
+                if result["state"] == "delivered":
+                    self.delivered_at.setdefault(result["recipient"], timestamp)
+        elif topic == REPLY_TOPIC:
+            with self.lock:
+                self.replies.setdefault(properties.get(CORRELATION_DATA), []).append(json.loads(payload).get("state"))
+
+    def latencies(self):
+        with self.lock:
+            return [self.received[key] - injected for key, injected in self.injected.items() if key in self.received]
+
+    def send_latencies(self, completed=None):
+        with self.lock:
+            completed = self.sent_at if completed is None else completed
+            return [completed[number] - requested for number, requested in self.requested.items()
+                    if number in completed]
+
+    def delivery_final(self):
+        with self.lock:
+            return sum(count for state, count in self.delivery.items() if state != "submitted")
+
+
+def inject_inbound(state, recorder, count, rate, stop):
+    for number in range(count):
+        if stop.wait(1 / rate if number else 0):
+            return
+        content = f"bench-in {number}"
+        with recorder.lock:
+            recorder.injected[content] = time.monotonic()
+        state.add_sms("+33698765432", content)
+
+
+def run(args):
+    router = FakeHiLinkServer(latency=args.latency, inbox_size=args.inbox_size, batch_read=not args.no_batch_read,
+                              error_rate=args.error_rate, seed=args.seed, submit_delay=args.submit_delay,
+                              delivery_reports=args.delivery, report_delay=args.report_delay).start()
+    broker = FakeMQTTBroker().start()
+    recorder = Recorder()
+    broker.observe(recorder)
+
+    state_dir = tempfile.mkdtemp(prefix="bench_end_to_end_")
+    env = dict(os.environ,
+               MQTT_TOPIC=PREFIX, MQTT_IP="127.0.0.1", PORT=str(broker.port), CLIENTID="bench",
+               MQTT_ACCOUNT="bench", MQTT_PASSWORD="bench", DEBUG_LEVEL=args.log_level,
+               HUAWEI_ROUTER_IP_ADDRESS=router.address, STATE_DIR=state_dir,
+               CHECK_INTERVAL=str(args.check_interval), SMS_CHECK_INTERVAL=str(args.sms_interval),
+               SMS_RATE_PER_MINUTE=str(args.send_rate), SMS_RATE_BURST=str(args.send_burst),
+               MQTT_PROTOCOL="5" if args.mqtt5 else "3.1.1",
+               ADAPTIVE_POLLING=str(args.adaptive).lower(), POLL_INTERVAL_BOUNDS=args.poll_bounds,
+               ROUTER_MAX_CONCURRENCY=str(args.max_concurrency), ROUTER_MAX_RPS=str(args.max_rps),
+               DELIVERY_TRACKING=str(args.delivery).lower(), SEND_STATUS_INTERVAL=str(args.send_status_interval))
+    started = time.monotonic()
+    with open(os.path.join(state_dir, "bridge.log"), "w") as log:
+        bridge = subprocess.Popen([sys.executable, BRIDGE], env=env, cwd=state_dir, stdout=log, stderr=log)
+    sampler = ProcessSampler(bridge.pid)
+    sampler.start()
+    try:
+        if not broker.wait_subscription(f"{PREFIX}/send", args.startup_timeout):
+            raise RuntimeError(f"bridge non prêt après {args.startup_timeout}s (voir {state_dir}/bridge.log)")
+        ready = time.monotonic() - started
+        cpu_at_start = sampler.cpu
+
+        stop = threading.Event()
+        injector = threading.Thread(target=inject_inbound,
+                                    args=(router.state, recorder, args.inbound, args.inbound_rate, stop), daemon=True)
+        injector.start()
+        sending_started = time.monotonic()
+        for number in range(args.outbound):
+            # En v5, chaque demande attend sa réponse sur REPLY_TOPIC
+            properties = [(RESPONSE_TOPIC, REPLY_TOPIC), (CORRELATION_DATA, str(number).encode())] if args.mqtt5 else []
+            if args.mqtt5 and args.send_expiry:
+                properties.append((MESSAGE_EXPIRY, args.send_expiry))
+            with recorder.lock:
+                recorder.requested[f"+3361000{number:04d}"] = time.monotonic()
+            broker.publish(f"{PREFIX}/send", json.dumps({"number": f"+3361000{number:04d}",
+                                                          "message": f"bench-out {number}"}), qos=1,
+                           properties=properties)
+
+        # Fin : durée écoulée, ou tout est reçu et envoyé
+        deadline = time.monotonic() + args.duration
+        while time.monotonic() < deadline:
+            with recorder.lock:
+                done = (len(recorder.received) >= args.inbound
+                        and len(recorder.sent) + recorder.failed + recorder.expired >= args.outbound)
+            if done and args.delivery:
+                # Chaque SMS envoyé attend son état final (accusé ou refus)
+                done = recorder.delivery_final() >= len(recorder.sent)
+            if done:
+                break
+            time.sleep(0.05)
+        elapsed = time.monotonic() - sending_started
+        stop.set()
+        sampler.stop()
+    finally:
+        bridge.send_signal(signal.SIGTERM)
+        try:
+            bridge.wait(10)
+        except subprocess.TimeoutExpired:
+            bridge.kill()
+        broker.stop()
+        router.stop()
+
+    latencies = recorder.latencies()
+    send_latencies = recorder.send_latencies()
+    delivery_latencies = recorder.send_latencies(recorder.delivered_at)
+    sent = recorder.sent
+    throughput = (len(sent) - 1) / (sent[-1] - sent[0]) * 60 if len(sent) > 1 else 0.0
+    return {
+        "startup_s": round(ready, 3),
+        "elapsed_s": round(elapsed, 2),
+        "inbound": {"injected": len(recorder.injected), "published": len(latencies), "duplicates": recorder.duplicates,
+                    "latency_p50_ms": round(percentile(latencies, 0.5) * 1000, 1),
+                    "latency_p95_ms": round(percentile(latencies, 0.95) * 1000, 1),
+                    "latency_max_ms": round(max(latencies, default=0.0) * 1000, 1)},
+        "outbound": {"requested": args.outbound, "sent": len(sent), "failed": recorder.failed,
+                     "expired": recorder.expired, "per_minute": round(throughput, 1),
+                     "latency_p50_ms": round(percentile(send_latencies, 0.5) * 1000, 1),
+                     "latency_p95_ms": round(percentile(send_latencies, 0.95) * 1000, 1),
+                     "delivered_to_router": router.state.sent,
+                     "replies": sum(1 for states in recorder.replies.values()
+                                    if states[-1] in ("sent", "failed", "expired"))},
+        "delivery": {"states": dict(sorted(recorder.delivery.items())), "reports": router.state.reports,
+                     "latency_p50_ms": round(percentile(delivery_latencies, 0.5) * 1000, 1),
+                     "latency_p95_ms": round(percentile(delivery_latencies, 0.95) * 1000, 1)},
+        "router": {"requests": dict(sorted(router.state.requests.items())), "total": router.state.total_requests(),
+                   "connections": router.state.connections, "injected_errors": router.state.injected_errors},
+        "mqtt": {"published": sum(count for topic, count in broker.published.items()
+                                  if not topic.endswith("/send")),
+                 "bytes": broker.received_bytes},
+        "bridge": {"cpu_s": round(sampler.cpu, 3), "cpu_startup_s": round(cpu_at_start, 3),
+                   "cpu_percent": round((sampler.cpu - cpu_at_start) / elapsed * 100, 1) if elapsed else 0.0,
+                   "rss_kib": sampler.rss_kib, "peak_rss_kib": sampler.peak_rss_kib},
+    }
+
+
+def report(result):
+    inbound, outbound, router, bridge = result["inbound"], result["outbound"], result["router"], result["bridge"]
+    print(f"Démarrage du bridge : {result['startup_s']:.2f}s, mesure sur {result['elapsed_s']:.1f}s")
+    print(f"Réception : {inbound['published']}/{inbound['injected']} SMS publiés, {inbound['duplicates']} doublons, "
+          f"latence p50 {inbound['latency_p50_ms']:.0f} ms, p95 {inbound['latency_p95_ms']:.0f} ms, "
+          f"max {inbound['latency_max_ms']:.0f} ms")
+    print(f"Envoi : {outbound['sent']}/{outbound['requested']} SMS envoyés ({outbound['failed']} en échec, "
+          f"{outbound['expired']} expirés), {outbound['per_minute']:.0f} SMS/min, latence p50 "
+          f"{outbound['latency_p50_ms']:.0f} ms, p95 {outbound['latency_p95_ms']:.0f} ms, "
+          f"{outbound['replies']} réponses MQTT v5 reçues")
+    delivery = result["delivery"]
+    if delivery["states"]:
+        states = ", ".join(f"{count} {state}" for state, count in delivery["states"].items())
+        print(f"Suivi : {states} ({delivery['reports']} accusés émis), demande -> accusé p50 "
+              f"{delivery['latency_p50_ms']:.0f} ms, p95 {delivery['latency_p95_ms']:.0f} ms")
+    print(f"Routeur : {router['total']} requêtes sur {router['connections']} connexion(s), "
+          f"{router['injected_errors']} erreurs injectées")
+    for path, count in router["requests"].items():
+        print(f"  {path:<40} {count:>6}")
+    print(f"MQTT : {result['mqtt']['published']} publications du bridge ({result['mqtt']['bytes']} octets)")
+    print(f"Bridge : CPU {bridge['cpu_s']:.2f}s (dont démarrage {bridge['cpu_startup_s']:.2f}s, "
+          f"{bridge['cpu_percent']:.1f}% ensuite), RSS {bridge['rss_kib'] / 1024:.1f} MiB "
+          f"(pic {bridge['peak_rss_kib'] / 1024:.1f} MiB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure de bout en bout du bridge face à un routeur et un broker émulés")
+    parser.add_argument("--duration", type=float, default=30.0, help="durée maximale de la mesure (secondes)")
+    parser.add_argument("--inbound", type=int, default=50, help="SMS reçus injectés dans le routeur")
+    parser.add_argument("--inbound-rate", type=float, default=5.0, help="SMS reçus injectés par seconde")
+    parser.add_argument("--outbound", type=int, default=50, help="demandes d'envoi publiées sur MQTT")
+    parser.add_argument("--send-rate", type=float, default=600, help="SMS_RATE_PER_MINUTE du bridge")
+    parser.add_argument("--send-burst", type=int, default=3, help="SMS_RATE_BURST du bridge")
+    parser.add_argument("--inbox-size", type=int, default=0, help="SMS non lus présents au démarrage")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence de réponse du routeur (secondes)")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="proportion de requêtes en erreur")
+    parser.add_argument("--no-batch-read", action="store_true", help="routeur sans set-read groupé")
+    parser.add_argument("--sms-interval", type=float, default=1.0, help="SMS_CHECK_INTERVAL du bridge")
+    parser.add_argument("--check-interval", type=int, default=5, help="CHECK_INTERVAL du bridge")
+    parser.add_argument("--mqtt5", action="store_true",
+                        help="MQTT v5 : demandes d'envoi avec topic de réponse et données de corrélation")
+    parser.add_argument("--send-expiry", type=int, default=0,
+                        help="expiration (secondes) des demandes d'envoi en MQTT v5 (0 : aucune)")
+    parser.add_argument("--adaptive", action="store_true",
+                        help="scrutation adaptative (ADAPTIVE_POLLING) au lieu des périodes fixes")
+    parser.add_argument("--poll-bounds", default="", help="POLL_INTERVAL_BOUNDS du bridge avec --adaptive")
+    parser.add_argument("--max-concurrency", type=int, default=2, help="ROUTER_MAX_CONCURRENCY du bridge")
+    parser.add_argument("--max-rps", type=float, default=10, help="ROUTER_MAX_RPS du bridge (0 : sans limite)")
+    parser.add_argument("--delivery", action="store_true",
+                        help="suivi des envois (send-status et accusés de réception du routeur émulé)")
+    parser.add_argument("--submit-delay", type=float, default=0.2,
+                        help="délai de soumission au réseau par destinataire (send-status du routeur émulé)")
+    parser.add_argument("--report-delay", type=float, default=1.0, help="délai de l'accusé de réception (secondes)")
+    parser.add_argument("--send-status-interval", type=float, default=0.5, help="SEND_STATUS_INTERVAL du bridge")
+    parser.add_argument("--startup-timeout", type=float, default=30.0)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--json", action="store_true", help="résultat en JSON (référence à comparer)")
+    args = parser.parse_args()
+
+    result = run(args)
+    if args.json:
+        print(json.dumps(result, indent=2))
+    else:
+        report(result)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+import argparse
+import os
+import sys
+import time
+from xml.etree import ElementTree as ET
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import hilink_xml  # noqa: E402
+from fake_hilink import FakeHiLinkState, INFORMATION_XML, SIGNAL_XML, STATUS_XML  # noqa: E402
+
+# Analyse des réponses HiLink : ancien code (ElementTree + root.iter() /
+# find('.//x') / findtext) contre les schémas de hilink_xml, sur de grandes
+# pages de boîte de réception et sur les réponses de statut.
+
+SIGNAL_FIELDS = ("rsrp", "rsrq", "rssi", "sinr", "cell_id", "pci", "ecio", "mode")
+
+
+def legacy_messages(body):
+    root = ET.fromstring(body)
+    return [(m.findtext('Index'), m.findtext('Phone'), m.findtext('Content'), m.findtext('Date'))
+            for m in root.findall('.//Message') if m.findtext('Smstat') == "0"]
+
+
+def schema_messages(body):
+    return [(m['Index'], m['Phone'], m['Content'], m['Date'])
+            for m in hilink_xml.iter_messages(body) if m['Smstat'] == 0]
+
+
+def legacy_fields(body):
+    return {element.tag: element.text for element in ET.fromstring(body).iter() if element.tag != "response"}
+
+
+def legacy_signal(body):
+    root = ET.fromstring(body)
+    return {name: root.find(f".//{name}").text for name in SIGNAL_FIELDS}
+
+
+def inbox_page(size):
+    state = FakeHiLinkState(inbox_size=size)
+    for index in range(0, size, 7):
+        state.add_sms("+33612345678", "Alerte « température » & humidité > seuil — capteur n°%d 🚨" % index)
+    body = state.sms_list(f"<request><PageIndex>1</PageIndex><ReadCount>{size}</ReadCount></request>".encode())
+    return body.encode('utf-8') if isinstance(body, str) else body
+
+
+def measure(name, body, func, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        func(body)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<36} {elapsed * 1e6 / repeat:10.1f} µs/réponse")
+    return elapsed
+
+
+def compare(label, body, legacy, schema, repeat):
+    print(f"{label} ({len(body)} octets)")
+    before = measure("  ElementTree", body, legacy, repeat)
+    after = measure("  hilink_xml", body, schema, repeat)
+    print(f"  gain : x{before / after:.1f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de l'analyse XML HiLink")
+    parser.add_argument("--page-sizes", default="20,50,500")
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    for size in (int(value) for value in args.page_sizes.split(",")):
+        body = inbox_page(size)
+        assert [tuple(map(str, m)) for m in schema_messages(body)] == [tuple(map(str, m)) for m in legacy_messages(body)]
+        compare(f"sms-list, page de {size} SMS", body, legacy_messages, schema_messages,
+                max(10, args.repeat * 20 // size))
+    for label, xml in (("monitoring/status", STATUS_XML), ("device/information", INFORMATION_XML.format(uptime=1234))):
+        compare(label, xml.encode('utf-8'), legacy_fields, hilink_xml.parse_fields, args.repeat * 10)
+    compare("device/signal", SIGNAL_XML.encode('utf-8'), legacy_signal, hilink_xml.SIGNAL.parse, args.repeat * 10)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_hilink import FakeHiLinkServer  # noqa: E402
+
+# Coût par routeur d'un bridge multi-routeurs : N routeurs émulés (dans un
+# processus séparé pour ne pas fausser les mesures) interrogés par un seul
+# bridge, une seule boucle asyncio et un client MQTT factice.
+
+
+class CountingMQTTClient:
+    def __init__(self):
+        self.published = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.published += 1
+
+
+def serve_routers(count, latency, connection):
+    servers = [FakeHiLinkServer(latency=latency).start() for _ in range(count)]
+    connection.send([server.address for server in servers])
+    connection.recv()
+    for server in servers:
+        server.stop()
+
+
+def rss_kib():
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") // 1024
+    except (OSError, ValueError):
+        return 0
+
+
+async def exercise(bridge, duration):
+    bridge.loop = asyncio.get_running_loop()
+    for router in bridge.routers:
+        router.sms_queue = asyncio.Queue()
+    await bridge.open_router_sessions()
+    main_loop = asyncio.create_task(bridge.main_loop())
+    await asyncio.sleep(duration)
+    main_loop.cancel()
+    await asyncio.gather(main_loop, return_exceptions=True)
+
+
+def run_once(count, duration, interval, latency):
+    parent, child = multiprocessing.Pipe()
+    process = multiprocessing.Process(target=serve_routers, args=(count, latency, child), daemon=True)
+    process.start()
+    addresses = parent.recv()
+
+    state_dir = tempfile.mkdtemp(prefix="bench_multi_router_")
+    os.environ.update({
+        "MQTT_TOPIC": "bench", "MQTT_IP": "127.0.0.1", "CLIENTID": "bench",
+        "MQTT_ACCOUNT": "bench", "MQTT_PASSWORD": "bench", "DEBUG_LEVEL": "WARNING",
+        "HUAWEI_ROUTERS": ",".join(f"r{i}={address}" for i, address in enumerate(addresses)),
+        "CHECK_INTERVAL": str(interval), "SMS_CHECK_INTERVAL": str(interval),
+        "SCHEDULER_JITTER": "0", "STATE_DIR": state_dir,
+    })
+    from huawei_sms_mqtt_bridge import HuaweiSMSMQTTBridge
+
+    rss_before = rss_kib()
+    tracemalloc.start()
+    heap_before = tracemalloc.get_traced_memory()[0]
+    bridge = HuaweiSMSMQTTBridge()
+    bridge.mqtt_client = CountingMQTTClient()
+    cpu_before = time.process_time()
+    asyncio.run(exercise(bridge, duration))
+    cpu = time.process_time() - cpu_before
+    heap = tracemalloc.get_traced_memory()[0] - heap_before
+    tracemalloc.stop()
+    rss = rss_kib() - rss_before
+
+    jobs = [job for name, job in bridge.scheduler.jobs.items() if name != "scheduler_stats"]
+    polls = sum(job.runs for job in jobs)
+    errors = sum(job.errors for job in jobs)
+    for router in bridge.routers:
+        router.close()
+    parent.send("stop")
+    process.join()
+    return {
+        "routers": count,
+        "polls": polls,
+        "errors": errors,
+        "published": bridge.mqtt_client.published,
+        "cpu_per_poll_us": round(cpu / polls * 1e6, 1) if polls else 0.0,
+        "cpu_percent": round(cpu / duration * 100, 1),
+        "heap_per_router_kib": round(heap / count / 1024, 1),
+        "rss_per_router_kib": round(rss / count, 1),
+        "max_lateness_ms": round(max(job.max_lateness for job in jobs) * 1000, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Coût par routeur du bridge multi-routeurs")
+    parser.add_argument("--routers", default="1,10,25,50,100",
+                        help="nombres de routeurs émulés, séparés par des virgules")
+    parser.add_argument("--duration", type=float, default=10.0)
+    parser.add_argument("--interval", type=int, default=1, help="période de scrutation (secondes)")
+    parser.add_argument("--latency", type=float, default=0.0, help="latence de réponse des routeurs émulés")
+    parser.add_argument("--json", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    counts = [int(value) for value in args.routers.split(",")]
+    if len(counts) == 1 and args.json:
+        print(json.dumps(run_once(counts[0], args.duration, args.interval, args.latency)))
+        return
+
+    # Un processus neuf par mesure : la mémoire d'une mesure ne pollue pas la suivante
+    print(f"{'routeurs':>8} {'polls':>7} {'erreurs':>7} {'CPU/poll':>10} {'CPU':>7} "
+          f"{'tas/routeur':>12} {'RSS/routeur':>12} {'retard max':>11}")
+    for count in counts:
+        output = subprocess.run(
+            [sys.executable, __file__, "--routers", str(count), "--duration", str(args.duration),
+             "--interval", str(args.interval), "--latency", str(args.latency), "--json"],
+            check=True, capture_output=True, text=True).stdout
+        result = json.loads(output.strip().splitlines()[-1])
+        print(f"{result['routers']:>8} {result['polls']:>7} {result['errors']:>7} "
+              f"{result['cpu_per_poll_us']:>8.1f}µs {result['cpu_percent']:>6.1f}% "
+              f"{result['heap_per_router_kib']:>9.1f}KiB {result['rss_per_router_kib']:>9.1f}KiB "
+              f"{result['max_lateness_ms']:>9.1f}ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import argparse
+import asyncio
+import os
+import sys
+import time
+from io import BytesIO
+
+import pycurl
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hilink_client import HiLinkClient  # noqa: E402
+from fake_hilink import FakeHiLinkServer  # noqa: E402
+
+# Compare l'ancien modèle (un pycurl.Curl() neuf et bloquant par requête) au
+# client HiLinkClient asynchrone qui réutilise ses connexions keep-alive.
+
+PATHS = ["/api/monitoring/status", "/api/device/signal", "/api/device/information"]
+
+
+def fresh_curl_request(address, path, headers):
+    buffer = BytesIO()
+    c = pycurl.Curl()
+    c.setopt(c.URL, f"http://{address}{path}")
+    c.setopt(c.HTTPHEADER, headers)
+    c.setopt(c.WRITEDATA, buffer)
+    c.perform()
+    c.close()
+    return buffer.getvalue()
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def report(name, server, count, elapsed, latencies, connections_before):
+    connections = server.state.connections - connections_before
+    print(f"{name:<28} {count / elapsed:>10.1f} req/s   "
+          f"p50={percentile(latencies, 50) * 1000:7.2f} ms   "
+          f"p99={percentile(latencies, 99) * 1000:7.2f} ms   "
+          f"connexions={connections}")
+
+
+def run_blocking(server, count, headers):
+    connections_before = server.state.connections
+    latencies = []
+    start = time.perf_counter()
+    for i in range(count):
+        t0 = time.perf_counter()
+        fresh_curl_request(server.address, PATHS[i % len(PATHS)], headers)
+        latencies.append(time.perf_counter() - t0)
+    report("pycurl.Curl() par appel", server, count, time.perf_counter() - start,
+           latencies, connections_before)
+
+
+async def run_async(server, count, headers, concurrency):
+    client = HiLinkClient(server.address, max_concurrency=concurrency)
+    connections_before = server.state.connections
+    latencies = []
+
+    async def one(i):
+        t0 = time.perf_counter()
+        await client.request(PATHS[i % len(PATHS)], headers=headers)
+        latencies.append(time.perf_counter() - t0)
+
+    start = time.perf_counter()
+    if concurrency == 1:
+        for i in range(count):
+            await one(i)
+    else:
+        await asyncio.gather(*(one(i) for i in range(count)))
+    elapsed = time.perf_counter() - start
+    client.close()
+    # En mode concurrent la latence inclut l'attente d'un créneau libre
+    report(f"HiLinkClient (concurrence {concurrency})", server, count, elapsed,
+           latencies, connections_before)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark du client HTTP du routeur")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--latency", type=float, default=0.0,
+                        help="latence de traitement par requête (s)")
+    parser.add_argument("--connect-latency", type=float, default=0.002,
+                        help="coût d'acceptation d'une nouvelle connexion TCP (s)")
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    server = FakeHiLinkServer(latency=args.latency, connect_latency=args.connect_latency).start()
+    headers = [f"Cookie: {server.state.ses_info}"]
+    try:
+        run_blocking(server, args.requests, headers)
+        asyncio.run(run_async(server, args.requests, headers, 1))
+        if args.concurrency > 1:
+            asyncio.run(run_async(server, args.requests, headers, args.concurrency))
+    finally:
+        server.stop()
+
+
+if __name__ == "__main__":
+    main()
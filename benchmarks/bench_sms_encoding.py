@@ -0,0 +1,64 @@
+import argparse
+import html
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import sms_encoding  # noqa: E402
+
+# Débit de planification (encodage + nombre de segments) sur un grand volume
+# de messages variés, comparé à l'ancien calcul de <Length>.
+
+SAMPLES = [
+    "Alarme : porte d'entrée ouverte",
+    "Température congélateur {t} °C, seuil dépassé",
+    "Rappel RDV demain à 9h30 — merci de confirmer “OUI” ou “NON”",
+    "Backup [srv-{t}] OK ~ 12 Go | durée 00:42",
+    "Code de vérification : {t}",
+    "Le colis n°{t} est arrivé. Retrait possible jusqu'au 12/11 €",
+    "Capteur hors ligne \U0001F6A8 depuis {t} min",
+    "Rapport journalier : " + "tout est nominal. " * 12,
+    "Bonjour, l'intervention “maintenance chaudière” #{t} est planifiée lundi — prévoir un accès au local technique.",
+]
+
+
+def build_messages(count, seed=42):
+    rng = random.Random(seed)
+    return [rng.choice(SAMPLES).format(t=rng.randint(0, 99999)) for _ in range(count)]
+
+
+def legacy_length(text):
+    return len(html.escape(text).encode('utf-8'))
+
+
+def measure(name, messages, func):
+    start = time.perf_counter()
+    for text in messages:
+        func(text)
+    elapsed = time.perf_counter() - start
+    print(f"{name:<32} {len(messages) / elapsed:>12,.0f} msg/s   {elapsed * 1e6 / len(messages):6.2f} µs/msg")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Microbenchmark de l'encodeur SMS")
+    parser.add_argument("--messages", type=int, default=200000)
+    args = parser.parse_args()
+
+    messages = build_messages(args.messages)
+    measure("ancien calcul de Length", messages, legacy_length)
+    measure("plan()", messages, sms_encoding.plan)
+    measure("plan() + translittération", messages, lambda text: sms_encoding.plan(text, True))
+
+    plans = [sms_encoding.plan(text) for text in messages]
+    transliterated = [sms_encoding.plan(text, True) for text in messages]
+    for label, items in (("sans translittération", plans), ("avec translittération", transliterated)):
+        ucs2 = sum(1 for item in items if item.encoding == sms_encoding.UCS2)
+        segments = sum(item.segments for item in items)
+        print(f"{label:<24} UCS-2 : {ucs2 * 100 / len(items):5.1f} %   segments : {segments}")
+
+
+if __name__ == "__main__":
+    main()
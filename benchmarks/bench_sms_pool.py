@@ -0,0 +1,91 @@
+import argparse
+import asyncio
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_hilink import FakeHiLinkServer  # noqa: E402
+
+# Débit d'envoi agrégé d'un pool de SIM en fonction du nombre de modems, chaque
+# modem étant limité à SMS_RATE_PER_MINUTE. Les --failing premiers modems
+# refusent tous les envois pour exercer la bascule.
+
+
+class CountingMQTTClient:
+    def __init__(self):
+        self.published = 0
+
+    def publish(self, topic, payload=None, qos=0, retain=False, properties=None):
+        self.published += 1
+
+
+async def send_all(bridge, messages):
+    bridge.loop = asyncio.get_running_loop()
+    for router in bridge.routers:
+        router.sms_queue = asyncio.Queue()
+    await bridge.open_router_sessions()
+    senders = [asyncio.create_task(router.process_sms_queue()) for router in bridge.routers]
+    started = time.perf_counter()
+    for i in range(messages):
+        entry = bridge.outbound_spool.enqueue(f"+3361000{i:04d}", f"Message de test {i}", pooled=True)
+        bridge.dispatch_sms(entry)
+    while True:
+        counts = bridge.outbound_spool.counts()
+        if counts.get("sent", 0) + counts.get("failed", 0) >= messages:
+            break
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    for sender in senders:
+        sender.cancel()
+    await asyncio.gather(*senders, return_exceptions=True)
+    return elapsed, counts
+
+
+def run(count, messages, rate, strategy, failing):
+    servers = [FakeHiLinkServer(send_error="113018" if i < failing else None).start()
+               for i in range(count)]
+    os.environ.update({
+        "MQTT_TOPIC": "bench", "MQTT_IP": "127.0.0.1", "CLIENTID": "bench",
+        "MQTT_ACCOUNT": "bench", "MQTT_PASSWORD": "bench", "DEBUG_LEVEL": "ERROR",
+        "HUAWEI_ROUTERS": ",".join(f"sim{i}={server.address}" for i, server in enumerate(servers)),
+        "SMS_RATE_PER_MINUTE": str(rate), "SMS_RATE_BURST": "1",
+        "SMS_POOL_STRATEGY": strategy, "SMS_RETRY_BASE_DELAY": "0.5",
+        "STATE_DIR": tempfile.mkdtemp(prefix="bench_sms_pool_"),
+    })
+    from huawei_sms_mqtt_bridge import HuaweiSMSMQTTBridge
+
+    bridge = HuaweiSMSMQTTBridge()
+    bridge.mqtt_client = CountingMQTTClient()
+    elapsed, counts = asyncio.run(send_all(bridge, messages))
+    per_router = [server.state.sent for server in servers]
+    for router in bridge.routers:
+        router.close()
+    for server in servers:
+        server.stop()
+    return elapsed, counts, per_router
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Débit agrégé du pool de SIM")
+    parser.add_argument("--routers", default="1,2,4,8")
+    parser.add_argument("--messages-per-router", type=int, default=60)
+    parser.add_argument("--rate", type=float, default=600, help="débit par modem (segments/minute)")
+    parser.add_argument("--strategy", default="least_loaded")
+    parser.add_argument("--failing", type=int, default=0, help="nombre de modems refusant les envois")
+    args = parser.parse_args()
+
+    baseline = None
+    print(f"{'modems':>6} {'SMS':>6} {'durée':>8} {'envoyés/min':>12} {'échelle':>8}  répartition")
+    for count in (int(value) for value in args.routers.split(",")):
+        messages = args.messages_per_router * count
+        elapsed, counts, per_router = run(count, messages, args.rate, args.strategy, min(args.failing, count - 1))
+        per_minute = counts.get("sent", 0) / elapsed * 60
+        baseline = baseline or per_minute
+        print(f"{count:>6} {messages:>6} {elapsed:>7.2f}s {per_minute:>12.0f} {per_minute / baseline:>7.2f}x  {per_router}")
+
+
+if __name__ == "__main__":
+    main()
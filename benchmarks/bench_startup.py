@@ -0,0 +1,184 @@
+import argparse
+import json
+import os
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fake_hilink import FakeHiLinkServer  # noqa: E402
+from fake_mqtt import FakeMQTTBroker  # noqa: E402
+
+# Démarrage à froid du bridge, tel qu'à chaque déploiement (systemd, Docker) :
+# le bridge est lancé dans un processus fils face à un routeur HiLink et à un
+# broker MQTT émulés, qui peuvent être lents ou indisponibles au lancement.
+# Mesure, depuis le lancement du processus, la connexion au broker,
+# l'abonnement au topic d'envoi et la première publication du statut du
+# routeur, ainsi que la décomposition publiée par le bridge sur son topic
+# startup.
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREFIX = "bench"
+MILESTONES = ("mqtt_connected", "subscribed", "first_status")
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+class Milestones:
+    # Premières publications du bridge observées sur le broker
+    def __init__(self, started):
+        self.started = started
+        self.lock = threading.Lock()
+        self.times = {}
+        self.breakdown = None
+        self.done = threading.Event()
+
+    def mark(self, name, timestamp):
+        with self.lock:
+            self.times.setdefault(name, timestamp - self.started)
+            if all(milestone in self.times for milestone in MILESTONES):
+                self.done.set()
+
+    def __call__(self, timestamp, topic, payload, properties):
+        if topic == f"{PREFIX}/connected" and payload == b"1":
+            self.mark("mqtt_connected", timestamp)
+        elif topic == f"{PREFIX}/status" or topic.startswith(f"{PREFIX}/status/"):
+            self.mark("first_status", timestamp)
+        elif topic == f"{PREFIX}/startup" and payload:
+            self.breakdown = json.loads(payload)
+
+
+def run_once(args):
+    router = FakeHiLinkServer(latency=args.router_latency, connect_latency=args.router_connect_latency).start()
+    router.state.offline = args.router_delay > 0
+    port = free_port()
+    broker = None
+    state_dir = tempfile.mkdtemp(prefix="bench_startup_")
+    env = dict(os.environ,
+               MQTT_TOPIC=PREFIX, MQTT_IP="127.0.0.1", PORT=str(port), CLIENTID="bench",
+               MQTT_ACCOUNT="bench", MQTT_PASSWORD="bench", DEBUG_LEVEL=args.log_level,
+               HUAWEI_ROUTER_IP_ADDRESS=router.address, STATE_DIR=state_dir,
+               ROUTER_TIMEOUT=str(args.router_timeout), SNAPSHOT_MODE="change", PYTHONPATH=ROOT)
+    milestones = None
+    timers = []
+    try:
+        def start_broker():
+            nonlocal broker
+            broker = FakeMQTTBroker(port=port)
+            broker.observe(milestones)
+            broker.start()
+            threading.Thread(target=wait_subscription, args=(broker,), daemon=True).start()
+
+        def wait_subscription(current):
+            if current.wait_subscription(f"{PREFIX}/send", args.timeout):
+                milestones.mark("subscribed", time.monotonic())
+
+        def start_router():
+            router.state.offline = False
+
+        started = time.monotonic()
+        milestones = Milestones(started)
+        with open(os.path.join(state_dir, "bridge.log"), "w") as log:
+            # Lancé comme module, comme en production : bytecode en cache
+            bridge = subprocess.Popen([sys.executable, "-m", "huawei_sms_mqtt_bridge"], env=env, cwd=state_dir,
+                                      stdout=log, stderr=log)
+        for delay, action in ((args.broker_delay, start_broker), (args.router_delay, start_router)):
+            if delay > 0:
+                timer = threading.Timer(delay, action)
+                timer.start()
+                timers.append(timer)
+            else:
+                action()
+        milestones.done.wait(args.timeout)
+        exited = bridge.poll()
+        # La décomposition est publiée juste après le premier statut
+        deadline = time.monotonic() + 1.0
+        while milestones.breakdown is None and exited is None and time.monotonic() < deadline:
+            time.sleep(0.02)
+    finally:
+        for timer in timers:
+            timer.cancel()
+        bridge.send_signal(signal.SIGTERM)
+        try:
+            bridge.wait(10)
+        except subprocess.TimeoutExpired:
+            bridge.kill()
+        if broker is not None:
+            broker.stop()
+        router.stop()
+    return {"milestones": {name: round(value, 3) for name, value in milestones.times.items()},
+            "exited": exited, "breakdown": milestones.breakdown, "log": os.path.join(state_dir, "bridge.log")}
+
+
+def summarize(runs):
+    summary = {}
+    for name in MILESTONES:
+        values = [run["milestones"][name] for run in runs if name in run["milestones"]]
+        summary[name] = {"reached": len(values), "p50_s": round(percentile(values, 0.5), 3),
+                         "max_s": round(max(values, default=0.0), 3)}
+    phases = {}
+    for run in runs:
+        for phase, value in (run["breakdown"] or {}).items():
+            if isinstance(value, (int, float)):
+                phases.setdefault(phase, []).append(value)
+    summary["breakdown_p50_s"] = {phase: round(percentile(values, 0.5), 3) for phase, values in phases.items()}
+    summary["exited"] = sum(1 for run in runs if run["exited"] is not None)
+    return summary
+
+
+def report(summary, runs):
+    print(f"{len(runs)} démarrage(s), délais depuis le lancement du processus :")
+    for name in MILESTONES:
+        milestone = summary[name]
+        print(f"  {name:<16} p50 {milestone['p50_s'] * 1000:7.0f} ms, max {milestone['max_s'] * 1000:7.0f} ms "
+              f"({milestone['reached']}/{len(runs)} atteints)")
+    if summary["breakdown_p50_s"]:
+        print("Décomposition publiée par le bridge (p50) :")
+        for phase, value in summary["breakdown_p50_s"].items():
+            print(f"  {phase:<24} {value * 1000:7.0f} ms")
+    if summary["exited"]:
+        print(f"{summary['exited']} bridge(s) arrêté(s) pendant la mesure (voir {runs[-1]['log']})")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mesure du démarrage à froid du bridge (délai avant la première publication du statut)")
+    parser.add_argument("--runs", type=int, default=5, help="nombre de démarrages mesurés")
+    parser.add_argument("--router-latency", type=float, default=0.0, help="latence de réponse du routeur (secondes)")
+    parser.add_argument("--router-connect-latency", type=float, default=0.0,
+                        help="délai d'acceptation d'une connexion par le routeur (secondes)")
+    parser.add_argument("--router-delay", type=float, default=0.0,
+                        help="routeur injoignable pendant ce délai après le lancement (secondes)")
+    parser.add_argument("--broker-delay", type=float, default=0.0,
+                        help="broker démarré après ce délai (secondes)")
+    parser.add_argument("--router-timeout", type=int, default=10, help="ROUTER_TIMEOUT du bridge")
+    parser.add_argument("--timeout", type=float, default=30.0, help="attente maximale par démarrage (secondes)")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--json", action="store_true", help="résultat en JSON (référence à comparer)")
+    args = parser.parse_args()
+
+    runs = [run_once(args) for _ in range(args.runs)]
+    summary = summarize(runs)
+    if args.json:
+        print(json.dumps({"summary": summary, "runs": runs}, indent=2))
+    else:
+        report(summary, runs)
+
+
+if __name__ == "__main__":
+    main()
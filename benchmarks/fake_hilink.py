@@ -0,0 +1,284 @@
+import html
+import random
+import socket
+import threading
+import time
+import re
+import uuid
+from xml.sax.saxutils import escape
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+
+# Routeur HiLink émulé pour les benchmarks : réponses XML minimales des
+# endpoints utilisés par le bridge, latences et erreurs configurables.
+
+STATUS_XML = """<?xml version="1.0" encoding="UTF-8"?><response><ConnectionStatus>901</ConnectionStatus><WifiConnectionStatus></WifiConnectionStatus><SignalStrength></SignalStrength><SignalIcon>4</SignalIcon><CurrentNetworkType>19</CurrentNetworkType><CurrentServiceDomain>3</CurrentServiceDomain><RoamingStatus>0</RoamingStatus><BatteryStatus></BatteryStatus><simlockStatus>0</simlockStatus><PrimaryDns>10.0.0.1</PrimaryDns><SecondaryDns>10.0.0.2</SecondaryDns><CurrentWifiUser>0</CurrentWifiUser><TotalWifiUser>0</TotalWifiUser><ServiceStatus>2</ServiceStatus><SimStatus>1</SimStatus><WifiStatus></WifiStatus></response>"""
+
+SIGNAL_XML = """<?xml version="1.0" encoding="UTF-8"?><response><pci>123</pci><sc></sc><cell_id>12345678</cell_id><rssi>-65dBm</rssi><rsrp>-95dBm</rsrp><rsrq>-10.0dB</rsrq><sinr>8dB</sinr><rscp></rscp><ecio></ecio><mode>7</mode></response>"""
+
+INFORMATION_XML = """<?xml version="1.0" encoding="UTF-8"?><response><DeviceName>E3372h-320</DeviceName><SerialNumber>ABCDEF0123456789</SerialNumber><Imei>860000000000000</Imei><Imsi>208000000000000</Imsi><Iccid>89330000000000000000</Iccid><Msisdn></Msisdn><HardwareVersion>CL2E3372HM</HardwareVersion><SoftwareVersion>11.0.1.1(H697SP1C983)</SoftwareVersion><WebUIVersion>WEBUI 11.0.1.1</WebUIVersion><MacAddress1>00:1E:10:1F:00:00</MacAddress1><MacAddress2></MacAddress2><ProductFamily>LTE</ProductFamily><Classify>hilink</Classify><supportmode>LTE|WCDMA|GSM</supportmode><workmode>LTE</workmode><Mccmnc>20801</Mccmnc><uptime>{uptime}</uptime></response>"""
+
+OK_XML = """<?xml version="1.0" encoding="UTF-8"?><response>OK</response>"""
+
+
+class FakeHiLinkState:
+    def __init__(self, latency=0.0, connect_latency=0.0, inbox_size=0, batch_read=True,
+                 notifications=True, send_error=None, error_rate=0.0, error_code="100003", seed=None,
+                 max_recipients=None, submit_delay=0.0, delivery_reports=False, report_delay=1.0):
+        self.latency = latency
+        self.connect_latency = connect_latency
+        self.batch_read = batch_read
+        self.notifications = notifications
+        # Code d'erreur renvoyé par send-sms (SIM sans crédit, réseau absent...)
+        self.send_error = send_error
+        # Nombre maximal de <Phone> par send-sms (None : illimité)
+        self.max_recipients = max_recipients
+        # Soumission au réseau de chaque destinataire (send-status) après
+        # submit_delay secondes ; numéros refusés par le réseau (FailPhone)
+        self.submit_delay = submit_delay
+        self.rejected_numbers = set()
+        self.last_send = None
+        # Accusé de réception (<SmsType>7) déposé report_delay secondes après la soumission
+        self.delivery_reports = delivery_reports
+        self.report_delay = report_delay
+        self.reports = 0
+        # Proportion de requêtes en erreur (routeur saturé, session perdue...)
+        self.error_rate = error_rate
+        self.error_code = error_code
+        # Routeur injoignable (redémarrage, câble USB...) : connexion fermée sans réponse
+        self.offline = False
+        self.random = random.Random(seed)
+        self.injected_errors = 0
+        self.sent = 0
+        self.started = time.time()
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.requests = {}
+        # Boîte de réception : Index -> dict(Phone, Content, Date, Smstat)
+        self.inbox = {}
+        self.next_index = 40000
+        for i in range(inbox_size):
+            self.add_sms(f"+3361234{i:04d}", f"Message de test numéro {i}")
+        self.ses_info = f"SessionID={uuid.uuid4().hex}"
+        self.tokens = set()
+
+    def issue_token(self):
+        token = uuid.uuid4().hex
+        with self.lock:
+            self.tokens.add(token)
+        return token
+
+    def consume_token(self, token):
+        # Comme sur les firmwares HiLink, un token n'est valable que pour un POST
+        with self.lock:
+            if token in self.tokens:
+                self.tokens.discard(token)
+                return True
+            return False
+
+    def add_sms(self, phone, content, sms_type=1):
+        with self.lock:
+            self.next_index += 1
+            self.inbox[self.next_index] = {
+                "Phone": phone,
+                "Content": content,
+                "Date": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "Smstat": "0",
+                "SmsType": sms_type,
+            }
+            return self.next_index
+
+    def add_report(self, phone):
+        with self.lock:
+            self.reports += 1
+        self.add_sms(phone, "", sms_type=7)
+
+    def record_send(self, phones):
+        # send-status ne décrit que le dernier envoi, comme sur le routeur
+        with self.lock:
+            self.last_send = {"phones": phones, "at": time.monotonic()}
+        if self.delivery_reports:
+            for position, phone in enumerate(phones):
+                if phone not in self.rejected_numbers:
+                    timer = threading.Timer(self.submit_delay * (position + 1) + self.report_delay,
+                                            self.add_report, (phone,))
+                    timer.daemon = True
+                    timer.start()
+
+    def send_status(self):
+        with self.lock:
+            if self.last_send is None:
+                return ("<response><Phone></Phone><SucPhone></SucPhone><FailPhone></FailPhone>"
+                        "<TotalCount>0</TotalCount><CurIndex>0</CurIndex></response>")
+            phones = self.last_send["phones"]
+            elapsed = time.monotonic() - self.last_send["at"]
+            done = min(len(phones), int(elapsed / self.submit_delay)) if self.submit_delay else len(phones)
+            succeeded = [phone for phone in phones[:done] if phone not in self.rejected_numbers]
+            failed = [phone for phone in phones[:done] if phone in self.rejected_numbers]
+            current = phones[done] if done < len(phones) else ""
+        return (f"<response><Phone>{escape(current)}</Phone><SucPhone>{escape(';'.join(succeeded))}</SucPhone>"
+                f"<FailPhone>{escape(';'.join(failed))}</FailPhone><TotalCount>{len(phones)}</TotalCount>"
+                f"<CurIndex>{done}</CurIndex></response>")
+
+    def unread_count(self):
+        with self.lock:
+            return sum(1 for sms in self.inbox.values() if sms["Smstat"] == "0")
+
+    def sms_list(self, body):
+        page = int(re.search(rb"<PageIndex>(\d+)</PageIndex>", body).group(1))
+        count = int(re.search(rb"<ReadCount>(\d+)</ReadCount>", body).group(1))
+        with self.lock:
+            # UnreadPreferred : non lus d'abord, puis du plus récent au plus ancien
+            ordered = sorted(self.inbox.items(), key=lambda item: (item[1]["Smstat"], -item[0]))
+            selected = ordered[(page - 1) * count:page * count]
+            messages = "".join(
+                f"<Message><Smstat>{sms['Smstat']}</Smstat><Index>{index}</Index>"
+                f"<Phone>{escape(sms['Phone'])}</Phone><Content>{escape(sms['Content'])}</Content>"
+                f"<Date>{sms['Date']}</Date><Sca></Sca><SaveType>4</SaveType><Priority>0</Priority>"
+                f"<SmsType>{sms['SmsType']}</SmsType></Message>"
+                for index, sms in selected)
+            return f"<response><Count>{len(self.inbox)}</Count><Messages>{messages}</Messages></response>"
+
+    def set_read(self, body):
+        indexes = [int(i) for i in re.findall(rb"<Index>(\d+)</Index>", body)]
+        if len(indexes) > 1 and not self.batch_read:
+            return "<error><code>100005</code><message></message></error>"
+        with self.lock:
+            for index in indexes:
+                if index in self.inbox:
+                    self.inbox[index]["Smstat"] = "1"
+        return OK_XML
+
+    def expire_session(self):
+        with self.lock:
+            self.ses_info = f"SessionID={uuid.uuid4().hex}"
+            self.tokens.clear()
+
+    def count(self, path):
+        with self.lock:
+            self.requests[path] = self.requests.get(path, 0) + 1
+
+    def inject_error(self):
+        if not self.error_rate:
+            return False
+        with self.lock:
+            if self.random.random() >= self.error_rate:
+                return False
+            self.injected_errors += 1
+            return True
+
+    def total_requests(self):
+        with self.lock:
+            return sum(self.requests.values())
+
+
+class FakeHiLinkHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    server_version = "FakeHiLink/1.0"
+
+    def setup(self):
+        state = self.server.state
+        with state.lock:
+            state.connections += 1
+        # Coût d'acceptation d'une nouvelle connexion sur un serveur embarqué lent
+        if state.connect_latency:
+            time.sleep(state.connect_latency)
+        super().setup()
+        self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, body, headers=None):
+        payload = body.encode('utf-8')
+        self.send_response(200)
+        self.send_header("Content-Type", "text/xml; charset=UTF-8")
+        self.send_header("Content-Length", str(len(payload)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _route(self, body):
+        state = self.server.state
+        state.count(self.path)
+        if state.latency:
+            time.sleep(state.latency)
+        if state.inject_error():
+            return f"<error><code>{state.error_code}</code><message></message></error>"
+        if self.path == "/api/webserver/SesTokInfo":
+            return f"<response><SesInfo>{state.ses_info}</SesInfo><TokInfo>{state.issue_token()}</TokInfo></response>"
+        if self.headers.get("Cookie") != state.ses_info:
+            return "<error><code>125002</code><message></message></error>"
+        if self.command == "POST":
+            if not state.consume_token(self.headers.get("__RequestVerificationToken")):
+                return "<error><code>125003</code><message></message></error>"
+            self.response_headers["__RequestVerificationToken"] = state.issue_token()
+        if self.path == "/api/monitoring/status":
+            return STATUS_XML
+        if self.path == "/api/device/signal":
+            return SIGNAL_XML
+        if self.path == "/api/device/information":
+            return INFORMATION_XML.format(uptime=int(time.time() - state.started))
+        if self.path == "/api/monitoring/check-notifications" and state.notifications:
+            return (f"<response><UnreadMessage>{state.unread_count()}</UnreadMessage>"
+                    f"<SmsStorageFull>0</SmsStorageFull><OnlineUpdateStatus>10</OnlineUpdateStatus></response>")
+        if self.path == "/api/sms/sms-count":
+            return (f"<response><LocalUnread>{state.unread_count()}</LocalUnread>"
+                    f"<LocalInbox>{len(state.inbox)}</LocalInbox><LocalMax>500</LocalMax></response>")
+        if self.path == "/api/sms/sms-list":
+            return state.sms_list(body)
+        if self.path == "/api/sms/set-read":
+            return state.set_read(body)
+        if self.path == "/api/sms/send-sms":
+            if state.send_error:
+                return f"<error><code>{state.send_error}</code><message></message></error>"
+            phones = [html.unescape(phone.decode('utf-8')) for phone in re.findall(rb"<Phone>([^<]*)</Phone>", body)]
+            if state.max_recipients is not None and len(phones) > state.max_recipients:
+                return "<error><code>100005</code><message></message></error>"
+            with state.lock:
+                state.sent += len(phones)
+            state.record_send(phones)
+            return OK_XML
+        if self.path == "/api/sms/send-status":
+            return state.send_status()
+        return "<error><code>100002</code><message></message></error>"
+
+    def do_GET(self):
+        if self.server.state.offline:
+            self.close_connection = True
+            return
+        self.response_headers = {}
+        self._send(self._route(b""), self.response_headers)
+
+    def do_POST(self):
+        length = int(self.headers.get("Content-Length", 0))
+        body = self.rfile.read(length) if length else b""
+        if self.server.state.offline:
+            self.close_connection = True
+            return
+        self.response_headers = {}
+        self._send(self._route(body), self.response_headers)
+
+
+class FakeHiLinkServer:
+    def __init__(self, host="127.0.0.1", port=0, **options):
+        self.state = FakeHiLinkState(**options)
+        self.httpd = ThreadingHTTPServer((host, port), FakeHiLinkHandler)
+        self.httpd.daemon_threads = True
+        self.httpd.state = self.state
+        self.thread = None
+
+    @property
+    def address(self):
+        host, port = self.httpd.server_address[:2]
+        return f"{host}:{port}"
+
+    def start(self):
+        self.thread = threading.Thread(target=self.httpd.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
@@ -0,0 +1,376 @@
+import socket
+import socketserver
+import struct
+import threading
+import time
+
+
+# Broker MQTT 3.1.1 et 5 minimal pour les benchmarks : CONNECT, SUBSCRIBE,
+# PUBLISH QoS 0/1 (QoS 2 ramené à 1), messages retenus, testament, PING et,
+# en v5, alias de topic et propriétés transmises aux abonnés (topic de
+# réponse, données de corrélation...). Chaque publication est horodatée et
+# transmise aux observateurs, ce qui permet de mesurer les latences de bout
+# en bout sans vrai broker.
+
+CONNECT, CONNACK, PUBLISH, PUBACK = 1, 2, 3, 4
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK = 8, 9, 10, 11
+PINGREQ, PINGRESP, DISCONNECT = 12, 13, 14
+
+# Propriétés MQTT v5 : identifiant -> type de valeur
+PAYLOAD_FORMAT, MESSAGE_EXPIRY, CONTENT_TYPE, RESPONSE_TOPIC, CORRELATION_DATA = 0x01, 0x02, 0x03, 0x08, 0x09
+TOPIC_ALIAS_MAXIMUM, TOPIC_ALIAS, USER_PROPERTY = 0x22, 0x23, 0x26
+PROPERTY_TYPES = {
+    0x01: "byte", 0x02: "int4", 0x03: "string", 0x08: "string", 0x09: "binary", 0x0B: "varint",
+    0x11: "int4", 0x12: "string", 0x13: "int2", 0x15: "string", 0x16: "binary", 0x17: "byte",
+    0x18: "int4", 0x19: "byte", 0x1A: "string", 0x1C: "string", 0x1F: "string", 0x21: "int2",
+    0x22: "int2", 0x23: "int2", 0x24: "byte", 0x25: "byte", 0x26: "pair", 0x27: "int4",
+    0x28: "byte", 0x29: "byte", 0x2A: "byte",
+}
+
+
+def topic_matches(pattern, topic):
+    pattern_levels, topic_levels = pattern.split("/"), topic.split("/")
+    for position, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if position >= len(topic_levels) or (level != "+" and level != topic_levels[position]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+def granted_qos(subscriptions, topic):
+    # QoS accordée la plus haute parmi les abonnements correspondants, None sinon
+    matching = [qos for pattern, qos in subscriptions.items() if topic_matches(pattern, topic)]
+    return max(matching) if matching else None
+
+
+def encode_length(length):
+    encoded = bytearray()
+    while True:
+        byte, length = length % 128, length // 128
+        encoded.append(byte | 0x80 if length else byte)
+        if not length:
+            return bytes(encoded)
+
+
+def encode_string(value):
+    raw = value.encode('utf-8') if isinstance(value, str) else value
+    return struct.pack("!H", len(raw)) + raw
+
+
+def decode_varint(data, offset):
+    value, shift = 0, 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        shift += 7
+        if not byte & 0x80:
+            return value, offset
+
+
+def decode_properties(data, offset):
+    # -> ([(identifiant, valeur)], fin du bloc)
+    length, offset = decode_varint(data, offset)
+    end, properties = offset + length, []
+    while offset < end:
+        identifier, offset = decode_varint(data, offset)
+        kind = PROPERTY_TYPES[identifier]
+        if kind == "byte":
+            value, offset = data[offset], offset + 1
+        elif kind == "int2":
+            value, offset = struct.unpack("!H", data[offset:offset + 2])[0], offset + 2
+        elif kind == "int4":
+            value, offset = struct.unpack("!I", data[offset:offset + 4])[0], offset + 4
+        elif kind == "varint":
+            value, offset = decode_varint(data, offset)
+        else:
+            size = struct.unpack("!H", data[offset:offset + 2])[0]
+            value, offset = data[offset + 2:offset + 2 + size], offset + 2 + size
+            if kind == "string":
+                value = value.decode('utf-8')
+            elif kind == "pair":
+                size = struct.unpack("!H", data[offset:offset + 2])[0]
+                value, offset = (value.decode('utf-8'), data[offset + 2:offset + 2 + size].decode('utf-8')), offset + 2 + size
+        properties.append((identifier, value))
+    return properties, end
+
+
+def encode_properties(properties):
+    body = bytearray()
+    for identifier, value in properties:
+        kind = PROPERTY_TYPES[identifier]
+        body += encode_length(identifier)
+        if kind == "byte":
+            body.append(value)
+        elif kind == "int2":
+            body += struct.pack("!H", value)
+        elif kind == "int4":
+            body += struct.pack("!I", value)
+        elif kind == "varint":
+            body += encode_length(value)
+        elif kind == "pair":
+            body += encode_string(value[0]) + encode_string(value[1])
+        else:
+            body += encode_string(value)
+    return encode_length(len(body)) + bytes(body)
+
+
+def packet(kind, flags, body):
+    return bytes([kind << 4 | flags]) + encode_length(len(body)) + body
+
+
+class FakeMQTTSession(socketserver.BaseRequestHandler):
+    def setup(self):
+        self.broker = self.server.broker
+        self.write_lock = threading.Lock()
+        self.subscriptions = {}
+        self.next_packet_id = 0
+        self.will = None
+        self.client_id = None
+        self.version = 4
+        # Alias de topic déclarés par le client sur cette connexion
+        self.topic_aliases = {}
+
+    def send(self, data):
+        with self.write_lock:
+            self.request.sendall(data)
+
+    def read_exact(self, size):
+        data = b""
+        while len(data) < size:
+            chunk = self.request.recv(size - len(data))
+            if not chunk:
+                raise ConnectionError("connexion fermée")
+            data += chunk
+        return data
+
+    def read_packet(self):
+        header = self.read_exact(1)[0]
+        length, shift = 0, 0
+        while True:
+            byte = self.read_exact(1)[0]
+            length |= (byte & 0x7F) << shift
+            shift += 7
+            if not byte & 0x80:
+                break
+        return header >> 4, header & 0x0F, self.read_exact(length) if length else b""
+
+    def deliver(self, topic, payload, qos, retain=False, properties=()):
+        body = encode_string(topic)
+        if qos:
+            self.next_packet_id = self.next_packet_id % 65535 + 1
+            body += struct.pack("!H", self.next_packet_id)
+        if self.version == 5:
+            body += encode_properties(properties)
+        try:
+            self.send(packet(PUBLISH, (qos << 1) | int(retain), body + payload))
+        except OSError:
+            pass
+
+    def handle(self):
+        clean = False
+        try:
+            while True:
+                kind, flags, body = self.read_packet()
+                if kind == CONNECT:
+                    self.on_connect(body)
+                elif kind == PUBLISH:
+                    self.on_publish(flags, body)
+                elif kind == SUBSCRIBE:
+                    self.on_subscribe(body)
+                elif kind == UNSUBSCRIBE:
+                    self.on_unsubscribe(body)
+                elif kind == PINGREQ:
+                    self.send(packet(PINGRESP, 0, b""))
+                elif kind == DISCONNECT:
+                    clean = True
+                    break
+                # PUBACK des livraisons QoS 1 : rien à faire
+        except (ConnectionError, OSError):
+            pass
+        finally:
+            self.broker.remove_session(self)
+            if not clean and self.will:
+                self.broker.publish(*self.will)
+
+    def on_connect(self, body):
+        offset = 2 + struct.unpack("!H", body[:2])[0]  # nom du protocole
+        self.version = body[offset]
+        connect_flags = body[offset + 1]
+        offset += 4  # niveau, drapeaux, keep-alive
+        if self.version == 5:
+            _, offset = decode_properties(body, offset)
+
+        def read_field():
+            nonlocal offset
+            size = struct.unpack("!H", body[offset:offset + 2])[0]
+            value = body[offset + 2:offset + 2 + size]
+            offset += 2 + size
+            return value
+
+        self.client_id = read_field().decode('utf-8')
+        if connect_flags & 0x04:
+            if self.version == 5:
+                _, offset = decode_properties(body, offset)
+            will_topic = read_field().decode('utf-8')
+            will_payload = read_field()
+            self.will = (will_topic, will_payload, min((connect_flags >> 3) & 0x03, 1), bool(connect_flags & 0x20))
+        self.broker.add_session(self)
+        if self.version == 5:
+            properties = [(TOPIC_ALIAS_MAXIMUM, self.broker.topic_alias_maximum)] if self.broker.topic_alias_maximum else []
+            self.send(packet(CONNACK, 0, b"\x00\x00" + encode_properties(properties)))
+        else:
+            self.send(packet(CONNACK, 0, b"\x00\x00"))
+
+    def on_publish(self, flags, body):
+        qos, retain = min((flags >> 1) & 0x03, 1), bool(flags & 0x01)
+        self.broker.count_bytes(len(body))
+        size = struct.unpack("!H", body[:2])[0]
+        topic = body[2:2 + size].decode('utf-8')
+        offset = 2 + size
+        packet_id = None
+        if (flags >> 1) & 0x03:
+            packet_id = body[offset:offset + 2]
+            offset += 2
+        properties = []
+        if self.version == 5:
+            properties, offset = decode_properties(body, offset)
+            alias = next((value for identifier, value in properties if identifier == TOPIC_ALIAS), None)
+            if alias is not None:
+                properties = [(identifier, value) for identifier, value in properties if identifier != TOPIC_ALIAS]
+                if topic:
+                    self.topic_aliases[alias] = topic
+                else:
+                    topic = self.topic_aliases[alias]
+        if packet_id is not None:
+            self.send(packet(PUBACK, 0, packet_id))
+        self.broker.publish(topic, body[offset:], qos, retain, properties)
+
+    def on_subscribe(self, body):
+        packet_id, offset, granted = body[:2], 2, bytearray()
+        patterns = []
+        if self.version == 5:
+            _, offset = decode_properties(body, offset)
+        while offset < len(body):
+            size = struct.unpack("!H", body[offset:offset + 2])[0]
+            pattern = body[offset + 2:offset + 2 + size].decode('utf-8')
+            qos = min(body[offset + 2 + size] & 0x03, 1)
+            offset += 3 + size
+            self.subscriptions[pattern] = qos
+            granted.append(qos)
+            patterns.append(pattern)
+        properties = encode_properties([]) if self.version == 5 else b""
+        self.send(packet(SUBACK, 0, packet_id + properties + bytes(granted)))
+        self.broker.subscribed(self, patterns)
+
+    def on_unsubscribe(self, body):
+        offset, codes = 2, bytearray()
+        if self.version == 5:
+            _, offset = decode_properties(body, offset)
+        while offset < len(body):
+            size = struct.unpack("!H", body[offset:offset + 2])[0]
+            self.subscriptions.pop(body[offset + 2:offset + 2 + size].decode('utf-8'), None)
+            offset += 2 + size
+            codes.append(0)
+        if self.version == 5:
+            self.send(packet(UNSUBACK, 0, body[:2] + encode_properties([]) + bytes(codes)))
+        else:
+            self.send(packet(UNSUBACK, 0, body[:2]))
+
+
+class FakeMQTTBroker:
+    def __init__(self, host="127.0.0.1", port=0, topic_alias_maximum=10):
+        socketserver.ThreadingTCPServer.allow_reuse_address = True
+        self.server = socketserver.ThreadingTCPServer((host, port), FakeMQTTSession)
+        self.server.daemon_threads = True
+        self.server.broker = self
+        self.lock = threading.Condition()
+        self.sessions = []
+        self.retained = {}
+        self.observers = []
+        self.published = {}
+        # Taille cumulée des paquets PUBLISH reçus des clients (hors en-tête fixe)
+        self.received_bytes = 0
+        self.topic_alias_maximum = topic_alias_maximum
+        self.thread = None
+
+    @property
+    def port(self):
+        return self.server.server_address[1]
+
+    def start(self):
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+        self.thread.start()
+        return self
+
+    def stop(self):
+        # Ferme aussi les connexions établies (simule une panne du broker)
+        self.server.shutdown()
+        self.server.server_close()
+        with self.lock:
+            sessions = list(self.sessions)
+        for session in sessions:
+            try:
+                session.request.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def observe(self, callback):
+        # callback(timestamp, topic, payload, properties) appelé pour chaque
+        # publication ; properties : {identifiant: valeur} (MQTT v5)
+        self.observers.append(callback)
+
+    def count_bytes(self, size):
+        with self.lock:
+            self.received_bytes += size
+
+    def add_session(self, session):
+        with self.lock:
+            self.sessions.append(session)
+
+    def remove_session(self, session):
+        with self.lock:
+            if session in self.sessions:
+                self.sessions.remove(session)
+
+    def subscribed(self, session, patterns):
+        with self.lock:
+            retained = [(topic, payload, min(qos, granted_qos(session.subscriptions, topic)), properties)
+                        for topic, (payload, qos, properties) in self.retained.items()
+                        if any(topic_matches(pattern, topic) for pattern in patterns)]
+            self.lock.notify_all()
+        for topic, payload, qos, properties in retained:
+            session.deliver(topic, payload, qos, True, properties)
+
+    def wait_subscription(self, topic, timeout):
+        # Attend qu'un client soit abonné à ce topic (bridge prêt à recevoir)
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            while not any(topic_matches(pattern, topic)
+                          for session in self.sessions for pattern in session.subscriptions):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.lock.wait(remaining)
+        return True
+
+    def publish(self, topic, payload, qos=0, retain=False, properties=()):
+        # Publication d'un client ou du benchmark lui-même ; properties :
+        # [(identifiant, valeur)] transmises aux abonnés MQTT v5
+        timestamp = time.monotonic()
+        payload = payload.encode('utf-8') if isinstance(payload, str) else payload
+        properties = list(properties)
+        with self.lock:
+            self.published[topic] = self.published.get(topic, 0) + 1
+            if retain:
+                if payload:
+                    self.retained[topic] = (payload, qos, properties)
+                else:
+                    self.retained.pop(topic, None)
+            targets = [(session, granted_qos(session.subscriptions, topic)) for session in self.sessions]
+        for callback in self.observers:
+            callback(timestamp, topic, payload, dict(properties))
+        for session, granted in targets:
+            if granted is not None:
+                session.deliver(topic, payload, min(qos, granted), properties=properties)
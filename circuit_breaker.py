@@ -0,0 +1,111 @@
+import asyncio
+import random
+import time
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+STATE_VALUES = {CLOSED: 0, HALF_OPEN: 1, OPEN: 2}
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # Disjoncteur d'un routeur. Après `failure_threshold` échecs de transport
+    # consécutifs (routeur muet, pas d'erreur HiLink), il s'ouvre : toute
+    # requête échoue immédiatement au lieu d'attendre son timeout. À
+    # l'échéance du backoff (exponentiel, avec jitter), une seule requête de
+    # sonde passe (demi-ouvert) : son succès referme le circuit, son échec le
+    # rouvre pour une période doublée. Utilisé depuis la boucle asyncio.
+    def __init__(self, failure_threshold=3, base_delay=1.0, max_delay=30.0, on_change=None, clock=time.monotonic):
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        # on_change(ancien état, nouvel état)
+        self.on_change = on_change
+        self.clock = clock
+        self.state = CLOSED
+        self.failures = 0
+        # Ouvertures successives sans fermeture : exposant du backoff
+        self.reopenings = 0
+        self.retry_at = 0.0
+        self.probing = False
+        self.opens = 0
+        self.fast_failures = 0
+        self._changed = None
+
+    @property
+    def closed(self):
+        return self.state == CLOSED
+
+    def retry_in(self):
+        return 0.0 if self.state == CLOSED else max(0.0, self.retry_at - self.clock())
+
+    def before_request(self):
+        # Lève CircuitOpenError si la requête ne doit pas partir
+        if self.state == CLOSED:
+            return
+        if self.state == OPEN and self.clock() >= self.retry_at:
+            self._set_state(HALF_OPEN)
+        if self.state == HALF_OPEN and not self.probing:
+            self.probing = True
+            return
+        self.fast_failures += 1
+        raise CircuitOpenError(f"routeur injoignable, nouvel essai dans {self.retry_in():.1f} secondes")
+
+    def record_success(self):
+        self.probing = False
+        self.failures = 0
+        if self.state != CLOSED:
+            self.reopenings = 0
+            self._set_state(CLOSED)
+
+    def record_failure(self):
+        self.probing = False
+        self.failures += 1
+        if self.state == HALF_OPEN or (self.state == CLOSED and self.failures >= self.failure_threshold):
+            self.trip()
+
+    def release(self):
+        # Sonde annulée sans résultat : la requête suivante sondera à sa place
+        self.probing = False
+
+    def trip(self):
+        # Ouverture immédiate, backoff moitié fixe, moitié aléatoire
+        self.reopenings += 1
+        delay = min(self.max_delay, self.base_delay * 2 ** (self.reopenings - 1))
+        self.retry_at = self.clock() + delay / 2 + random.uniform(0, delay / 2)
+        self.opens += 1
+        self._set_state(OPEN)
+
+    def _set_state(self, state):
+        previous, self.state = self.state, state
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+        if self.on_change and previous != state:
+            self.on_change(previous, state)
+
+    async def wait_change(self, timeout):
+        # Attend un changement d'état, au plus `timeout` secondes
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    async def wait_closed(self):
+        while self.state != CLOSED:
+            await self.wait_change(None)
+
+    def stats(self):
+        return {
+            "state": self.state,
+            "consecutive_failures": self.failures,
+            "opens": self.opens,
+            "fast_failures": self.fast_failures,
+            "retry_in": round(self.retry_in(), 1),
+        }
@@ -0,0 +1,61 @@
+import hashlib
+import os
+import sqlite3
+import time
+
+
+class DeliveredSMSIndex:
+    # Index persistant des SMS reçus déjà publiés. Les clés sont gardées en
+    # mémoire (test d'appartenance en O(1)) et écrites dans SQLite pour
+    # survivre aux redémarrages ; la rétention est bornée en âge et en nombre.
+    def __init__(self, path, retention_days=30, max_entries=10000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.retention = retention_days * 86400
+        self.max_entries = max_entries
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("CREATE TABLE IF NOT EXISTS delivered (key BLOB PRIMARY KEY, delivered_at REAL NOT NULL)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS delivered_at_idx ON delivered (delivered_at)")
+        self.db.commit()
+        self._adds_since_prune = 0
+        self.prune()
+
+    @staticmethod
+    def key(index, phone, date, content, scope=None):
+        content_hash = hashlib.sha1((content or "").encode('utf-8')).digest()
+        identity = f"{index}\x1f{phone}\x1f{date}\x1f".encode('utf-8') + content_hash
+        if scope:
+            # Plusieurs routeurs : un index de SMS n'est unique que par routeur
+            identity = f"{scope}\x1e".encode('utf-8') + identity
+        return hashlib.sha1(identity).digest()[:16]
+
+    def __contains__(self, key):
+        return key in self._keys
+
+    def __len__(self):
+        return len(self._keys)
+
+    def add(self, key):
+        if key in self._keys:
+            return
+        self._keys.add(key)
+        self.db.execute("INSERT OR IGNORE INTO delivered (key, delivered_at) VALUES (?, ?)", (key, time.time()))
+        self.db.commit()
+        self._adds_since_prune += 1
+        if self._adds_since_prune >= max(100, self.max_entries // 10):
+            self.prune()
+
+    def prune(self):
+        self.db.execute("DELETE FROM delivered WHERE delivered_at < ?", (time.time() - self.retention,))
+        self.db.execute(
+            "DELETE FROM delivered WHERE key NOT IN "
+            "(SELECT key FROM delivered ORDER BY delivered_at DESC LIMIT ?)", (self.max_entries,))
+        self.db.commit()
+        self._keys = {row[0] for row in self.db.execute("SELECT key FROM delivered")}
+        self._adds_since_prune = 0
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,155 @@
+import asyncio
+import re
+import time
+from collections import deque
+
+# États publiés après l'acceptation d'un SMS par le routeur (send-sms OK)
+SUBMITTED = "submitted"
+FAILED = "failed"
+DELIVERED = "delivered"
+UNCONFIRMED = "unconfirmed"
+# Sans verdict de send-status passé ce délai (secondes), le suivi de la
+# soumission est abandonné ; seul l'accusé de réception peut encore conclure
+SUBMIT_TIMEOUT = 120
+
+
+def phone_key(number):
+    # Numéros comparés sur leurs 9 derniers chiffres : les accusés et
+    # send-status n'ont pas toujours le format de la demande (+33..., 06...)
+    return re.sub(r"\D", "", number or "")[-9:]
+
+
+def split_phones(value):
+    return [phone for phone in re.split(r"[;,]", value or "") if phone.strip()]
+
+
+class DeliveryTracker:
+    # Suivi des SMS acceptés par un routeur jusqu'à leur état final, sans
+    # aucune requête : le routeur fournit les réponses de send-status
+    # (soumission au réseau, pour le dernier envoi seulement) et les accusés
+    # de réception relevés dans la boîte de réception. Chaque méthode renvoie
+    # les transitions (entrée, état) à publier. Utilisé depuis la boucle asyncio.
+    def __init__(self, report_timeout=3600, submit_timeout=SUBMIT_TIMEOUT, clock=time.monotonic):
+        # 0 : pas d'attente d'accusé, la soumission est l'état final
+        self.report_timeout = report_timeout
+        self.submit_timeout = submit_timeout
+        self.clock = clock
+        # Envois (une requête send-sms chacun) attendant leur verdict send-status
+        self.jobs = deque()
+        # SMS attendant leur accusé de réception, du plus ancien au plus récent
+        self.awaiting_reports = []
+        self.counts = {SUBMITTED: 0, FAILED: 0, DELIVERED: 0, UNCONFIRMED: 0}
+        self.unmatched_reports = 0
+        self._added = None
+
+    def track(self, entries):
+        now = self.clock()
+        self.jobs.append({"accepted_at": now,
+                          "pending": [{"entry": entry, "key": phone_key(entry["number"]), "accepted_at": now,
+                                       "submitted": False} for entry in entries]})
+        if self._added is not None:
+            self._added.set()
+
+    def awaiting_submission(self):
+        return bool(self.jobs)
+
+    def apply_status(self, status):
+        # send-status ne décrit que le dernier envoi du routeur : les envois
+        # plus anciens encore sans verdict n'en auront plus
+        succeeded = {phone_key(phone) for phone in split_phones(status.get("SucPhone"))}
+        failed = {phone_key(phone) for phone in split_phones(status.get("FailPhone"))}
+        current = {phone_key(phone) for phone in split_phones(status.get("Phone"))}
+        seen = succeeded | failed | current
+        position = next((position for position in range(len(self.jobs) - 1, -1, -1)
+                         if any(tracked["key"] in seen for tracked in self.jobs[position]["pending"])), None)
+        if position is None:
+            return []
+        transitions = []
+        for _ in range(position):
+            transitions += self._settle(self.jobs.popleft()["pending"])
+        job = self.jobs[0]
+        for tracked in list(job["pending"]):
+            if tracked["key"] in failed:
+                job["pending"].remove(tracked)
+                transitions.append(self._finish(tracked, FAILED))
+            elif tracked["key"] in succeeded:
+                job["pending"].remove(tracked)
+                tracked["submitted"] = True
+                transitions += self._settle([tracked])
+        total, done = status.get("TotalCount"), status.get("CurIndex")
+        if not job["pending"] or (total and done is not None and done >= total):
+            transitions += self._settle(self.jobs.popleft()["pending"])
+        return transitions
+
+    def report(self, phone):
+        # Accusé de réception : le plus ancien SMS en attente vers ce numéro
+        key = phone_key(phone)
+        for tracked in self.awaiting_reports:
+            if tracked["key"] == key:
+                self.awaiting_reports.remove(tracked)
+                return [self._finish(tracked, DELIVERED)]
+        # Accusé arrivé avant le verdict de send-status
+        for job in self.jobs:
+            for tracked in job["pending"]:
+                if tracked["key"] == key:
+                    job["pending"].remove(tracked)
+                    if not job["pending"]:
+                        self.jobs.remove(job)
+                    return [self._finish(tracked, DELIVERED)]
+        self.unmatched_reports += 1
+        return []
+
+    def expire(self):
+        now = self.clock()
+        transitions = []
+        while self.jobs and now - self.jobs[0]["accepted_at"] >= self.submit_timeout:
+            transitions += self._settle(self.jobs.popleft()["pending"])
+        while self.awaiting_reports and now - self.awaiting_reports[0]["accepted_at"] >= self.report_timeout:
+            transitions.append(self._finish(self.awaiting_reports.pop(0), UNCONFIRMED))
+        return transitions
+
+    def next_deadline(self):
+        # Prochaine échéance d'expiration (horloge du suivi), None sans SMS suivi
+        deadlines = []
+        if self.jobs:
+            deadlines.append(self.jobs[0]["accepted_at"] + self.submit_timeout)
+        if self.awaiting_reports:
+            deadlines.append(self.awaiting_reports[0]["accepted_at"] + self.report_timeout)
+        return min(deadlines, default=None)
+
+    async def wait_tracked(self, timeout):
+        # Attend un nouvel envoi à suivre, au plus `timeout` secondes (None : sans limite)
+        if self._added is None:
+            self._added = asyncio.Event()
+        self._added.clear()
+        try:
+            await asyncio.wait_for(self._added.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+    def _settle(self, pending):
+        # Soumission conclue (ou plus connaissable) : attente de l'accusé
+        transitions = []
+        for tracked in pending:
+            if tracked["submitted"]:
+                self.counts[SUBMITTED] += 1
+                transitions.append((tracked["entry"], SUBMITTED))
+            if self.report_timeout > 0:
+                self.awaiting_reports.append(tracked)
+            elif not tracked["submitted"]:
+                transitions.append(self._finish(tracked, UNCONFIRMED))
+        if self.report_timeout > 0:
+            self.awaiting_reports.sort(key=lambda tracked: tracked["accepted_at"])
+        return transitions
+
+    def _finish(self, tracked, state):
+        self.counts[state] += 1
+        return tracked["entry"], state
+
+    def stats(self):
+        return {
+            "awaiting_submission": sum(len(job["pending"]) for job in self.jobs),
+            "awaiting_report": len(self.awaiting_reports),
+            "unmatched_reports": self.unmatched_reports,
+            **self.counts,
+        }
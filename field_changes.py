@@ -0,0 +1,55 @@
+import re
+import time
+
+NUMBER = re.compile(r"-?\d+(?:\.\d+)?")
+
+
+def parse_number(value):
+    # Valeurs HiLink avec unité : "-95dBm", "-10.5dB", ">=-51dBm"
+    match = NUMBER.search(value or "")
+    return float(match.group()) if match else None
+
+
+class FieldTracker:
+    # Détection de changements champ par champ pour un bloc d'informations
+    # (statut, signal, réseau). Les champs volatils (uptime...) ne déclenchent
+    # jamais de publication ; un champ numérique avec bande morte n'est
+    # republié que s'il s'écarte d'au moins cette bande de la dernière valeur
+    # publiée (pas de la précédente : une dérive lente finit par passer).
+    def __init__(self, volatile=(), deadbands=None, clock=time.monotonic):
+        self.clock = clock
+        self.volatile = frozenset(volatile)
+        self.deadbands = deadbands or {}
+        self.published = {}
+        # Dernier relevé complet, republié à la reconnexion MQTT
+        self.values = None
+        self.last_snapshot = None
+
+    def changes(self, values):
+        self.values = values
+        changed = {}
+        for field, value in values.items():
+            if field in self.volatile:
+                continue
+            if field in self.published and not self._differs(field, self.published[field], value):
+                continue
+            changed[field] = value
+        self.published.update(changed)
+        return changed
+
+    def _differs(self, field, old, new):
+        if old == new:
+            return False
+        band = self.deadbands.get(field)
+        if band:
+            old_number, new_number = parse_number(old), parse_number(new)
+            if old_number is not None and new_number is not None:
+                return abs(new_number - old_number) >= band
+        return True
+
+    def snapshot_due(self, interval):
+        now = self.clock()
+        if self.last_snapshot is not None and now - self.last_snapshot < interval:
+            return False
+        self.last_snapshot = now
+        return True
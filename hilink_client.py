@@ -0,0 +1,303 @@
+import asyncio
+import logging
+import time
+import pycurl
+from io import BytesIO
+from hilink_xml import HiLinkError, SES_TOK_INFO, parse_error
+from request_governor import RequestGovernor, lane_for
+
+
+class HiLinkResponse:
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def text(self):
+        return self.body.decode('utf-8')
+
+
+class HiLinkClient:
+    # Client HTTP asynchrone du routeur : un CurlMulti piloté par la boucle
+    # asyncio (add_reader/add_writer). Les handles pycurl sont réutilisés et
+    # partagent le cache de connexions keep-alive du multi. Concurrence et
+    # priorités des requêtes sont arbitrées par le régulateur (governor).
+    def __init__(self, host, max_concurrency=2, timeout=10, connect_timeout=5, on_response=None, breaker=None,
+                 governor=None):
+        self.base_url = f"http://{host}"
+        # Sans régulateur fourni : priorités seules, aucune requête abandonnée
+        self.governor = governor or RequestGovernor(max_concurrency, shed_wait=0, sheddable=())
+        self.max_concurrency = self.governor.max_concurrency
+        self.timeout = timeout
+        self.connect_timeout = connect_timeout
+        self.requests_count = 0
+        # on_response(path, durée, erreur ou None) après chaque requête (métriques)
+        self.on_response = on_response
+        # Disjoncteur partagé par toutes les requêtes vers ce routeur
+        self.breaker = breaker
+        self.loop = None
+        self.multi = None
+        self._idle = []
+        self._pending = {}
+        self._fds = {}
+        self._timer = None
+
+    def _bind(self):
+        loop = asyncio.get_running_loop()
+        if self.loop is loop:
+            return
+        self.close()
+        self.loop = loop
+        self.multi = pycurl.CurlMulti()
+        self.multi.setopt(pycurl.M_SOCKETFUNCTION, self._socket_callback)
+        self.multi.setopt(pycurl.M_TIMERFUNCTION, self._timer_callback)
+        self.multi.setopt(pycurl.M_MAXCONNECTS, self.max_concurrency)
+
+    def _socket_callback(self, event, fd, multi, data):
+        # Synchronise les sockets surveillés par la boucle avec les besoins de libcurl
+        if fd in self._fds:
+            self.loop.remove_reader(fd)
+            self.loop.remove_writer(fd)
+            del self._fds[fd]
+        if event == pycurl.POLL_REMOVE:
+            return
+        if event in (pycurl.POLL_IN, pycurl.POLL_INOUT):
+            self.loop.add_reader(fd, self._on_socket, fd, pycurl.CSELECT_IN)
+        if event in (pycurl.POLL_OUT, pycurl.POLL_INOUT):
+            self.loop.add_writer(fd, self._on_socket, fd, pycurl.CSELECT_OUT)
+        self._fds[fd] = event
+
+    def _timer_callback(self, timeout_ms):
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        if timeout_ms >= 0:
+            self._timer = self.loop.call_later(timeout_ms / 1000, self._on_socket,
+                                               pycurl.SOCKET_TIMEOUT, 0)
+
+    def _on_socket(self, fd, event):
+        while True:
+            ret, _ = self.multi.socket_action(fd, event)
+            if ret != pycurl.E_CALL_MULTI_PERFORM:
+                break
+        self._collect()
+
+    def _collect(self):
+        while True:
+            queued, ok_list, err_list = self.multi.info_read()
+            for c in ok_list:
+                self._finish(c, None)
+            for c, errno, errmsg in err_list:
+                self._finish(c, pycurl.error(errno, errmsg))
+            if queued == 0:
+                break
+
+    def _finish(self, c, error):
+        self.multi.remove_handle(c)
+        future, buffer, response_headers = self._pending.pop(c)
+        if error is not None:
+            # Handle dans un état incertain : on le remplace par un neuf
+            c.close()
+            if not future.done():
+                future.set_exception(error)
+            return
+        status = c.getinfo(c.RESPONSE_CODE)
+        self._idle.append(c)
+        self.requests_count += 1
+        if not future.done():
+            future.set_result(HiLinkResponse(status, response_headers, buffer.getvalue()))
+
+    def _prepare(self, c, path, data, headers, buffer, response_headers):
+        # reset() conserve les connexions ouvertes du handle
+        c.reset()
+        c.setopt(c.URL, f"{self.base_url}{path}")
+        c.setopt(c.WRITEDATA, buffer)
+        c.setopt(c.TIMEOUT, self.timeout)
+        c.setopt(c.CONNECTTIMEOUT, self.connect_timeout)
+        c.setopt(c.TCP_KEEPALIVE, 1)
+        c.setopt(c.NOSIGNAL, 1)
+
+        def header_function(line):
+            line = line.decode('iso-8859-1').strip()
+            if ':' in line:
+                name, value = line.split(':', 1)
+                response_headers[name.strip().lower()] = value.strip()
+
+        c.setopt(c.HEADERFUNCTION, header_function)
+        if headers:
+            c.setopt(c.HTTPHEADER, headers)
+        if data is not None:
+            if isinstance(data, str):
+                data = data.encode('utf-8')
+            c.setopt(c.POSTFIELDS, data)
+
+    async def request(self, path, data=None, headers=None):
+        self._bind()
+        if self.breaker:
+            self.breaker.before_request()
+        try:
+            response = await self._request(path, data, headers)
+        except pycurl.error:
+            # Routeur muet (connexion refusée, timeout...) ; une erreur HiLink
+            # ou un statut HTTP d'erreur prouvent au contraire qu'il répond
+            if self.breaker:
+                self.breaker.record_failure()
+            raise
+        except BaseException:
+            # Annulation ou erreur locale : pas de verdict sur le routeur
+            if self.breaker:
+                self.breaker.release()
+            raise
+        if self.breaker:
+            self.breaker.record_success()
+        return response
+
+    async def _request(self, path, data, headers):
+        await self.governor.acquire(lane_for(path))
+        try:
+            c = self._idle.pop() if self._idle else pycurl.Curl()
+            buffer = BytesIO()
+            response_headers = {}
+            self._prepare(c, path, data, headers, buffer, response_headers)
+            future = self.loop.create_future()
+            self._pending[c] = (future, buffer, response_headers)
+            self.multi.add_handle(c)
+            started = time.monotonic()
+            # Démarre le transfert ; la suite est pilotée par les callbacks
+            self._on_socket(pycurl.SOCKET_TIMEOUT, 0)
+            try:
+                response = await future
+            except asyncio.CancelledError:
+                if c in self._pending:
+                    self.multi.remove_handle(c)
+                    del self._pending[c]
+                    c.close()
+                raise
+            except Exception as e:
+                if self.on_response:
+                    self.on_response(path, time.monotonic() - started, e)
+                raise
+            if self.on_response:
+                self.on_response(path, time.monotonic() - started, None)
+            return response
+        finally:
+            self.governor.release()
+
+    def close(self):
+        if self.multi is None:
+            return
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        for fd in list(self._fds):
+            self.loop.remove_reader(fd)
+            self.loop.remove_writer(fd)
+        self._fds = {}
+        for c in list(self._pending):
+            self.multi.remove_handle(c)
+            c.close()
+        self._pending = {}
+        for c in self._idle:
+            c.close()
+        self._idle = []
+        self.multi.close()
+        self.multi = None
+        self.loop = None
+
+
+# Codes d'erreur HiLink signalant une session ou un token rejeté
+SESSION_ERROR_CODES = {"125001", "125002", "125003"}
+# Codes d'erreur HiLink signalant un endpoint non pris en charge par le firmware
+UNSUPPORTED_ERROR_CODES = {"100002"}
+
+
+class HiLinkSession:
+    # Cache le couple SesInfo/TokInfo et ne le redemande au routeur qu'à
+    # l'expiration ou lorsque le routeur rejette la session.
+    def __init__(self, client, token_ttl=240, logger=None):
+        self.client = client
+        self.token_ttl = token_ttl
+        self.logger = logger or logging.getLogger("HiLinkSession")
+        self.cookie = None
+        self.token = None
+        self.expires_at = 0
+        self.token_fetches = 0
+        self.token_fetches_avoided = 0
+        # Code d'erreur HiLink -> nombre d'occurrences
+        self.error_counts = {}
+        self._refreshing = None
+        # Chaque POST consomme le token courant : les POST sont donc sérialisés
+        self._post_lock = asyncio.Lock()
+
+    async def refresh(self):
+        # Plusieurs requêtes concurrentes partagent un même renouvellement
+        if self._refreshing is None or self._refreshing.done():
+            self._refreshing = asyncio.ensure_future(self._fetch_tokens())
+        await asyncio.shield(self._refreshing)
+
+    async def _fetch_tokens(self):
+        response = await self.client.request("/api/webserver/SesTokInfo")
+        tokens = SES_TOK_INFO.parse(response.body)
+        self.cookie = tokens['SesInfo']
+        self.token = tokens['TokInfo']
+        self.expires_at = time.monotonic() + self.token_ttl
+        self.token_fetches += 1
+        self.logger.debug(f"Tokens mis à jour - Cookie: {self.cookie[:10]}... Token: {self.token[:10]}...")
+
+    def invalidate(self):
+        self.expires_at = 0
+
+    def _headers(self, form):
+        headers = [
+            f"Cookie: {self.cookie}",
+            f"__RequestVerificationToken: {self.token}",
+        ]
+        if form:
+            headers.append("Content-Type: application/x-www-form-urlencoded; charset=UTF-8")
+        return headers
+
+    def _absorb(self, headers):
+        # Le routeur renvoie un nouveau token (et parfois un nouveau cookie)
+        # dans les en-têtes de réponse : on le réutilise pour la requête suivante.
+        token = headers.get('__requestverificationtoken')
+        cookie = headers.get('set-cookie')
+        if token:
+            self.token = token.split('#')[0]
+            self.expires_at = time.monotonic() + self.token_ttl
+        if cookie and cookie.startswith('SessionID='):
+            self.cookie = cookie.split(';')[0]
+
+    async def ensure(self):
+        if self.cookie is None or time.monotonic() >= self.expires_at:
+            await self.refresh()
+        else:
+            self.token_fetches_avoided += 1
+
+    async def request(self, path, data=None):
+        if data is None:
+            return await self._request(path, data)
+        async with self._post_lock:
+            return await self._request(path, data)
+
+    async def _request(self, path, data):
+        await self.ensure()
+        for attempt in range(2):
+            response = await self.client.request(path, data, self._headers(form=data is not None))
+            self._absorb(response.headers)
+            error = parse_error(response.body)
+            if error is None:
+                return response
+            code, message = error
+            self.error_counts[code] = self.error_counts.get(code, 0) + 1
+            if code in SESSION_ERROR_CODES and attempt == 0:
+                self.logger.info(f"Session rejetée par le routeur (code {code}), renouvellement des tokens")
+                await self.refresh()
+                continue
+            raise HiLinkError(code, message)
+
+    def stats(self):
+        return {
+            "token_fetches": self.token_fetches,
+            "token_fetches_avoided": self.token_fetches_avoided,
+            "errors": dict(self.error_counts),
+        }
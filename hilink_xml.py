@@ -0,0 +1,126 @@
+import html
+import re
+
+# Analyse des réponses XML HiLink directement sur les octets, sans construire
+# d'arbre ElementTree ni faire de recherches .//champ. Les réponses du routeur
+# sont plates (<response><Champ>valeur</Champ>...) : chaque endpoint a son
+# schéma (champ -> convertisseur) et les balises inconnues sont ignorées.
+
+# <Champ>texte</Champ> ou <Champ/> ; une balise conteneur (<response>,
+# <Messages>) ne correspond pas et est simplement sautée
+TAG = re.compile(rb"<([A-Za-z_][\w.-]*)\s*(?:/>|>([^<]*)</\1>)")
+# Ordre des champs d'un <Message> tel qu'émis par le firmware : une seule
+# correspondance en C par SMS. Un ordre différent repasse par SMS_MESSAGE.
+MESSAGE = re.compile(rb"\s*<Smstat>([^<]*)</Smstat>\s*<Index>([^<]*)</Index>\s*<Phone>([^<]*)</Phone>"
+                     rb"\s*<Content>([^<]*)</Content>\s*<Date>([^<]*)</Date>")
+
+
+class HiLinkError(Exception):
+    def __init__(self, code, message=""):
+        super().__init__(f"Erreur HiLink {code}{' : ' + message if message else ''}")
+        self.code = code
+        self.message = message
+
+
+def text(raw):
+    # Comme ElementTree : élément vide -> None
+    if not raw:
+        return None
+    value = raw.decode('utf-8')
+    return html.unescape(value) if "&" in value else value
+
+
+def integer(raw):
+    try:
+        return int(raw)
+    except ValueError:
+        return None  # Champ vide ou non numérique
+
+
+class Schema:
+    # Champs attendus -> convertisseur. Chaque champ est localisé par
+    # bytes.find (code C) dans les bornes de la réponse ou du fragment, sans
+    # décoder ni parcourir le reste du document ; absent ou vide -> None.
+    def __init__(self, **fields):
+        self.names = tuple(fields)
+        self.tags = tuple((name, f"<{name}>".encode('ascii'), f"</{name}>".encode('ascii'), convert)
+                          for name, convert in fields.items())
+
+    def parse(self, body, start=0, end=None):
+        check_error(body)
+        return self._parse(body, start, len(body) if end is None else end)
+
+    def _parse(self, body, start, end):
+        result = {}
+        find = body.find
+        for name, opening, closing, convert in self.tags:
+            position = find(opening, start, end)
+            if position < 0:
+                result[name] = None
+                continue
+            position += len(opening)
+            stop = find(closing, position, end)
+            result[name] = convert(body[position:stop]) if stop >= 0 else None
+        return result
+
+
+ERROR = Schema(code=text, message=text)
+SES_TOK_INFO = Schema(SesInfo=text, TokInfo=text)
+# Valeurs republiées telles quelles sur MQTT : gardées en texte
+SIGNAL = Schema(rsrp=text, rsrq=text, rssi=text, sinr=text, cell_id=text, pci=text, ecio=text, mode=text)
+NOTIFICATIONS = Schema(UnreadMessage=integer)
+SMS_COUNT = Schema(LocalUnread=integer, LocalInbox=integer, LocalMax=integer)
+# <SmsType> d'un accusé de réception
+STATUS_REPORT_TYPE = 7
+STATUS_REPORT = b"<SmsType>7</SmsType>"
+SMS_MESSAGE = Schema(Smstat=integer, Index=integer, Phone=text, Content=text, Date=text, SmsType=integer)
+# Dernier envoi : destinataire en cours, destinataires soumis et en échec
+SEND_STATUS = Schema(Phone=text, SucPhone=text, FailPhone=text, TotalCount=integer, CurIndex=integer)
+
+
+def parse_error(body):
+    # Retourne (code, message) d'une réponse <error>, sinon None
+    if b"<error>" not in body[:200]:
+        return None
+    error = ERROR._parse(body, 0, len(body))
+    return (error["code"] or "").strip(), (error["message"] or "").strip()
+
+
+def check_error(body):
+    error = parse_error(body)
+    if error is not None:
+        raise HiLinkError(*error)
+
+
+def parse_fields(body):
+    # Tous les champs d'une réponse plate, dans l'ordre (statut, informations)
+    check_error(body)
+    return {match.group(1).decode('ascii'): text(match.group(2) or b"") for match in TAG.finditer(body)}
+
+
+def iter_messages(body):
+    # Réponse sms-list : les SMS sont décodés au fil de l'itération, sans
+    # copier les fragments <Message> ni construire d'arbre. 'Report' : accusé
+    # de réception d'un SMS envoyé (<SmsType>7</SmsType>) plutôt qu'un SMS reçu
+    check_error(body)
+    find = body.find
+    match_message = MESSAGE.match
+    # Accusés de réception cherchés message par message seulement si la page en contient
+    reports = STATUS_REPORT in body
+    position = find(b"<Message>")
+    while position >= 0:
+        start = position + 9
+        end = find(b"</Message>", start)
+        if end < 0:
+            break
+        match = match_message(body, start, end)
+        if match:
+            smstat, index, phone, content, date = match.groups()
+            yield {'Smstat': integer(smstat), 'Index': integer(index), 'Phone': text(phone),
+                   'Content': text(content), 'Date': text(date),
+                   'Report': reports and find(STATUS_REPORT, match.end(), end) >= 0}
+        else:
+            message = SMS_MESSAGE._parse(body, start, end)
+            message['Report'] = message.pop('SmsType') == STATUS_REPORT_TYPE
+            yield message
+        position = find(b"<Message>", end + 10)
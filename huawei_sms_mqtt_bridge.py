@@ -1,449 +1,1451 @@
-import logging
 import time
+
+# Origine des jalons de démarrage : avant les autres imports
+STARTED = time.monotonic()
+
+import logging
 import os
 import signal
+import threading
 import json
 import asyncio
-import pycurl
 import html
-import urllib.parse
-import threading
 import paho.mqtt.client as mqtt
+from paho.mqtt.packettypes import PacketTypes
+from paho.mqtt.properties import Properties
 from datetime import datetime
-from xml.etree import ElementTree as ET
 from dotenv import load_dotenv
-from queue import Queue
-from io import BytesIO
+from hilink_client import HiLinkClient, HiLinkSession, HiLinkError, UNSUPPORTED_ERROR_CODES
+from adaptive_polling import AdaptiveInterval, LatencyAverage, POLL_KINDS
+from circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, STATE_VALUES
+from request_governor import RequestGovernor, RequestShedError, LANES
+from delivery_tracker import DeliveryTracker, FAILED
+import hilink_xml
+from scheduler import Scheduler
+from rate_limit import TokenBucket
+from delivered_index import DeliveredSMSIndex
+from outbound_spool import OutboundSpool, TERMINAL_STATES
+from inbound_buffer import InboundBuffer
+from field_changes import FieldTracker
+from sim_pool import PoolMember, SimPool, signal_quality, STRATEGIES
+from metrics import MetricsRegistry, LAG_BUCKETS, start_http_server
+from profiling import Profiler, StartupTimeline, Tracer
+import sms_encoding
 
-class HuaweiSMSMQTTBridge:
-    def __init__(self):
-        self.load_config()
-        self.setup_logging()
-        self.running = True
-        self.mqtt_client = None
-        self.sms_queue = Queue()
-        self.cookie = None
-        self.token = None
-        self.last_sms_time = 0
-        self.sms_cooldown = 10  # Temps d'attente entre les SMS en secondes
-        self.check_interval = 60  # 60 secondes entre chaque vérification
-        self.sms_check_interval = 30  # 30 secondes entre chaque vérification des SMS
-        self.last_status_check = 0
-        self.last_signal_check = 0
-        self.last_network_check = 0
-        self.last_sms_check = 0
-        self.old_status_info = {}        
-        self.old_signal_info = {}
-        self.old_network_info = {}
-        self.loop = None
+DEFAULT_ROUTER_NAME = "default"
+DEFAULT_POLL_BOUNDS = "status=15:300,signal=30:900,network=300:3600,sms=3:60"
+MQTT_PROTOCOLS = {"3.1": mqtt.MQTTv31, "3.1.1": mqtt.MQTTv311, "5": mqtt.MQTTv5}
+# Attente avant de marquer lus les SMS acquittés : les PUBACK d'une rafale
+# sont regroupés en un seul set-read
+READ_MARK_DELAY = 0.2
+# Échecs consécutifs de la sonde des SMS non lus avant le repli sur la suivante
+PROBE_MAX_FAILURES = 3
+# Codes d'erreur de set-read signalant une requête à plusieurs <Index> non
+# prise en charge (100005 : format de requête refusé)
+BATCH_READ_REFUSED_CODES = UNSUPPORTED_ERROR_CODES | {"100005"}
+
+
+class RouterWorker:
+    # État et tâches propres à un routeur HiLink : session, tâches périodiques,
+    # file d'envoi et namespace MQTT. Tous les routeurs partagent la boucle
+    # asyncio, l'ordonnanceur et le client MQTT du bridge ; une panne reste
+    # confinée à son routeur.
+    def __init__(self, bridge, name, host, namespaced=False):
+        self.bridge = bridge
+        self.name = name
+        self.host = host
+        self.namespaced = namespaced
+        if namespaced:
+            self.prefix = f"{bridge.mqtt_prefix}/{name}"
+            self.job_prefix = f"{name}:"
+            self.logger = bridge.logger.getChild(name)
+        else:
+            # Routeur unique : topics et noms de tâches inchangés
+            self.prefix = bridge.mqtt_prefix
+            self.job_prefix = ""
+            self.logger = bridge.logger
+        # File d'envoi : listes de SMS de même texte, envoyées en une requête
+        self.sms_queue = None
+        self.queued_sms = 0
+        self.sms_bucket = TokenBucket(bridge.sms_rate_per_minute, bridge.sms_rate_burst)
+        self.sms_queue_stats = {"depth": 0, "last_wait": 0.0, "max_wait": 0.0}
+        self.pool_member = PoolMember(name, self.sms_bucket)
+        trackers = {"volatile": bridge.volatile_fields, "deadbands": bridge.delta_deadbands}
+        self.status_tracker = FieldTracker(**trackers)
+        self.signal_tracker = FieldTracker(**trackers)
+        self.network_tracker = FieldTracker(**trackers)
+        self.sms_backlog_mode = False
+        self.sms_batch_read_supported = True
+        self.sms_probe_endpoint = "/api/monitoring/check-notifications"
+        # Faux sur un firmware sans send-status : plus aucune interrogation
+        self.send_status_supported = True
+        self.sms_probe_failures = 0
+        self.sms_unread_count = None
+        self.read_marks = []
+        self.read_task = None
+        # SMS publiés dont le marquage lu n'est pas encore fait
+        self.read_pending = 0
         self.router_connected = True
-        self.router_check_interval = 30  # Vérifier la connexion du routeur toutes les 30 secondes
-        self.last_router_check = 0
-        
-    def setup_logging(self):
-        numeric_level = getattr(logging, self.debug_level, None)
-        if not isinstance(numeric_level, int):
-            raise ValueError(f'Niveau de log invalide : {self.debug_level}')
-        
-        logging.basicConfig(level=numeric_level,
-                            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
-        self.logger = logging.getLogger("HuaweiSMSMQTTBridge")
-        self.logger.info(f"Niveau de logging configuré à : {self.debug_level}")
+        # Suivi des SMS acceptés jusqu'à leur soumission et leur accusé de réception (DELIVERY_TRACKING)
+        self.delivery = DeliveryTracker(bridge.delivery_report_timeout) if bridge.delivery_tracking else None
+        # Scrutation adaptative (ADAPTIVE_POLLING) : période propre à chaque relevé
+        self.latency = LatencyAverage()
+        self.poll_intervals = None
+        if bridge.adaptive_polling:
+            self.poll_intervals = {kind: AdaptiveInterval(*bridge.poll_bounds[kind], bridge.poll_backoff)
+                                   for kind in POLL_KINDS}
+        # Routeur muet : requêtes refusées sans attendre leur timeout, reprise
+        # par une sonde après un backoff exponentiel
+        self.breaker = CircuitBreaker(bridge.router_failure_threshold, bridge.router_backoff_base,
+                                      bridge.router_backoff_max, on_change=self.on_circuit_change)
+        # Toutes les requêtes au routeur passent par le régulateur : envois
+        # d'abord, puis boîte de réception, statut, signal et réseau
+        self.governor = RequestGovernor(bridge.router_max_concurrency, bridge.router_max_rps,
+                                        bridge.router_shed_wait, on_wait=self.observe_wait,
+                                        on_shed=self.observe_shed)
+        self.client = HiLinkClient(host,
+                                   timeout=bridge.router_timeout,
+                                   on_response=self.observe_request,
+                                   breaker=self.breaker,
+                                   governor=self.governor)
+        self.session = HiLinkSession(self.client, token_ttl=bridge.router_token_ttl, logger=self.logger)
 
-    @staticmethod
-    def get_env(key, default=None):
-        value = os.environ.get(key, default)
-        if value is None:
-            raise ValueError(f"La variable d'environnement '{key}' est requise mais n'est pas définie.")
-        return value
+    def job(self, kind):
+        return f"{self.job_prefix}{kind}"
 
-    def load_config(self):
-        if os.path.exists('.env'):
-            load_dotenv()
-        self.mqtt_prefix = self.get_env("MQTT_TOPIC")
-        self.mqtt_host = self.get_env("MQTT_IP")
-        self.mqtt_port = int(self.get_env("PORT", "1883"))
-        self.mqtt_client_id = self.get_env("CLIENTID")
-        self.mqtt_user = self.get_env("MQTT_ACCOUNT")
-        self.mqtt_password = self.get_env("MQTT_PASSWORD")
-        self.huawei_router_ip = self.get_env("HUAWEI_ROUTER_IP_ADDRESS")
-        self.check_interval = int(self.get_env("CHECK_INTERVAL", "60"))
-        self.sms_check_interval = int(self.get_env("SMS_CHECK_INTERVAL", "30"))
-        self.debug_level = os.environ.get("DEBUG_LEVEL", "INFO").upper()
-        valid_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
-        if self.debug_level not in valid_levels:
-            raise ValueError(f"Niveau de debug invalide : {self.debug_level}. Les valeurs valides sont : {', '.join(valid_levels)}")
+    def publish(self, topic, payload, qos=0, retain=False):
+        with self.bridge.tracer.span("mqtt.publish", router=self.name, topic=topic):
+            info = self.bridge.mqtt_publish(f"{self.prefix}/{topic}", payload, qos, retain)
+        self.bridge.mqtt_published_total.inc(self.name)
+        return info
 
-    async def check_router_connection(self):
-        failed_attempts = 0
-        max_failed_attempts = 3  # Nombre maximal de tentatives avant l'arrêt
+    def parse_span(self, endpoint):
+        return self.bridge.tracer.span("parse", router=self.name, endpoint=endpoint)
 
-        while self.running:
+    def observe_request(self, path, duration, error):
+        self.bridge.router_request_seconds.observe(duration, self.name, path)
+        self.latency.observe(duration)
+        if error is not None:
+            self.bridge.router_request_failures_total.inc(self.name, path)
+            self.bridge.tracer.record("router.request", duration, router=self.name, endpoint=path, error=str(error))
+        else:
+            self.bridge.tracer.record("router.request", duration, router=self.name, endpoint=path)
+
+    def observe_wait(self, lane, waited):
+        self.bridge.router_queue_wait_seconds.observe(waited, self.name, lane)
+
+    def observe_shed(self, lane):
+        self.bridge.router_requests_shed_total.inc(self.name, lane)
+        self.logger.debug(f"Routeur saturé, relevé {lane} abandonné")
+
+    def add_jobs(self, scheduler, options, offset=0.0):
+        # offset : décalage de la première échéance pour étaler les routeurs ;
+        # le premier relevé de statut, signal et réseau est fait par bootstrap
+        for kind, func, first in (("status", self.check_and_publish_status_info, 1 + offset),
+                                  ("signal", self.get_signal_info, 1 + offset),
+                                  ("network", self.get_network_info, 1 + offset),
+                                  ("sms", self.check_and_publish_received_sms, offset)):
+            interval = self.poll_interval(kind)
+            scheduler.add_job(self.job(kind), interval, self.when_connected(func), delay=first * interval, **options)
+
+    def poll_interval(self, kind):
+        if self.poll_intervals is not None:
+            return self.poll_intervals[kind].interval
+        return self.bridge.sms_check_interval if kind == "sms" else self.bridge.check_interval
+
+    def adapt_polling(self, kind, changed):
+        # Après chaque relevé : nouvelle période appliquée dès la prochaine échéance
+        scheduler = self.bridge.scheduler
+        if self.poll_intervals is None or scheduler is None or self.job(kind) not in scheduler.jobs:
+            return
+        interval = self.poll_intervals[kind].update(changed, self.latency.factor(self.bridge.poll_latency_target))
+        scheduler.set_interval(self.job(kind), interval)
+
+    def polling_stats(self):
+        stats = {kind: self.poll_interval(kind) for kind in POLL_KINDS}
+        stats["latency_ms"] = round((self.latency.value or 0.0) * 1000, 1)
+        stats["latency_factor"] = round(self.latency.factor(self.bridge.poll_latency_target), 2)
+        return stats
+
+    def when_connected(self, func):
+        # Circuit ouvert : échéance sautée sans erreur ; les tâches sont
+        # relancées dès la fermeture du circuit
+        async def job():
+            if self.breaker.closed:
+                await func()
+        return job
+
+    def on_circuit_change(self, previous, state):
+        if state == OPEN and previous == CLOSED:
+            self.logger.error(f"Routeur injoignable, circuit ouvert : requêtes suspendues, nouvel essai dans {self.breaker.retry_in():.1f} secondes")
+            self.router_connected = False
+            self.pool_member.available = False
+            self.publish("router_status", "disconnected", retain=True)
+        elif state == OPEN:
+            self.logger.info(f"Routeur toujours injoignable, nouvel essai dans {self.breaker.retry_in():.1f} secondes")
+        elif state == CLOSED:
+            self.logger.info("Connexion au routeur rétablie")
+            self.bridge.mark_startup(self.milestone("router_session"))
+            self.router_connected = True
+            self.pool_member.available = True
+            self.publish("router_status", "connected", retain=True)
+            # Rattrapage immédiat de l'état et des SMS reçus pendant la panne
+            if self.bridge.scheduler is not None:
+                for kind in ("status", "signal", "network", "sms"):
+                    self.bridge.scheduler.trigger(self.job(kind))
+
+    def milestone(self, name):
+        return f"{name}:{self.name}" if self.namespaced else name
+
+    async def bootstrap(self):
+        # Démarrage : relevé complet dès l'ouverture de la session, sans
+        # attendre la première échéance des tâches périodiques (ni le broker :
+        # l'état relevé est republié à la connexion MQTT)
+        await self.get_session_token()
+        self.bridge.mark_startup(self.milestone("router_session"))
+        await asyncio.gather(self.check_and_publish_status_info(), self.get_signal_info(), self.get_network_info())
+
+    def publish_snapshot(self):
+        # Connexion (ou reconnexion) MQTT : les publications faites hors
+        # connexion sont perdues et le suivi des changements ne les referait
+        # pas ; le dernier état relevé est republié, retenu
+        bridge = self.bridge
+        self.publish("router_status", "connected" if self.router_connected else "disconnected", retain=True)
+        for kind, tracker, retain in (("status", self.status_tracker, True), ("signal", self.signal_tracker, False),
+                                      ("network", self.network_tracker, False)):
+            if tracker.values is None:
+                continue
+            if bridge.publish_field_topics:
+                for field, value in tracker.published.items():
+                    self.publish(f"{kind}/{field}", "" if value is None else value, 0, True)
+            if bridge.snapshot_mode != "off":
+                self.publish(kind, json.dumps(tracker.values), 0, retain)
+        if self.status_tracker.values is not None:
+            bridge.mark_startup(self.milestone("first_status"), report=True)
+
+    async def check_router_connection(self):
+        # Ne s'arrête jamais sur une panne : circuit fermé, vérification
+        # périodique avec les tokens en cache ; ouvert, sonde à l'échéance du
+        # backoff avec une nouvelle session. La première session est ouverte
+        # par bootstrap.
+        while self.bridge.running:
             try:
-                self.get_session_token()
-                if not self.router_connected:
-                    self.logger.info("Connexion au routeur rétablie")
-                    self.router_connected = True
-                    failed_attempts = 0  # Réinitialiser le compteur
-                    self.mqtt_client.publish(f"{self.mqtt_prefix}/router_status", "connected", retain=True)
-                await asyncio.sleep(self.router_check_interval)
+                if self.breaker.closed:
+                    # Réveil anticipé si le circuit s'ouvre entre-temps
+                    await self.breaker.wait_change(self.bridge.router_check_interval)
+                else:
+                    await asyncio.sleep(self.breaker.retry_in())
+                if self.breaker.closed:
+                    await self.session.request("/api/monitoring/status")
+                else:
+                    await self.get_session_token()
+                self.publish("router_session", json.dumps({**self.session.stats(), "circuit": self.breaker.stats()}))
             except asyncio.CancelledError:
                 self.logger.info("Tâche de vérification de la connexion du routeur annulée")
                 break
+            except (CircuitOpenError, RequestShedError):
+                # Circuit ouvert, ou routeur occupé par des requêtes prioritaires
+                pass
             except Exception as e:
-                self.logger.error(f"Erreur de connexion au routeur : {e}")
-                self.router_connected = False
-                failed_attempts += 1
-                self.mqtt_client.publish(f"{self.mqtt_prefix}/router_status", "disconnected", retain=True)
-                
-                if failed_attempts >= max_failed_attempts:
-                    self.logger.critical(f"Échec de connexion au routeur après {max_failed_attempts} tentatives. Arrêt du script.")
-                    self.running = False
-                    break
-                
-                await asyncio.sleep(self.router_check_interval)
+                # Sonde en échec : déjà signalée par le disjoncteur
+                if self.breaker.closed:
+                    self.logger.error(f"Erreur de connexion au routeur : {e}")
 
-    def get_session_token(self):
-        buffer = BytesIO()
-        c = pycurl.Curl()
-        c.setopt(c.URL, f"http://{self.huawei_router_ip}/api/webserver/SesTokInfo")
-        c.setopt(c.WRITEDATA, buffer)
-        c.perform()
-        c.close()
+    async def get_session_token(self):
+        await self.session.refresh()
 
-        response = buffer.getvalue().decode('utf-8')
-        root = ET.fromstring(response)
-        self.cookie = root.find('.//SesInfo').text
-        self.token = root.find('.//TokInfo').text
+    async def fetch_sms_page(self, page_index, page_size):
+        data = f"""<?xml version='1.0' encoding='UTF-8'?><request><PageIndex>{page_index}</PageIndex><ReadCount>{page_size}</ReadCount><BoxType>1</BoxType><SortType>0</SortType><Ascending>0</Ascending><UnreadPreferred>1</UnreadPreferred></request>"""
+        response = await self.session.request("/api/sms/sms-list", data)
+        # Les SMS sont décodés au fil de l'eau ; seuls les non lus sont conservés
+        total, unread = 0, []
+        with self.parse_span("/api/sms/sms-list"):
+            for message in hilink_xml.iter_messages(response.body):
+                total += 1
+                if message['Smstat'] == 0:
+                    unread.append(message)
+        return total, unread
+
+    async def probe_unread_sms_count(self):
+        # Sonde légère du nombre de SMS non lus. Repli sur sms-count si le
+        # firmware ne connaît pas check-notifications (endpoint non pris en
+        # charge ou réponse sans compteur), puis sur None (listage
+        # systématique) si aucun des deux n'est disponible. Une erreur
+        # passagère ne fait que remplacer la sonde par un listage pour ce
+        # cycle, jusqu'à PROBE_MAX_FAILURES échecs consécutifs.
+        while self.sms_probe_endpoint:
+            try:
+                response = await self.session.request(self.sms_probe_endpoint)
+            except HiLinkError as e:
+                if e.code not in UNSUPPORTED_ERROR_CODES:
+                    self.sms_probe_failures += 1
+                    if self.sms_probe_failures < PROBE_MAX_FAILURES:
+                        self.logger.debug(f"Sonde {self.sms_probe_endpoint} en échec ({e}), listage de la boîte de réception")
+                        return None
+                self.downgrade_sms_probe(str(e))
+                continue
+            with self.parse_span(self.sms_probe_endpoint):
+                if self.sms_probe_endpoint.endswith("check-notifications"):
+                    value = hilink_xml.NOTIFICATIONS.parse(response.body)['UnreadMessage']
+                else:
+                    value = hilink_xml.SMS_COUNT.parse(response.body)['LocalUnread']
+            if value is None:
+                # Compteur absent ou non numérique (page HTML d'erreur...)
+                self.downgrade_sms_probe("réponse sans nombre de SMS non lus")
+                continue
+            self.sms_probe_failures = 0
+            return value
+        return None
 
-        self.logger.debug(f"Tokens mis à jour - Cookie: {self.cookie[:10]}... Token: {self.token[:10]}...")
+    def downgrade_sms_probe(self, reason):
+        self.logger.info(f"Sonde {self.sms_probe_endpoint} indisponible ({reason})")
+        if self.sms_probe_endpoint == "/api/monitoring/check-notifications":
+            self.sms_probe_endpoint = "/api/sms/sms-count"
+        else:
+            self.sms_probe_endpoint = None
+        self.sms_probe_failures = 0
 
     async def check_and_publish_received_sms(self):
+        # On ne liste la boîte de réception que si le nombre de non lus a
+        # changé depuis le dernier listage (ou en mode rattrapage)
+        if not self.sms_backlog_mode:
+            unread_count = await self.probe_unread_sms_count()
+            if unread_count is not None:
+                # Les SMS en attente de publication restent non lus : seul un
+                # nombre de non lus supérieur signale un nouveau SMS
+                pending = self.bridge.inbound_buffer.pending(self.name) + self.read_pending
+                if unread_count <= pending or unread_count == self.sms_unread_count:
+                    # Sous le nombre en attente, aucune référence fiable : le
+                    # prochain dépassement déclenchera le listage
+                    self.sms_unread_count = unread_count if unread_count > pending else None
+                    self.logger.debug(f"Pas de nouveau SMS ({unread_count} non lu(s))")
+                    self.adapt_polling("sms", False)
+                    return
+        sms_processed = await self.process_received_sms()
+        if sms_processed and not self.sms_backlog_mode:
+            # Nombre de non lus restant réellement (SMS dont le marquage a échoué)
+            self.sms_unread_count = await self.probe_unread_sms_count()
+        self.adapt_polling("sms", bool(sms_processed))
+
+    async def process_received_sms(self):
+        # Mode normal : petites pages et budget réduit. Mode rattrapage (après
+        # une coupure) : pages maximales, gros budget et relance immédiate
+        # jusqu'à épuisement de l'arriéré.
+        bridge = self.bridge
+        if self.sms_backlog_mode:
+            page_size, budget = bridge.sms_drain_page_size, bridge.sms_drain_budget
+        else:
+            page_size, budget = bridge.sms_page_size, bridge.sms_cycle_budget
+        dedup_scope = self.name if self.namespaced else None
+        sms_processed = 0
         try:
-            self.get_session_token()
-            
             page_index = 1
-            max_sms_per_check = 5  # Limite le nombre de SMS traités à chaque vérification
-            sms_processed = 0
-
-            while sms_processed < max_sms_per_check:
-                buffer = BytesIO()
-                c = pycurl.Curl()
-                c.setopt(c.URL, f"http://{self.huawei_router_ip}/api/sms/sms-list")
-                c.setopt(c.HTTPHEADER, [
-                    f"Cookie: {self.cookie}",
-                    f"__RequestVerificationToken: {self.token}",
-                    "Content-Type: application/x-www-form-urlencoded; charset=UTF-8"
-                ])
-                data = f"""<?xml version='1.0' encoding='UTF-8'?><request><PageIndex>{page_index}</PageIndex><ReadCount>20</ReadCount><BoxType>1</BoxType><SortType>0</SortType><Ascending>0</Ascending><UnreadPreferred>1</UnreadPreferred></request>"""
-                c.setopt(c.POSTFIELDS, data)
-                c.setopt(c.WRITEDATA, buffer)
-                c.perform()
-                c.close()
-
-                response = buffer.getvalue().decode('utf-8')
-                root = ET.fromstring(response)
-
-                unread_messages = root.findall('.//Message[Smstat="0"]')
-                if not unread_messages:
-                    break  # Pas de nouveaux messages non lus sur cette page
-
-                for message in unread_messages:
-                    if sms_processed >= max_sms_per_check:
-                        break
+            seen = set()
+            while sms_processed < budget:
+                total, unread_messages = await self.fetch_sms_page(page_index, page_size)
+                new_messages = [m for m in unread_messages if m['Index'] not in seen]
+                if not new_messages:
+                    # Des SMS déjà traités restent non lus (marquage échoué ou
+                    # PUBACK attendu) : page suivante
+                    if unread_messages and total == page_size:
+                        page_index += 1
+                        continue
+                    break  # Pas de nouveaux messages non lus
+
+                batch = new_messages[:budget - sms_processed]
+                already_published = []
+                buffered = 0
+                buffer_full = False
+                for message in batch:
+                    sms_index = message['Index']
+                    phone = message['Phone']
+                    content = message['Content'] or ""
+                    date = message['Date']
+                    seen.add(sms_index)
 
-                    sms_index = message.find('Index').text
-                    phone = message.find('Phone').text
-                    content = message.find('Content').text
-                    date = message.find('Date').text
+                    if message['Report'] and self.delivery is not None:
+                        # Accusé de réception d'un SMS envoyé : rapproché de
+                        # son envoi et marqué lu, sans être publié comme reçu
+                        self.publish_delivery(self.delivery.report(phone))
+                        already_published.append(sms_index)
+                        continue
 
-                    # Publier le SMS reçu
+                    # SMS déjà publié (marquage comme lu échoué ou arrêt avant
+                    # le marquage) : on le marque comme lu sans le republier
+                    delivered_key = DeliveredSMSIndex.key(sms_index, phone, date, content, dedup_scope)
+                    if delivered_key in bridge.delivered_index:
+                        self.logger.debug(f"SMS {sms_index} de {phone} déjà publié, ignoré")
+                        already_published.append(sms_index)
+                        continue
+                    if delivered_key in bridge.inbound_buffer:
+                        continue  # Publication en attente du PUBACK
+
+                    # Mis en tampon pour publication ; marqué lu au PUBACK
                     payload = {
                         "sender": phone,
                         "message": content,
                         "date_received": date
                     }
-                    self.mqtt_client.publish(f"{self.mqtt_prefix}/received", json.dumps(payload))
+                    entry = {"key": delivered_key, "router": self.name, "index": sms_index, "payload": payload}
+                    if not bridge.inbound_buffer.add(entry):
+                        buffer_full = True
+                        break
+                    buffered += 1
                     self.logger.info(f"Nouveau SMS reçu de {phone} le {date}: {content[:20]}...")
-                    # Marquer le SMS comme lu
-                    await self.mark_sms_as_read(sms_index)
 
-                    sms_processed += 1
-                    await asyncio.sleep(0.5)  # Petit délai entre chaque traitement de SMS
-
-                page_index += 1
+                # SMS déjà publiés marqués lus en un minimum de requêtes ; les
+                # SMS lus remontent la page 1 au prochain tour
+                await self.mark_sms_as_read(already_published)
+                sms_processed += buffered + len(already_published)
+                if buffered:
+                    bridge.notify_inbound()
+                if buffer_full:
+                    self.logger.warning(f"Tampon des SMS reçus plein ({len(bridge.inbound_buffer)} SMS), "
+                                        f"les suivants restent non lus sur le routeur")
+                    break
+                if total < page_size:
+                    break
 
         except Exception as e:
             self.logger.error(f"Erreur lors de la vérification des SMS reçus : {e}")
 
-    async def mark_sms_as_read(self, sms_index):
-        try:
-            self.get_session_token()
-            buffer = BytesIO()
-            c = pycurl.Curl()
-            c.setopt(c.URL, f"http://{self.huawei_router_ip}/api/sms/set-read")
-            c.setopt(c.HTTPHEADER, [
-                f"Cookie: {self.cookie}",
-                f"__RequestVerificationToken: {self.token}",
-                "Content-Type: application/x-www-form-urlencoded; charset=UTF-8"
-            ])
-            data = f"""<?xml version='1.0' encoding='UTF-8'?><request><Index>{sms_index}</Index></request>"""
-            c.setopt(c.POSTFIELDS, data)
-            c.setopt(c.WRITEDATA, buffer)
-            c.perform()
-            c.close()
-
-            response = buffer.getvalue().decode('utf-8')
-            self.logger.debug(f"Réponse pour marquer le SMS comme lu : {response}")
+        self.update_sms_backlog_mode(sms_processed >= budget)
+        return sms_processed
 
-        except Exception as e:
-            self.logger.error(f"Erreur lors du marquage du SMS comme lu : {e}")
-
-    def encode_sms_content(self, content):
-        # Encode le contenu en UTF-8, puis le convertit en une chaîne URL-encodée
-        return content.encode('utf-8')
-
-    def send_sms(self, phone, content, retry=False, retry_count=0):
-        self.get_session_token()
-        current_time = time.time()
-        if not retry and current_time - self.last_sms_time < self.sms_cooldown:
-            wait_time = self.sms_cooldown - (current_time - self.last_sms_time)
-            self.logger.info(f"Attente de {wait_time:.2f} secondes avant le prochain envoi")
-            time.sleep(wait_time)
+    def update_sms_backlog_mode(self, budget_exhausted):
+        if budget_exhausted and not self.sms_backlog_mode:
+            self.logger.info("Arriéré de SMS détecté, passage en mode rattrapage")
+        elif not budget_exhausted and self.sms_backlog_mode:
+            self.logger.info("Arriéré de SMS résorbé, retour au mode normal")
+        self.sms_backlog_mode = budget_exhausted
+        if budget_exhausted and self.bridge.scheduler:
+            self.bridge.scheduler.trigger(self.job("sms"))
+
+    def queue_read_mark(self, sms_index):
+        # PUBACK reçu : marquage groupé des SMS acquittés pendant le marquage en cours
+        self.read_marks.append(sms_index)
+        self.read_pending += 1
+        if self.read_task is None or self.read_task.done():
+            self.read_task = asyncio.ensure_future(self.flush_read_marks())
+
+    async def flush_read_marks(self):
+        await asyncio.sleep(READ_MARK_DELAY)
+        while self.read_marks:
+            sms_indexes, self.read_marks = self.read_marks, []
+            try:
+                await self.mark_sms_as_read(sms_indexes)
+            finally:
+                self.read_pending -= len(sms_indexes)
+                # Le nombre de non lus a changé : la référence n'est plus valable
+                self.sms_unread_count = None
+
+    async def mark_sms_as_read(self, sms_indexes):
+        if not sms_indexes:
+            return
+        batch_size = self.bridge.sms_read_batch_size
+        if self.sms_batch_read_supported and len(sms_indexes) > 1:
+            chunks = [sms_indexes[i:i + batch_size]
+                      for i in range(0, len(sms_indexes), batch_size)]
+        else:
+            chunks = [[sms_index] for sms_index in sms_indexes]
+        for chunk in chunks:
+            try:
+                await self.set_sms_read(chunk)
+            except HiLinkError as e:
+                if len(chunk) == 1:
+                    self.logger.error(f"Erreur lors du marquage du SMS comme lu : {e}")
+                    continue
+                # Nouvel essai SMS par SMS ; le marquage groupé n'est abandonné
+                # que si le routeur refuse ce format ou si les marquages
+                # unitaires réussissent là où le groupé a échoué
+                self.logger.warning(f"Échec du marquage groupé ({e}), nouvel essai SMS par SMS")
+                marked = 0
+                for sms_index in chunk:
+                    try:
+                        await self.set_sms_read([sms_index])
+                        marked += 1
+                    except Exception as single_error:
+                        self.logger.error(f"Erreur lors du marquage du SMS comme lu : {single_error}")
+                if e.code in BATCH_READ_REFUSED_CODES or marked == len(chunk):
+                    self.logger.warning("Marquage groupé refusé par le routeur, repli sur un marquage par SMS")
+                    self.sms_batch_read_supported = False
+            except Exception as e:
+                self.logger.error(f"Erreur lors du marquage du SMS comme lu : {e}")
+
+    async def set_sms_read(self, sms_indexes):
+        indexes = "".join(f"<Index>{sms_index}</Index>" for sms_index in sms_indexes)
+        data = f"""<?xml version='1.0' encoding='UTF-8'?><request>{indexes}</request>"""
+        response = (await self.session.request("/api/sms/set-read", data)).text()
+        self.logger.debug(f"Réponse pour marquer le SMS comme lu : {response}")
+
+    async def send_sms(self, phones, content):
+        # Un même texte à un ou plusieurs destinataires, en une seule requête
+        phone = ", ".join(phones)
         self.logger.debug(f"Tentative d'envoi de SMS à {phone}")
-        buffer = BytesIO()
-        c = pycurl.Curl()
-        c.setopt(c.URL, f"http://{self.huawei_router_ip}/api/sms/send-sms")
-        c.setopt(c.HTTPHEADER, [
-            f"Cookie: {self.cookie}",
-            f"__RequestVerificationToken: {self.token}",
-            "Content-Type: application/x-www-form-urlencoded; charset=UTF-8"
-        ])
-        
-        # S'assurer que le contenu est une chaîne de caractères
-        if isinstance(content, bytes):
-            content = content.decode('utf-8')
-        
-        # Encoder le contenu en UTF-8
-        encoded_content = html.escape(content).encode('utf-8')
-        
-        data = f"""<?xml version='1.0' encoding='UTF-8'?><request><Index>-1</Index><Phones><Phone>{phone}</Phone></Phones><Sca></Sca><Content>{content}</Content><Length>{len(encoded_content)}</Length><Reserved>1</Reserved><Date>-1</Date></request>"""
-        c.setopt(c.POSTFIELDS, data.encode('utf-8'))
-        c.setopt(c.WRITEDATA, buffer)
-        c.perform()
-        c.close()
-
-        response = buffer.getvalue().decode('utf-8')
+
+        # <Length> : nombre de caractères tel que compté par l'interface web
+        # du routeur, sur le texte non échappé ; <Content> est échappé pour le XML
+        recipients = "".join(f"<Phone>{html.escape(number)}</Phone>" for number in phones)
+        data = f"""<?xml version='1.0' encoding='UTF-8'?><request><Index>-1</Index><Phones>{recipients}</Phones><Sca></Sca><Content>{html.escape(content, quote=False)}</Content><Length>{sms_encoding.character_count(content)}</Length><Reserved>1</Reserved><Date>-1</Date></request>"""
+        try:
+            response = (await self.session.request("/api/sms/send-sms", data)).text()
+        except HiLinkError as e:
+            response = str(e)
         success = "<response>OK</response>" in response
         status = "OK" if success else "Failed"
         self.logger.debug(f"Réponse du serveur pour l'envoi de SMS: {status}")
-            
-        # Préparer le payload pour la publication MQTT
-        payload = {
-            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "status": "success" if success else "failure",
-            "recipient": phone,
-            "message": content
-        }
-        # Publier le résultat sur MQTT
-        self.mqtt_client.publish(f"{self.mqtt_prefix}/sent", json.dumps(payload))
         self.logger.debug(f"Réponse complète du serveur : {response}")
-        
+
         if success:
-            self.last_sms_time = time.time()
             self.logger.info(f"SMS envoyé avec succès à {phone}")
         else:
             self.logger.error(f"Échec de l'envoi du SMS à {phone}")
-            if not retry and retry_count < 3:  # Limite à 3 tentatives
-                self.logger.info(f"Planification d'une nouvelle tentative dans 30 secondes (tentative {retry_count + 1}/3)")
-                self.loop.call_later(30, lambda: self.send_sms(phone, content, True, retry_count + 1))
-        
-        return success
-    
-    def retry_sms(self, phone, content):
-        self.logger.info(f"Nouvelle tentative d'envoi de SMS à {phone}")
-        success = self.send_sms(phone, content, retry=True)
-        if not success:
-            self.logger.error(f"Échec de la seconde tentative d'envoi de SMS à {phone}. Abandon de l'envoi.")
+        return success, response
 
-    def on_mqtt_connect(self, client, userdata, flags, rc, properties=None):
-        self.logger.info("Connecté au serveur MQTT")
-        client.publish(f"{self.mqtt_prefix}/connected", "1", 0, True)
-        client.subscribe(f"{self.mqtt_prefix}/send")
+    def publish_send_result(self, entry, success, plan=None):
+        # Préparer le payload pour la publication MQTT
+        payload = {
+            "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "status": "success" if success else "failure",
+            "recipient": entry["number"],
+            "message": entry["message"],
+            "id": entry["id"],
+            "state": entry["state"],
+            "attempts": entry["attempts"],
+        }
+        if self.namespaced:
+            payload["router"] = self.name
+        if entry.get("batch"):
+            payload["batch"] = entry["batch"]
+        if plan is not None:
+            payload.update(plan.as_dict())
+        # Publier le résultat sur MQTT, et au demandeur s'il attend une réponse
+        # (MQTT v5) ; une demande groupée reçoit une réponse agrégée unique
+        payload = json.dumps(payload)
+        self.publish("sent", payload)
+        if entry.get("response_topic") and not entry.get("batch"):
+            self.bridge.publish_response(entry["response_topic"], entry.get("correlation_data"), payload)
 
-    def on_mqtt_disconnect(self, client, userdata, rc, properties=None, reasonCode=None):
-        self.logger.info("Déconnecté du serveur MQTT")
+    def enqueue_sms(self, *entries):
+        # Toujours appelé dans la boucle asyncio (call_soon_threadsafe depuis
+        # paho) ; les SMS d'un même appel, de même texte, partent en une requête
+        queued_at = time.monotonic()
+        for entry in entries:
+            entry["queued_at"] = queued_at
+            self.pool_member.pending += self.bridge.sms_segments(entry)
+        self.queued_sms += len(entries)
+        self.sms_queue.put_nowait(list(entries))
+        self.publish_sms_queue_stats()
 
-    def on_mqtt_message(self, client, userdata, message):
-        try:
-            payload_str = message.payload.decode('utf-8')
-            self.logger.info(f"Message reçu sur le topic '{message.topic}': {payload_str}")
-            payload = json.loads(payload_str)
-            number = payload.get('number')
-            text = payload.get('message')
-            
-            if number and text:
-                encoded_text = self.encode_sms_content(text)
-                self.send_sms(number, encoded_text)
+    def publish_sms_queue_stats(self):
+        self.sms_queue_stats["depth"] = self.queued_sms
+        self.publish("send_queue", json.dumps(self.sms_queue_stats))
+
+    async def process_sms_queue(self):
+        # Tâche d'envoi dédiée : vide la file au rythme autorisé par le seau à jetons
+        while self.bridge.running:
+            entries = await self.sms_queue.get()
+            try:
+                await self.send_queued_sms(entries)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.logger.error(f"Erreur lors de l'envoi du SMS à {', '.join(entry['number'] for entry in entries)} : {e}")
+            finally:
+                for entry in entries:
+                    self.pool_member.pending -= entry["segments"]
+                self.queued_sms -= len(entries)
+                self.sms_queue.task_done()
+            self.publish_sms_queue_stats()
+
+    async def send_queued_sms(self, entries):
+        spool = self.bridge.outbound_spool
+        if not self.breaker.closed:
+            # Routeur injoignable : les SMS du pool partent par un autre modem,
+            # les autres attendent la reprise sans consommer de tentative
+            if entries[0]["pooled"] and self.bridge.dispatch_sms(*entries, exclude={self.name}, available_only=True):
+                self.logger.warning(f"Routeur injoignable, {len(entries)} SMS confié(s) à un autre modem du pool")
+                return
+            await self.breaker.wait_closed()
+        pending = []
+        for entry in entries:
+            if spool.is_expired(entry):
+                self.logger.warning(f"SMS {entry['id']} pour {entry['number']} expiré, abandon")
+                spool.mark_expired(entry)
+                self.bridge.sms_sent_total.inc(self.name, "expired")
+                self.publish_send_result(entry, False)
             else:
-                self.logger.warning("Message MQTT reçu sans numéro ou texte valide")
-        except json.JSONDecodeError:
-            self.logger.error(f"Erreur de décodage JSON pour le message reçu sur '{message.topic}'")
+                pending.append(entry)
+        if pending:
+            # Le débit est compté en segments, pour chaque destinataire : un
+            # SMS long en consomme plusieurs
+            plan = sms_encoding.plan(pending[0]["message"], self.bridge.sms_transliterate)
+            waited = await self.sms_bucket.acquire(plan.segments * len(pending))
+            if waited:
+                self.logger.info(f"Limite de débit atteinte, envoi retardé de {waited:.2f} secondes")
+            wait_time = time.monotonic() - pending[0]["queued_at"]
+            self.sms_queue_stats["last_wait"] = round(wait_time, 3)
+            self.sms_queue_stats["max_wait"] = round(max(self.sms_queue_stats["max_wait"], wait_time), 3)
+            self.bridge.sms_queue_wait_seconds.observe(wait_time, self.name)
+            spool.mark_sending(*pending)
+            results = await self.send_to_recipients(pending, plan)
+            spool.mark_sent(*(entry for entry, success, _ in results if success))
+            for entry, success, response in results:
+                self.finish_send(entry, success, response, plan)
+        self.bridge.publish_batch_results(entries)
+
+    async def send_to_recipients(self, entries, plan):
+        # Une requête pour tous les destinataires ; si le routeur la refuse
+        # (firmware limitant <Phones>), nouvel essai en deux moitiés, jusqu'à
+        # un destinataire par requête. Sans réponse du routeur, pas de repli :
+        # les SMS sont retentés plus tard.
+        started = time.monotonic()
+        try:
+            success, response = await self.send_sms([entry["number"] for entry in entries], plan.text)
+            answered = True
         except Exception as e:
-            self.logger.error(f"Erreur lors du traitement du message MQTT entrant sur le topic '{message.topic}': {str(e)}")
-    
-    async def process_sms_queue(self):
-        if not self.sms_queue.empty():
-            sms_request = self.sms_queue.get()
-            number = sms_request.get('number')
-            message = sms_request.get('message')
-            if number and message:
-                self.send_sms(number, message)
+            success, response, answered = False, str(e), False
+        if success and self.delivery is not None:
+            # Suivi en tâche de fond : l'envoi suivant n'attend pas
+            self.delivery.track(entries)
+        self.bridge.sms_send_seconds.observe(time.monotonic() - started, self.name)
+        if success or not answered or len(entries) == 1:
+            return [(entry, success, response) for entry in entries]
+        self.logger.warning(f"Envoi groupé à {len(entries)} destinataires refusé par le routeur, nouvel essai par moitiés")
+        middle = len(entries) // 2
+        return (await self.send_to_recipients(entries[:middle], plan)
+                + await self.send_to_recipients(entries[middle:], plan))
+
+    def finish_send(self, entry, success, response, plan):
+        spool = self.bridge.outbound_spool
+        self.bridge.sms_sent_total.inc(self.name, "sent" if success else "failed")
+        self.pool_member.record(success)
+        if not success:
+            delay = spool.mark_failed_attempt(entry, response)
+            if delay is None:
+                self.logger.error(f"Abandon de l'envoi du SMS à {entry['number']} après {entry['attempts']} tentatives")
+            elif entry["pooled"] and self.bridge.failover_sms(entry, self):
+                self.logger.warning(f"Échec de l'envoi par {self.name}, bascule du SMS {entry['id']} vers {entry['router']}")
+            else:
+                self.logger.info(f"Planification d'une nouvelle tentative dans {delay:.0f} secondes (tentative {entry['attempts'] + 1}/{spool.max_attempts})")
+                retry = self.bridge.dispatch_sms if entry["pooled"] else self.enqueue_sms
+                self.bridge.loop.call_later(delay, retry, entry)
+        self.publish_send_result(entry, success, plan)
+
+    async def follow_deliveries(self):
+        # Suit les SMS acceptés sans retarder les envois : send-status toutes
+        # les SEND_STATUS_INTERVAL secondes tant qu'un envoi attend son
+        # verdict (si le firmware le connaît), puis expiration des SMS restés
+        # sans accusé de réception
+        tracker = self.delivery
+        interval = self.bridge.send_status_interval
+        while self.bridge.running:
+            try:
+                if self.send_status_supported and tracker.awaiting_submission():
+                    await asyncio.sleep(interval)
+                    if self.breaker.closed:
+                        await self.poll_send_status()
+                else:
+                    deadline = tracker.next_deadline()
+                    await tracker.wait_tracked(None if deadline is None else max(0.0, deadline - time.monotonic()))
+                self.publish_delivery(tracker.expire())
+            except asyncio.CancelledError:
+                self.logger.info("Tâche de suivi des SMS envoyés annulée")
+                break
+            except Exception as e:
+                self.logger.error(f"Erreur lors du suivi des SMS envoyés : {e}")
+                await asyncio.sleep(interval)
+
+    async def poll_send_status(self):
+        try:
+            response = await self.session.request("/api/sms/send-status")
+        except HiLinkError as e:
+            if e.code not in UNSUPPORTED_ERROR_CODES:
+                raise
+            # Firmware sans send-status : seuls les accusés de réception concluent
+            self.logger.info(f"Suivi send-status indisponible ({e}), seuls les accusés de réception seront suivis")
+            self.send_status_supported = False
+            self.delivery.submit_timeout = 0
+            return
+        with self.parse_span("/api/sms/send-status"):
+            status = hilink_xml.SEND_STATUS.parse(response.body)
+        self.publish_delivery(self.delivery.apply_status(status))
+
+    def publish_delivery(self, transitions):
+        for entry, state in transitions:
+            self.bridge.sms_delivery_total.inc(self.name, state)
+            if state == FAILED:
+                self.logger.error(f"SMS {entry['id']} pour {entry['number']} refusé par le réseau")
+            else:
+                self.logger.info(f"SMS {entry['id']} pour {entry['number']} : {state}")
+            payload = {
+                "timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                "id": entry["id"],
+                "recipient": entry["number"],
+                "state": state,
+            }
+            if self.namespaced:
+                payload["router"] = self.name
+            if entry.get("batch"):
+                payload["batch"] = entry["batch"]
+            payload = json.dumps(payload)
+            self.publish("delivery", payload, qos=1)
+            if entry.get("response_topic") and not entry.get("batch"):
+                self.bridge.publish_response(entry["response_topic"], entry.get("correlation_data"), payload)
 
     async def check_and_publish_status_info(self):
         try:
-            status_info = self.get_status_info()
-            if status_info is not None:
-                if status_info != self.old_status_info:
-                    self.old_status_info = status_info
-                    self.publish_status_info(status_info)
+            status_info = await self.get_status_info()
+            if status_info:
+                changed = self.publish_changes("status", self.status_tracker, status_info, retain=True)
+                if self.bridge.mqtt_connected:
+                    self.bridge.mark_startup(self.milestone("first_status"), report=True)
+                self.adapt_polling("status", bool(changed))
+                if changed:
+                    self.logger.info(f"Nouvelles informations de statut publiées : ConnectionStatus={status_info.get('ConnectionStatus')}, SignalStrength={status_info.get('SignalIcon')}")
         except Exception as e:
             self.logger.error(f"Erreur lors de la vérification et de la publication des informations de statut : {e}")
 
-    def get_status_info(self):
+    async def get_status_info(self):
         try:
-            self.get_session_token()  # Obtenir de nouveaux tokens avant la requête
-            buffer = BytesIO()
-            c = pycurl.Curl()
-            c.setopt(c.URL, f"http://{self.huawei_router_ip}/api/monitoring/status")
-            c.setopt(c.HTTPHEADER, [
-                f"Cookie: {self.cookie}",
-                f"__RequestVerificationToken: {self.token}",
-            ])
-            c.setopt(c.WRITEDATA, buffer)
-            c.perform()
-            c.close()
-            
-            response = buffer.getvalue().decode('utf-8')
-            root = ET.fromstring(response)
-            
-            status_info = {}
-            for element in root.iter():
-                if element.tag != "response":
-                    status_info[element.tag] = element.text
-
-            return status_info
+            response = await self.session.request("/api/monitoring/status")
+            with self.parse_span("/api/monitoring/status"):
+                return hilink_xml.parse_fields(response.body)
+        except RequestShedError:
+            # Relevé abandonné sous charge : le suivant le remplace
+            return None
         except Exception as e:
             self.logger.error(f"Erreur lors de la récupération des informations de statut : {e}")
             return None
 
-    def publish_status_info(self, status_info):
-        if status_info:
-            self.mqtt_client.publish(f"{self.mqtt_prefix}/status", json.dumps(status_info), 0, True)
-            self.logger.info(f"Nouvelles informations de statut publiées : ConnectionStatus={status_info.get('ConnectionStatus')}, SignalStrength={status_info.get('SignalIcon')}")
+    def publish_changes(self, kind, tracker, values, retain=False):
+        # Champs modifiés sur kind/<champ> (retenus) ; document complet sur
+        # kind à chaque changement ou à la cadence de SNAPSHOT_INTERVAL
+        bridge = self.bridge
+        changed = tracker.changes(values)
+        if bridge.publish_field_topics:
+            for field, value in changed.items():
+                self.publish(f"{kind}/{field}", "" if value is None else value, 0, True)
+        if bridge.snapshot_mode == "change":
+            snapshot = bool(changed)
+        else:
+            snapshot = bridge.snapshot_mode == "interval" and tracker.snapshot_due(bridge.snapshot_interval)
+        if snapshot:
+            self.publish(kind, json.dumps(values), 0, retain)
+        return changed
 
     async def get_signal_info(self):
         try:
-            if time.time() - self.last_signal_check < self.check_interval:
-                return
-            self.last_signal_check = time.time()
-
-            self.get_session_token()  # Obtenir de nouveaux tokens avant la requête
-            buffer = BytesIO()
-            c = pycurl.Curl()
-            c.setopt(c.URL, f"http://{self.huawei_router_ip}/api/device/signal")
-            c.setopt(c.HTTPHEADER, [
-                f"Cookie: {self.cookie}",
-                f"__RequestVerificationToken: {self.token}",
-            ])
-            c.setopt(c.WRITEDATA, buffer)
-            c.perform()
-            c.close()
-
-            response = buffer.getvalue().decode('utf-8')
-            root = ET.fromstring(response)
-            
-            signal_info = {
-                "rsrp": root.find(".//rsrp").text,
-                "rsrq": root.find(".//rsrq").text,
-                "rssi": root.find(".//rssi").text,
-                "sinr": root.find(".//sinr").text,
-                "cell_id": root.find(".//cell_id").text,
-                "pci": root.find(".//pci").text,
-                "ecio": root.find(".//ecio").text,
-                "mode": root.find(".//mode").text,
-            }
+            response = await self.session.request("/api/device/signal")
+            with self.parse_span("/api/device/signal"):
+                signal_info = hilink_xml.SIGNAL.parse(response.body)
+            self.pool_member.signal_quality = signal_quality(signal_info)
 
-            if signal_info != self.old_signal_info:
-                signal_payload = json.dumps(signal_info)
-                self.mqtt_client.publish(f"{self.mqtt_prefix}/signal", signal_payload)
-                self.old_signal_info = signal_info
+            changed = self.publish_changes("signal", self.signal_tracker, signal_info)
+            self.adapt_polling("signal", bool(changed))
+            if changed:
                 self.logger.info(f"Nouvelles informations de signal publiées : RSRP={signal_info['rsrp']}, RSRQ={signal_info['rsrq']}")
             else:
                 self.logger.debug("Pas de changement dans les informations de signal")
 
+        except RequestShedError:
+            pass
         except Exception as e:
             self.logger.error(f"ERROR: Impossible de vérifier la qualité du signal : {e}")
 
     async def get_network_info(self):
         try:
-            if time.time() - self.last_network_check < self.check_interval:
-                return
-            self.last_network_check = time.time()
-
-            self.get_session_token()  # Obtenir de nouveaux tokens avant la requête
-            buffer = BytesIO()
-            c = pycurl.Curl()
-            c.setopt(c.URL, f"http://{self.huawei_router_ip}/api/device/information")
-            c.setopt(c.HTTPHEADER, [
-                f"Cookie: {self.cookie}",
-                f"__RequestVerificationToken: {self.token}",
-            ])
-            c.setopt(c.WRITEDATA, buffer)
-            c.perform()
-            c.close()
-
-            response = buffer.getvalue().decode('utf-8')
-            root = ET.fromstring(response)
-            
-            network_info = {}
-            for element in root.iter():
-                if element.tag != "response":
-                    network_info[element.tag] = element.text
-
-            if network_info != self.old_network_info:
-                network_payload = json.dumps(network_info)
-                self.mqtt_client.publish(f"{self.mqtt_prefix}/network", network_payload)
-                self.old_network_info = network_info
+            response = await self.session.request("/api/device/information")
+            with self.parse_span("/api/device/information"):
+                network_info = hilink_xml.parse_fields(response.body)
+
+            changed = self.publish_changes("network", self.network_tracker, network_info)
+            self.adapt_polling("network", bool(changed))
+            if changed:
                 self.logger.info(f"Nouvelles informations réseau publiées : DeviceName={network_info['DeviceName']}, workmode={network_info['workmode']}, Mccmnc={network_info['Mccmnc']}, uptime={network_info['uptime']}")
             else:
                 self.logger.debug("Pas de changement dans les informations réseau")
 
+        except RequestShedError:
+            pass
         except Exception as e:
             self.logger.error(f"ERROR: Impossible de vérifier les informations réseau : {e}")
 
+    def close(self):
+        self.client.close()
+
+
+class HuaweiSMSMQTTBridge:
+    def __init__(self):
+        self.startup = StartupTimeline(STARTED)
+        self.startup.mark("imports")
+        self.startup_reported = False
+        self.load_config()
+        self.setup_logging()
+        self.startup.mark("config")
+        self.running = True
+        self.shutting_down = False
+        self.mqtt_client = None
+        self.mqtt_connected = False
+        # Alias de topic MQTT v5 de la connexion en cours (topic -> propriétés), None si indisponibles.
+        # Table partagée entre la boucle asyncio et le thread réseau de paho
+        self.topic_alias_lock = threading.Lock()
+        self.topic_aliases = None
+        self.topic_alias_limit = 0
+        self.topics_seen = set()
+        self.loop = None
+        self.scheduler = None
+        self.metrics_server = None
+        self.setup_metrics()
+        # Diagnostic à chaud : SIGUSR1 bascule le profilage, SIGUSR2 les traces
+        trace_logger = self.logger.getChild("trace")
+        trace_logger.setLevel(logging.INFO)
+        self.tracer = Tracer(trace_logger, self.trace_spans, self.trace_min_duration / 1000)
+        self.profiler = Profiler(self.profile_dir, self.logger)
+        self.router_check_interval = 30  # Vérifier la connexion du routeur toutes les 30 secondes
+        namespaced = self.huawei_routers is not None
+        routers = self.huawei_routers or [(DEFAULT_ROUTER_NAME, self.huawei_router_ip)]
+        self.routers = [RouterWorker(self, name, host, namespaced) for name, host in routers]
+        self.routers_by_name = {router.name: router for router in self.routers}
+        # Topic d'envoi -> routeur ; None : routeur choisi d'après le message
+        self.send_topics = {f"{router.prefix}/send": router for router in self.routers}
+        self.send_topics.setdefault(f"{self.mqtt_prefix}/send", None)
+        for router in self.routers:
+            router.pool_member.weight = self.sms_pool_weights.get(router.name, 1.0)
+        pool_names = self.sms_pool_routers or [router.name for router in self.routers]
+        unknown = [name for name in pool_names if name not in self.routers_by_name]
+        if unknown:
+            raise ValueError(f"Routeur(s) inconnu(s) dans SMS_POOL : {', '.join(unknown)}")
+        self.sms_pool = SimPool([self.routers_by_name[name].pool_member for name in pool_names],
+                                self.sms_pool_strategy)
+        self.delivered_index = DeliveredSMSIndex(os.path.join(self.state_dir, "delivered_sms.sqlite3"),
+                                                 retention_days=self.sms_dedup_retention_days,
+                                                 max_entries=self.sms_dedup_max_entries)
+        self.inbound_buffer = InboundBuffer(os.path.join(self.state_dir, "inbound_sms.sqlite3"),
+                                            memory_size=self.inbound_buffer_memory,
+                                            max_entries=self.inbound_buffer_max)
+        # mid MQTT -> SMS publié en attente de PUBACK
+        self.inbound_inflight = {}
+        self.inbound_wakeup = None
+        self.inbound_bucket = TokenBucket(self.inbound_flush_rate * 60, self.inbound_max_inflight)
+        self.outbound_spool = OutboundSpool(os.path.join(self.state_dir, "outbound_sms.sqlite3"),
+                                            max_attempts=self.sms_retry_max_attempts,
+                                            base_delay=self.sms_retry_base_delay,
+                                            max_delay=self.sms_retry_max_delay,
+                                            expiry=self.sms_expiry)
+        self.startup.mark("state")
+
+    def setup_logging(self):
+        numeric_level = getattr(logging, self.debug_level, None)
+        if not isinstance(numeric_level, int):
+            raise ValueError(f'Niveau de log invalide : {self.debug_level}')
+
+        logging.basicConfig(level=numeric_level,
+                            format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+        self.logger = logging.getLogger("HuaweiSMSMQTTBridge")
+        self.logger.info(f"Niveau de logging configuré à : {self.debug_level}")
+
+    def setup_metrics(self):
+        # Compteurs tenus en mémoire en permanence ; exposition optionnelle
+        # (METRICS_PORT, METRICS_INTERVAL). Label router : nom du routeur
+        # ("default" sans HUAWEI_ROUTERS).
+        metrics = self.metrics = MetricsRegistry()
+        self.router_request_seconds = metrics.histogram(
+            "hilink_request_duration_seconds", "Durée des requêtes HTTP au routeur", ("router", "endpoint"))
+        self.router_request_failures_total = metrics.counter(
+            "hilink_request_failures_total", "Requêtes au routeur sans réponse (connexion, délai dépassé)",
+            ("router", "endpoint"))
+        metrics.counter("hilink_errors_total", "Erreurs renvoyées par le routeur, par code HiLink", ("router", "code"),
+                        collect=lambda: {(router.name, code): count for router in self.routers
+                                         for code, count in router.session.error_counts.items()})
+        metrics.counter("hilink_token_refreshes_total", "Récupérations des tokens de session", ("router",),
+                        collect=lambda: {router.name: router.session.token_fetches for router in self.routers})
+        self.router_queue_wait_seconds = metrics.histogram(
+            "hilink_request_queue_wait_seconds", "Attente d'un créneau du régulateur avant une requête au routeur, par file",
+            ("router", "lane"))
+        self.router_requests_shed_total = metrics.counter(
+            "hilink_requests_shed_total", "Relevés abandonnés par le régulateur (routeur saturé), par file",
+            ("router", "lane"))
+        metrics.gauge("hilink_requests_waiting", "Requêtes en attente d'un créneau du régulateur, par file",
+                      ("router", "lane"), collect=lambda: {(router.name, lane): len(router.governor.waiters[lane])
+                                                           for router in self.routers for lane in LANES})
+        metrics.gauge("hilink_router_up", "Routeur joignable (1) ou non (0)", ("router",),
+                      collect=lambda: {router.name: int(router.router_connected) for router in self.routers})
+        metrics.gauge("poll_interval_seconds", "Période de scrutation en cours, par relevé", ("router", "kind"),
+                      collect=lambda: {(router.name, kind): router.poll_interval(kind) for router in self.routers
+                                       for kind in POLL_KINDS})
+        metrics.gauge("hilink_circuit_state", "État du disjoncteur du routeur : fermé (0), demi-ouvert (1), ouvert (2)",
+                      ("router",), collect=lambda: {router.name: STATE_VALUES[router.breaker.state]
+                                                    for router in self.routers})
+        metrics.counter("hilink_circuit_opens_total", "Ouvertures du disjoncteur du routeur", ("router",),
+                        collect=lambda: {router.name: router.breaker.opens for router in self.routers})
+        metrics.counter("hilink_circuit_rejected_total", "Requêtes refusées sans appel au routeur (circuit ouvert)",
+                        ("router",), collect=lambda: {router.name: router.breaker.fast_failures for router in self.routers})
+        self.sms_received_total = metrics.counter("sms_received_total", "SMS reçus publiés sur MQTT", ("router",))
+        self.sms_publish_lag_seconds = metrics.histogram(
+            "sms_received_publish_lag_seconds", "Délai entre l'horodatage du SMS par le routeur et sa publication",
+            ("router",), LAG_BUCKETS)
+        self.sms_sent_total = metrics.counter("sms_sent_total", "Tentatives d'envoi de SMS, par résultat",
+                                              ("router", "result"))
+        self.sms_delivery_total = metrics.counter(
+            "sms_delivery_total", "SMS acceptés par le routeur, par état suivant (submitted, failed, delivered, unconfirmed)",
+            ("router", "state"))
+        metrics.gauge("sms_delivery_tracked", "SMS acceptés en attente de soumission ou d'accusé de réception", ("router",),
+                      collect=lambda: {router.name: router.delivery.stats()["awaiting_submission"]
+                                       + router.delivery.stats()["awaiting_report"]
+                                       for router in self.routers if router.delivery is not None})
+        self.sms_send_seconds = metrics.histogram("sms_send_duration_seconds", "Durée de la requête d'envoi d'un SMS",
+                                                  ("router",))
+        self.sms_queue_wait_seconds = metrics.histogram(
+            "sms_queue_wait_seconds", "Attente d'un SMS dans la file d'envoi (limite de débit comprise)",
+            ("router",), LAG_BUCKETS)
+        metrics.gauge("sms_inbound_buffered", "SMS reçus en attente de publication ou de PUBACK",
+                      collect=lambda: {(): len(self.inbound_buffer)})
+        metrics.gauge("sms_inbound_inflight", "SMS reçus publiés en attente de PUBACK",
+                      collect=lambda: {(): len(self.inbound_inflight)})
+        metrics.gauge("sms_queue_depth", "SMS en attente dans la file d'envoi", ("router",),
+                      collect=lambda: {router.name: router.queued_sms for router in self.routers})
+        self.mqtt_published_total = metrics.counter("mqtt_messages_published_total", "Messages publiés sur MQTT",
+                                                    ("router",))
+        self.mqtt_received_total = metrics.counter("mqtt_messages_received_total",
+                                                   "Demandes d'envoi reçues sur MQTT")
+        metrics.gauge("mqtt_connected", "Connexion au broker MQTT établie (1) ou non (0)",
+                      collect=lambda: {(): int(self.mqtt_connected)})
+        for field, kind, documentation in (
+                ("runs", "counter", "Exécutions des tâches périodiques"),
+                ("errors", "counter", "Exécutions en erreur des tâches périodiques"),
+                ("skipped", "counter", "Ticks manqués ignorés (exécution précédente trop longue ou boucle en retard)"),
+                ("overruns", "counter", "Exécutions plus longues que la période de la tâche"),
+                ("last_lateness", "gauge", "Retard au démarrage de la dernière exécution (secondes)"),
+                ("max_lateness", "gauge", "Retard maximal au démarrage (secondes)"),
+                ("max_time", "gauge", "Durée maximale d'une exécution (secondes)")):
+            suffix = "_total" if kind == "counter" else "_seconds"
+            name = f"scheduler_job_{field.replace('_time', '_duration')}{suffix}"
+            collect = (lambda field=field: {job.name: getattr(job, field) for job in self.scheduler.jobs.values()}
+                       if self.scheduler else {})
+            getattr(metrics, kind)(name, documentation, ("job",), collect=collect)
+
+    async def publish_metrics(self):
+        self.mqtt_publish(f"{self.mqtt_prefix}/metrics", self.metrics.render())
+
+    @staticmethod
+    def get_env(key, default=None):
+        value = os.environ.get(key, default)
+        if value is None:
+            raise ValueError(f"La variable d'environnement '{key}' est requise mais n'est pas définie.")
+        return value
+
+    @staticmethod
+    def parse_routers(value):
+        # Format : nom1=ip1,nom2=ip2 ; chaque nom devient un sous-topic de MQTT_TOPIC
+        routers = []
+        for item in value.split(","):
+            item = item.strip()
+            if not item:
+                continue
+            name, separator, host = item.partition("=")
+            name, host = name.strip(), host.strip()
+            if not separator or not name or not host:
+                raise ValueError(f"Routeur invalide dans HUAWEI_ROUTERS : '{item}' (format attendu : nom=adresse)")
+            if any(char in name for char in "/+#"):
+                raise ValueError(f"Nom de routeur invalide : '{name}' (caractères interdits : / + #)")
+            if name in (existing for existing, _ in routers):
+                raise ValueError(f"Nom de routeur en double dans HUAWEI_ROUTERS : '{name}'")
+            routers.append((name, host))
+        if not routers:
+            raise ValueError("HUAWEI_ROUTERS ne contient aucun routeur")
+        return routers
+
+    @staticmethod
+    def parse_mapping(variable, value):
+        # Format : nom1=nombre1,nom2=nombre2
+        mapping = {}
+        for item in value.split(","):
+            if not item.strip():
+                continue
+            name, separator, number = item.partition("=")
+            if not separator or not name.strip():
+                raise ValueError(f"Entrée invalide dans {variable} : '{item}' (format attendu : nom=valeur)")
+            mapping[name.strip()] = float(number)
+        return mapping
+
+    @staticmethod
+    def parse_bounds(variable, value):
+        # Format : relevé1=min:max,relevé2=min:max (secondes)
+        bounds = {}
+        for item in value.split(","):
+            if not item.strip():
+                continue
+            kind, separator, limits = item.partition("=")
+            minimum, colon, maximum = limits.partition(":")
+            kind = kind.strip()
+            if kind not in POLL_KINDS:
+                raise ValueError(f"Relevé inconnu dans {variable} : '{kind}'. Les valeurs valides sont : {', '.join(POLL_KINDS)}")
+            if not separator or not colon:
+                raise ValueError(f"Entrée invalide dans {variable} : '{item}' (format attendu : relevé=min:max)")
+            minimum, maximum = float(minimum), float(maximum)
+            if minimum <= 0 or maximum < minimum:
+                raise ValueError(f"Bornes invalides dans {variable} : '{item}' (0 < min <= max)")
+            bounds[kind] = (minimum, maximum)
+        return bounds
+
+    def load_config(self):
+        if os.path.exists('.env'):
+            load_dotenv()
+        self.mqtt_prefix = self.get_env("MQTT_TOPIC")
+        self.mqtt_host = self.get_env("MQTT_IP")
+        self.mqtt_port = int(self.get_env("PORT", "1883"))
+        self.mqtt_client_id = self.get_env("CLIENTID")
+        self.mqtt_user = self.get_env("MQTT_ACCOUNT")
+        self.mqtt_password = self.get_env("MQTT_PASSWORD")
+        protocol = self.get_env("MQTT_PROTOCOL", "3.1.1")
+        if protocol not in MQTT_PROTOCOLS:
+            raise ValueError(f"Version de protocole MQTT invalide : {protocol}. Les valeurs valides sont : {', '.join(MQTT_PROTOCOLS)}")
+        self.mqtt_protocol = MQTT_PROTOCOLS[protocol]
+        self.mqtt_topic_alias_max = int(self.get_env("MQTT_TOPIC_ALIAS_MAX", "10"))
+        routers = self.get_env("HUAWEI_ROUTERS", "").strip()
+        if routers:
+            self.huawei_routers = self.parse_routers(routers)
+            self.huawei_router_ip = None
+        else:
+            self.huawei_routers = None
+            self.huawei_router_ip = self.get_env("HUAWEI_ROUTER_IP_ADDRESS")
+        self.check_interval = int(self.get_env("CHECK_INTERVAL", "60"))
+        self.sms_check_interval = float(self.get_env("SMS_CHECK_INTERVAL", "30"))
+        self.adaptive_polling = self.get_env("ADAPTIVE_POLLING", "false").lower() in ("1", "true", "yes")
+        self.poll_bounds = self.parse_bounds("POLL_INTERVAL_BOUNDS", DEFAULT_POLL_BOUNDS)
+        self.poll_bounds.update(self.parse_bounds("POLL_INTERVAL_BOUNDS", self.get_env("POLL_INTERVAL_BOUNDS", "")))
+        self.poll_backoff = float(self.get_env("POLL_BACKOFF_FACTOR", "1.5"))
+        self.poll_latency_target = float(self.get_env("POLL_LATENCY_TARGET", "1.0"))
+        if self.poll_backoff < 1:
+            raise ValueError(f"Facteur d'allongement de la scrutation invalide : {self.poll_backoff} (POLL_BACKOFF_FACTOR doit être >= 1)")
+        self.router_max_concurrency = int(self.get_env("ROUTER_MAX_CONCURRENCY", "2"))
+        self.router_max_rps = float(self.get_env("ROUTER_MAX_RPS", "10"))
+        self.router_shed_wait = float(self.get_env("ROUTER_SHED_WAIT", "5"))
+        if self.router_max_concurrency < 1 or self.router_max_rps < 0 or self.router_shed_wait < 0:
+            raise ValueError("Régulateur du routeur invalide : ROUTER_MAX_CONCURRENCY doit être >= 1, "
+                             "ROUTER_MAX_RPS et ROUTER_SHED_WAIT >= 0")
+        self.router_timeout = int(self.get_env("ROUTER_TIMEOUT", "10"))
+        self.router_token_ttl = int(self.get_env("ROUTER_TOKEN_TTL", "240"))
+        self.router_failure_threshold = int(self.get_env("ROUTER_FAILURE_THRESHOLD", "3"))
+        self.router_backoff_base = float(self.get_env("ROUTER_BACKOFF_BASE", "1"))
+        self.router_backoff_max = float(self.get_env("ROUTER_BACKOFF_MAX", "30"))
+        if self.router_failure_threshold < 1 or self.router_backoff_base <= 0 or self.router_backoff_max < self.router_backoff_base:
+            raise ValueError("Disjoncteur du routeur invalide : ROUTER_FAILURE_THRESHOLD doit être >= 1 et "
+                             "0 < ROUTER_BACKOFF_BASE <= ROUTER_BACKOFF_MAX")
+        self.state_dir = self.get_env("STATE_DIR", "data")
+        self.sms_dedup_retention_days = int(self.get_env("SMS_DEDUP_RETENTION_DAYS", "30"))
+        self.sms_dedup_max_entries = int(self.get_env("SMS_DEDUP_MAX_ENTRIES", "10000"))
+        self.sms_page_size = int(self.get_env("SMS_PAGE_SIZE", "20"))
+        self.sms_cycle_budget = int(self.get_env("SMS_CYCLE_BUDGET", "20"))
+        self.sms_drain_page_size = int(self.get_env("SMS_DRAIN_PAGE_SIZE", "50"))
+        self.sms_drain_budget = int(self.get_env("SMS_DRAIN_BUDGET", "200"))
+        self.sms_read_batch_size = int(self.get_env("SMS_READ_BATCH_SIZE", "20"))
+        self.sms_retry_max_attempts = int(self.get_env("SMS_RETRY_MAX_ATTEMPTS", "5"))
+        self.sms_retry_base_delay = float(self.get_env("SMS_RETRY_BASE_DELAY", "30"))
+        self.sms_retry_max_delay = float(self.get_env("SMS_RETRY_MAX_DELAY", "3600"))
+        self.sms_expiry = int(self.get_env("SMS_EXPIRY", "21600"))
+        self.sms_spool_retention_days = int(self.get_env("SMS_SPOOL_RETENTION_DAYS", "7"))
+        self.delivery_tracking = self.get_env("DELIVERY_TRACKING", "false").lower() in ("1", "true", "yes")
+        self.send_status_interval = float(self.get_env("SEND_STATUS_INTERVAL", "2"))
+        self.delivery_report_timeout = float(self.get_env("DELIVERY_REPORT_TIMEOUT", "3600"))
+        if self.send_status_interval <= 0 or self.delivery_report_timeout < 0:
+            raise ValueError("Suivi des envois invalide : SEND_STATUS_INTERVAL doit être > 0 et DELIVERY_REPORT_TIMEOUT >= 0")
+        self.sms_transliterate = self.get_env("SMS_TRANSLITERATE", "false").lower() in ("1", "true", "yes")
+        self.sms_rate_per_minute = float(self.get_env("SMS_RATE_PER_MINUTE", "6"))
+        self.sms_rate_burst = int(self.get_env("SMS_RATE_BURST", "3"))
+        self.sms_send_batch_size = int(self.get_env("SMS_SEND_BATCH_SIZE", "10"))
+        self.sms_pool_routers = [name.strip() for name in self.get_env("SMS_POOL", "").split(",") if name.strip()]
+        self.sms_pool_strategy = self.get_env("SMS_POOL_STRATEGY", "least_loaded").lower()
+        if self.sms_pool_strategy not in STRATEGIES:
+            raise ValueError(f"Stratégie de répartition invalide : {self.sms_pool_strategy}. Les valeurs valides sont : {', '.join(STRATEGIES)}")
+        self.sms_pool_weights = self.parse_mapping("SMS_POOL_WEIGHTS", self.get_env("SMS_POOL_WEIGHTS", ""))
+        self.publish_field_topics = self.get_env("PUBLISH_FIELD_TOPICS", "true").lower() in ("1", "true", "yes")
+        self.snapshot_mode = self.get_env("SNAPSHOT_MODE", "change").lower()
+        if self.snapshot_mode not in ("change", "interval", "off"):
+            raise ValueError(f"Mode d'instantané invalide : {self.snapshot_mode}. Les valeurs valides sont : change, interval, off")
+        self.snapshot_interval = float(self.get_env("SNAPSHOT_INTERVAL", "900"))
+        self.volatile_fields = [name.strip() for name in self.get_env("VOLATILE_FIELDS", "uptime").split(",") if name.strip()]
+        self.delta_deadbands = self.parse_mapping("DELTA_DEADBANDS",
+                                                  self.get_env("DELTA_DEADBANDS", "rsrp=3,rsrq=2,rssi=3,sinr=3,ecio=2"))
+        self.inbound_buffer_memory = int(self.get_env("INBOUND_BUFFER_MEMORY", "100"))
+        self.inbound_buffer_max = int(self.get_env("INBOUND_BUFFER_MAX", "5000"))
+        self.inbound_flush_rate = float(self.get_env("INBOUND_FLUSH_RATE", "10"))
+        self.inbound_max_inflight = int(self.get_env("INBOUND_MAX_INFLIGHT", "20"))
+        self.metrics_port = int(self.get_env("METRICS_PORT", "0"))
+        self.metrics_bind = self.get_env("METRICS_BIND", "0.0.0.0")
+        self.metrics_interval = float(self.get_env("METRICS_INTERVAL", "0"))
+        self.profile_dir = self.get_env("PROFILE_DIR", "") or self.state_dir
+        self.trace_spans = self.get_env("TRACE_SPANS", "false").lower() in ("1", "true", "yes")
+        self.trace_min_duration = float(self.get_env("TRACE_MIN_DURATION", "0"))
+        self.scheduler_jitter = float(self.get_env("SCHEDULER_JITTER", "1.0"))
+        self.scheduler_missed_policy = self.get_env("SCHEDULER_MISSED_POLICY", "skip").lower()
+        if self.scheduler_missed_policy not in ("skip", "catchup"):
+            raise ValueError(f"Politique de tick manqué invalide : {self.scheduler_missed_policy}. Les valeurs valides sont : skip, catchup")
+        self.debug_level = os.environ.get("DEBUG_LEVEL", "INFO").upper()
+        valid_levels = ["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"]
+        if self.debug_level not in valid_levels:
+            raise ValueError(f"Niveau de debug invalide : {self.debug_level}. Les valeurs valides sont : {', '.join(valid_levels)}")
+
+    async def open_router_sessions(self):
+        # Sessions ouvertes en parallèle ; un routeur injoignable ne bloque
+        # pas le démarrage : son circuit est ouvert et sa tâche de
+        # vérification le reconnectera
+        results = await asyncio.gather(*(router.bootstrap() for router in self.routers), return_exceptions=True)
+        for router, result in zip(self.routers, results):
+            if isinstance(result, Exception):
+                router.logger.error(f"Impossible d'ouvrir la session du routeur {router.name} : {result}")
+                if router.breaker.closed:
+                    router.breaker.trip()
+        opened = sum(1 for result in results if not isinstance(result, Exception))
+        self.logger.info(f"Tokens de session obtenus ({opened}/{len(self.routers)} routeur(s))")
+
+    def mark_startup(self, name, report=False):
+        # report : premier statut publié, fin du démarrage à froid ; la
+        # décomposition est journalisée et publiée (retenue) sur startup
+        if not self.startup.mark(name) or not report or self.startup_reported:
+            return
+        self.startup_reported = True
+        self.logger.info(f"Démarrage terminé : {self.startup.summary()}")
+        self.mqtt_publish(f"{self.mqtt_prefix}/startup", json.dumps(self.startup.marks), 0, True)
+
+    async def recover_outbound_spool(self):
+        # Reprise des envois en attente après un redémarrage, sans bloquer le
+        # démarrage : chaque SMS est replanifié à sa prochaine échéance
+        try:
+            self.outbound_spool.purge(self.sms_spool_retention_days * 86400)
+            entries = self.outbound_spool.recover()
+            if entries:
+                self.logger.info(f"Reprise de {len(entries)} SMS en attente d'envoi")
+            now = time.time()
+            for group in self.group_sms(entries):
+                delay = max(0.0, max(entry["next_attempt_at"] for entry in group) - now)
+                router = self.routers_by_name.get(group[0]["router"])
+                if group[0]["pooled"] or router is None:
+                    # Routeur absent de la configuration : le pool de SIM choisit
+                    self.loop.call_later(delay, self.dispatch_sms, *group)
+                else:
+                    self.loop.call_later(delay, router.enqueue_sms, *group)
+                await asyncio.sleep(0)
+        except Exception as e:
+            self.logger.error(f"Erreur lors de la reprise des SMS en attente : {e}")
+
+    def on_mqtt_connect(self, client, userdata, flags, rc, properties=None):
+        self.logger.info("Connecté au serveur MQTT")
+        self.mqtt_connected = True
+        # Alias de topic limités par le broker (TopicAliasMaximum du CONNACK,
+        # 0 par défaut) et valables pour cette seule connexion
+        limit = min(self.mqtt_topic_alias_max, getattr(properties, "TopicAliasMaximum", 0))
+        with self.topic_alias_lock:
+            self.topic_alias_limit = limit
+            self.topic_aliases = {} if limit > 0 else None
+        # Reprise de la publication des SMS reçus mis en tampon pendant la coupure
+        self.loop.call_soon_threadsafe(self.notify_inbound)
+        self.loop.call_soon_threadsafe(self.publish_snapshots)
+        client.publish(f"{self.mqtt_prefix}/connected", "1", 0, True)
+        for topic in self.send_topics:
+            client.subscribe(topic, qos=1)
+
+    def on_mqtt_connect_fail(self, client, userdata):
+        # Broker injoignable : paho réessaie seul, avec un délai croissant
+        self.logger.warning(f"Connexion MQTT à {self.mqtt_host}:{self.mqtt_port} impossible, nouvel essai en arrière-plan")
+
+    def publish_snapshots(self):
+        self.mark_startup("mqtt_connected")
+        for router in self.routers:
+            router.publish_snapshot()
+
+    def on_mqtt_disconnect(self, client, userdata, rc, properties=None, reasonCode=None):
+        self.logger.info("Déconnecté du serveur MQTT")
+        self.mqtt_connected = False
+        with self.topic_alias_lock:
+            self.topic_aliases = None
+
+    def mqtt_publish(self, topic, payload, qos=0, retain=False, properties=None):
+        # Publications QoS 0 répétées (télémétrie) : dès la deuxième, un alias
+        # de topic (MQTT v5) est attribué, puis seul l'alias est transmis. Les
+        # QoS 1 gardent leur topic : paho les republie tels quels après une
+        # reconnexion, où les alias de la connexion précédente n'existent plus.
+        if self.mqtt_client is None:
+            # Client MQTT pas encore créé (routeur injoignable au démarrage) :
+            # l'état du routeur est publié une fois le client connecté
+            return None
+        if qos != 0 or properties is not None:
+            return self.mqtt_client.publish(topic, payload, qos, retain, properties)
+        # Attribution et publication sous verrou : une (re)connexion sur le
+        # thread de paho ne peut ni réattribuer un numéro ni invalider un
+        # alias entre son choix et son envoi
+        with self.topic_alias_lock:
+            aliases = self.topic_aliases
+            if aliases is not None:
+                alias = aliases.get(topic)
+                if alias is not None:
+                    return self.mqtt_client.publish("", payload, qos, retain, alias)
+                if topic in self.topics_seen and len(aliases) < self.topic_alias_limit:
+                    alias = Properties(PacketTypes.PUBLISH)
+                    alias.TopicAlias = len(aliases) + 1
+                    aliases[topic] = alias
+                    return self.mqtt_client.publish(topic, payload, qos, retain, alias)
+                self.topics_seen.add(topic)
+            return self.mqtt_client.publish(topic, payload, qos, retain, properties)
+
+    def publish_response(self, response_topic, correlation_data, payload):
+        # Réponse MQTT v5 sur le topic de réponse du demandeur, avec ses données de corrélation
+        properties = Properties(PacketTypes.PUBLISH)
+        properties.ContentType = "application/json"
+        if correlation_data is not None:
+            properties.CorrelationData = bytes(correlation_data)
+        try:
+            self.mqtt_publish(response_topic, payload, 1, properties=properties)
+        except Exception as e:
+            self.logger.error(f"Erreur lors de la publication de la réponse sur '{response_topic}' : {e}")
+
+    def on_mqtt_publish(self, client, userdata, mid):
+        # Thread paho : PUBACK (QoS 1) ou envoi (QoS 0) ; traité dans la boucle,
+        # où la publication et l'enregistrement du mid sont atomiques
+        self.loop.call_soon_threadsafe(self.inbound_acked, mid)
+
+    def notify_inbound(self):
+        if self.inbound_wakeup:
+            self.inbound_wakeup.set()
+
+    async def flush_inbound_buffer(self):
+        # Publication QoS 1 des SMS reçus mis en tampon, au plus
+        # INBOUND_FLUSH_RATE par seconde (rattrapage après une coupure du
+        # broker) et INBOUND_MAX_INFLIGHT non acquittés à la fois
+        while self.running:
+            self.inbound_wakeup.clear()
+            if not self.mqtt_connected or len(self.inbound_inflight) >= self.inbound_max_inflight:
+                await self.inbound_wakeup.wait()
+                continue
+            entry = self.inbound_buffer.pop()
+            if entry is None:
+                await self.inbound_wakeup.wait()
+                continue
+            await self.inbound_bucket.acquire()
+            try:
+                payload = json.dumps(entry["payload"])
+                router = self.routers_by_name.get(entry["router"])
+                if router is not None:
+                    info = router.publish("received", payload, 1)
+                else:
+                    # Routeur retiré de la configuration depuis la mise en tampon
+                    info = self.mqtt_publish(f"{self.mqtt_prefix}/received", payload, 1)
+                # Déconnecté entre-temps : paho conserve le message QoS 1 et
+                # le republie à la reconnexion, le PUBACK arrivera plus tard
+                self.inbound_inflight[info.mid] = entry
+            except Exception as e:
+                self.logger.error(f"Erreur lors de la publication d'un SMS reçu : {e}")
+                self.inbound_buffer.requeue(entry)
+                await asyncio.sleep(1)
+
+    def inbound_acked(self, mid):
+        entry = self.inbound_inflight.pop(mid, None)
+        if entry is None:
+            return  # Publication QoS 0
+        self.delivered_index.add(entry["key"])
+        self.inbound_buffer.done(entry)
+        router = self.routers_by_name.get(entry["router"])
+        if router is not None:
+            router.queue_read_mark(entry["index"])
+        self.sms_received_total.inc(entry["router"])
+        try:
+            # Horodatage du routeur : suppose son horloge à l'heure locale
+            date = entry["payload"]["date_received"]
+            lag = (datetime.now() - datetime.strptime(date, "%Y-%m-%d %H:%M:%S")).total_seconds()
+            self.sms_publish_lag_seconds.observe(max(0.0, lag), entry["router"])
+        except (TypeError, ValueError):
+            pass
+        self.notify_inbound()
+
+    def route_sms(self, topic, payload):
+        # Routeur imposé par le topic ou par le champ `router` ; None : choix
+        # par le pool de SIM
+        router = self.send_topics.get(topic)
+        if router is not None:
+            return router
+        name = payload.get('router')
+        if name:
+            if name not in self.routers_by_name:
+                raise ValueError(f"Routeur inconnu '{name}'")
+            return self.routers_by_name[name]
+        return None
+
+    def sms_segments(self, entry):
+        if "segments" not in entry:
+            entry["segments"] = sms_encoding.plan(entry["message"], self.sms_transliterate).segments
+        return entry["segments"]
+
+    def group_sms(self, entries):
+        # SMS d'une même demande groupée et de même texte, jamais tentés :
+        # envoyés ensemble, par paquets de SMS_SEND_BATCH_SIZE destinataires.
+        # Les autres (nouvelles tentatives) partent seuls.
+        groups = {}
+        for entry in entries:
+            if entry.get("batch") and not entry["attempts"]:
+                key = (entry["batch"], entry["message"], entry["router"], entry["pooled"])
+            else:
+                key = entry["id"]
+            groups.setdefault(key, []).append(entry)
+        size = max(1, self.sms_send_batch_size)
+        return [group[start:start + size] for group in groups.values() for start in range(0, len(group), size)]
+
+    def dispatch_sms(self, *entries, exclude=(), available_only=False):
+        # Toujours appelé dans la boucle asyncio : le pool choisit le modem,
+        # le même pour tous les SMS d'un paquet
+        member = self.sms_pool.choose(sum(self.sms_segments(entry) for entry in entries), exclude, available_only)
+        if member is None:
+            return False
+        router = self.routers_by_name[member.name]
+        for entry in entries:
+            if entry["router"] != router.name:
+                self.outbound_spool.assign(entry, router.name)
+        router.enqueue_sms(*entries)
+        return True
+
+    def publish_batch_results(self, entries):
+        # Réponse agrégée d'une demande groupée, une fois tous ses SMS dans un
+        # état définitif : sur MQTT_TOPIC/sent_batch et au demandeur (MQTT v5)
+        for batch in dict.fromkeys(entry["batch"] for entry in entries if entry.get("batch")):
+            batch_entries = self.outbound_spool.batch_entries(batch)
+            if any(entry["state"] not in TERMINAL_STATES for entry in batch_entries):
+                continue
+            counts = {state: 0 for state in TERMINAL_STATES}
+            results = []
+            for entry in batch_entries:
+                counts[entry["state"]] += 1
+                result = {"recipient": entry["number"], "message": entry["message"], "id": entry["id"],
+                          "state": entry["state"], "attempts": entry["attempts"]}
+                if self.huawei_routers is not None:
+                    result["router"] = entry["router"]
+                results.append(result)
+            if counts["sent"] == len(batch_entries):
+                status = "success"
+            else:
+                status = "partial" if counts["sent"] else "failure"
+            payload = json.dumps({"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), "batch": batch,
+                                  "status": status, **counts, "results": results})
+            self.mqtt_publish(f"{self.mqtt_prefix}/sent_batch", payload)
+            first = batch_entries[0]
+            if first["response_topic"]:
+                self.publish_response(first["response_topic"], first["correlation_data"], payload)
+
+    def failover_sms(self, entry, router):
+        # Bascule immédiate vers un autre modem disponible du pool ; si tous
+        # ont déjà échoué pour ce SMS, nouvelle tentative après backoff
+        tried = entry.setdefault("tried", set())
+        tried.add(router.name)
+        if self.dispatch_sms(entry, exclude=tried, available_only=True):
+            return True
+        tried.clear()
+        return False
+
+    def publish_sms_pool_stats(self):
+        self.mqtt_publish(f"{self.mqtt_prefix}/sms_pool", json.dumps(self.sms_pool.stats()))
+
+    def on_mqtt_message(self, client, userdata, message):
+        # MQTT v5 : résultat renvoyé au demandeur sur son topic de réponse,
+        # demande abandonnée si elle n'est pas envoyée avant son expiration
+        properties = getattr(message, "properties", None)
+        response_topic = getattr(properties, "ResponseTopic", None)
+        correlation_data = getattr(properties, "CorrelationData", None)
+        expiry = getattr(properties, "MessageExpiryInterval", None)
+        expires_at = time.time() + expiry if expiry is not None else None
+        # Métriques lues et écrites depuis la boucle asyncio uniquement
+        self.loop.call_soon_threadsafe(self.mqtt_received_total.inc)
+        try:
+            payload_str = message.payload.decode('utf-8')
+            self.logger.info(f"Message reçu sur le topic '{message.topic}': {payload_str}")
+            payload = json.loads(payload_str)
+            messages = self.parse_send_request(payload)
+
+            if messages:
+                router = self.route_sms(message.topic, payload)
+                request = {"response_topic": response_topic, "correlation_data": correlation_data,
+                           "expires_at": expires_at}
+                # Écriture dans la file persistante avant l'acquittement du
+                # message (au retour de ce callback), puis remise immédiate à la
+                # tâche d'envoi : le thread réseau de paho n'attend jamais le routeur
+                if router is None:
+                    entries = self.outbound_spool.enqueue_many(messages, pooled=True, **request)
+                    for group in self.group_sms(entries):
+                        self.loop.call_soon_threadsafe(self.dispatch_sms, *group)
+                else:
+                    entries = self.outbound_spool.enqueue_many(messages, router.name, **request)
+                    for group in self.group_sms(entries):
+                        self.loop.call_soon_threadsafe(router.enqueue_sms, *group)
+            else:
+                self.logger.warning("Message MQTT reçu sans numéro ou texte valide")
+                self.reject_request(response_topic, correlation_data, "numéro ou texte manquant")
+        except json.JSONDecodeError:
+            self.logger.error(f"Erreur de décodage JSON pour le message reçu sur '{message.topic}'")
+            self.reject_request(response_topic, correlation_data, "JSON invalide")
+        except Exception as e:
+            self.logger.error(f"Erreur lors du traitement du message MQTT entrant sur le topic '{message.topic}': {str(e)}")
+            self.reject_request(response_topic, correlation_data, str(e))
+
+    @staticmethod
+    def parse_send_request(payload):
+        # [(numéro, texte)] d'une demande d'envoi, doublons retirés. `number`
+        # et `message` acceptent une valeur ou une liste (chaque texte part à
+        # chaque numéro) ; `messages` : liste de tels objets. Liste vide si un
+        # numéro ou un texte manque.
+        items = payload.get('messages')
+        if not isinstance(items, list):
+            items = [payload]
+        messages = {}
+        for item in items:
+            if not isinstance(item, dict):
+                return []
+            numbers, texts = item.get('number'), item.get('message')
+            numbers = numbers if isinstance(numbers, list) else [numbers]
+            texts = texts if isinstance(texts, list) else [texts]
+            if not all(numbers) or not all(texts) or not numbers or not texts:
+                return []
+            for text in texts:
+                for number in numbers:
+                    messages[(str(number), str(text))] = None
+        return list(messages)
+
+    def reject_request(self, response_topic, correlation_data, error):
+        # Demande refusée avant sa mise en file : seul le demandeur en est informé
+        if not response_topic:
+            return
+        payload = json.dumps({"timestamp": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                              "status": "failure", "state": "rejected", "error": error})
+        self.loop.call_soon_threadsafe(self.publish_response, response_topic, correlation_data, payload)
+
+    async def publish_scheduler_stats(self):
+        stats = self.scheduler.stats()
+        self.mqtt_publish(f"{self.mqtt_prefix}/scheduler", json.dumps(stats))
+        self.logger.debug(f"Statistiques de l'ordonnanceur : {stats}")
+        if len(self.routers) > 1:
+            self.publish_sms_pool_stats()
+        for router in self.routers:
+            router.publish("governor", json.dumps(router.governor.stats()))
+        if self.adaptive_polling:
+            for router in self.routers:
+                router.publish("polling", json.dumps(router.polling_stats()))
+
     async def main_loop(self):
+        # Chaque vérification est une tâche périodique ; l'ordonnanceur dort
+        # jusqu'à la prochaine échéance et les tâches échues s'exécutent en
+        # parallèle, dans la limite de ROUTER_MAX_CONCURRENCY requêtes
+        # simultanées par routeur
+        self.scheduler = Scheduler(self.logger, self.tracer)
+        options = {"jitter": self.scheduler_jitter, "missed": self.scheduler_missed_policy}
         try:
-            while self.running:
-                current_time = time.time()
-                # Vérification et publication du statut
-                if current_time - self.last_status_check >= self.check_interval:
-                    await self.check_and_publish_status_info()
-                    self.last_status_check = current_time
-                # Vérification et publication des informations de signal
-                if current_time - self.last_signal_check >= self.check_interval:
-                    await self.get_signal_info()
-                    self.last_signal_check = current_time
-                # Vérification et publication des informations réseau
-                if current_time - self.last_network_check >= self.check_interval:
-                    await self.get_network_info()
-                    self.last_network_check = current_time
-                # Vérification et publication des SMS reçus
-                if current_time - self.last_sms_check >= self.sms_check_interval:
-                    await self.check_and_publish_received_sms()
-                    self.last_sms_check = current_time
-                # Petite pause pour éviter une utilisation excessive du CPU
-                await asyncio.sleep(0.1)
+            # Premières échéances étalées sur une période pour ne pas
+            # interroger tous les routeurs au même instant
+            for position, router in enumerate(self.routers):
+                router.add_jobs(self.scheduler, options, offset=position / len(self.routers))
+            self.scheduler.add_job("scheduler_stats", self.check_interval, self.publish_scheduler_stats,
+                                   delay=self.check_interval)
+            if self.metrics_interval > 0:
+                self.scheduler.add_job("metrics", self.metrics_interval, self.publish_metrics,
+                                       delay=self.metrics_interval)
+            if self.running:
+                await self.scheduler.run()
         except asyncio.CancelledError:
             self.logger.info("Boucle principale annulée")
         except Exception as e:
@@ -454,6 +1456,8 @@ class HuaweiSMSMQTTBridge:
         self.loop = asyncio.get_event_loop()
         self.loop.add_signal_handler(signal.SIGINT, self.signal_handler)
         self.loop.add_signal_handler(signal.SIGTERM, self.signal_handler)
+        self.loop.add_signal_handler(signal.SIGUSR1, self.profiler.toggle)
+        self.loop.add_signal_handler(signal.SIGUSR2, self.tracer.toggle)
         self.logger.info("Démarrage du bridge")
         try:
             self.loop.run_until_complete(self.run_async())
@@ -468,29 +1472,45 @@ class HuaweiSMSMQTTBridge:
 
     async def run_async(self):
         try:
-            self.get_session_token()
-            self.logger.info("Tokens de session obtenus")
+            for router in self.routers:
+                router.sms_queue = asyncio.Queue()
+            self.inbound_wakeup = asyncio.Event()
 
-            # Configuration MQTT
-            self.mqtt_client = mqtt.Client(client_id=self.mqtt_client_id)
+            # Configuration MQTT : une seule connexion pour tous les routeurs.
+            # Broker et routeurs sont joints en parallèle et aucun des deux ne
+            # bloque le démarrage : la connexion MQTT se fait (et se refait)
+            # en arrière-plan, l'état des routeurs est publié dès que l'un et
+            # l'autre sont disponibles
+            self.mqtt_client = mqtt.Client(client_id=self.mqtt_client_id, protocol=self.mqtt_protocol)
             self.mqtt_client.username_pw_set(self.mqtt_user, self.mqtt_password)
             self.mqtt_client.on_connect = self.on_mqtt_connect
+            self.mqtt_client.on_connect_fail = self.on_mqtt_connect_fail
             self.mqtt_client.on_disconnect = self.on_mqtt_disconnect
-            self.mqtt_client.message_callback_add(f"{self.mqtt_prefix}/send", self.on_mqtt_message)
-            self.mqtt_client.will_set(f"{self.mqtt_prefix}/connected", "0", 0, True)            
+            self.mqtt_client.on_publish = self.on_mqtt_publish
+            for topic in self.send_topics:
+                self.mqtt_client.message_callback_add(topic, self.on_mqtt_message)
+            self.mqtt_client.will_set(f"{self.mqtt_prefix}/connected", "0", 0, True)
             self.logger.info("Tentative de connexion MQTT")
-            self.mqtt_client.connect(self.mqtt_host, self.mqtt_port)
+            self.mqtt_client.connect_async(self.mqtt_host, self.mqtt_port)
             self.mqtt_client.loop_start()
             self.logger.info("Boucle MQTT démarrée")
+            asyncio.create_task(self.open_router_sessions())
+
+            if self.metrics_port:
+                self.metrics_server = await start_http_server(self.metrics, self.metrics_bind, self.metrics_port,
+                                                              self.logger)
+                self.logger.info(f"Métriques exposées sur http://{self.metrics_bind}:{self.metrics_port}/metrics")
 
-            router_check_task = asyncio.create_task(self.check_router_connection())
-            main_loop_task = asyncio.create_task(self.main_loop())
+            tasks = [asyncio.create_task(self.main_loop()), asyncio.create_task(self.flush_inbound_buffer())]
+            for router in self.routers:
+                tasks.append(asyncio.create_task(router.check_router_connection()))
+                tasks.append(asyncio.create_task(router.process_sms_queue()))
+                if router.delivery is not None:
+                    tasks.append(asyncio.create_task(router.follow_deliveries()))
+            asyncio.create_task(self.recover_outbound_spool())
 
             self.logger.info("Démarrage de la boucle principale")
-            done, pending = await asyncio.wait(
-                [router_check_task, main_loop_task],
-                return_when=asyncio.FIRST_COMPLETED
-            )
+            done, pending = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
 
             for task in pending:
                 task.cancel()
@@ -506,30 +1526,41 @@ class HuaweiSMSMQTTBridge:
     def signal_handler(self):
         self.logger.info("Signal reçu, arrêt en cours...")
         self.running = False
-        if self.loop and self.loop.is_running():
-            self.loop.create_task(self.shutdown())
+        # Fin de la boucle principale : run_async termine par l'arrêt gracieux
+        if self.scheduler:
+            self.scheduler.stop()
 
     async def shutdown(self):
-        if not self.running:
+        if self.shutting_down:
             return
         self.logger.info("Arrêt gracieux...")
+        self.shutting_down = True
         self.running = False
-        
+
         # Annuler toutes les tâches en cours
         tasks = [t for t in asyncio.all_tasks() if t is not asyncio.current_task()]
         for task in tasks:
             task.cancel()
-        
+
         # Attendre que toutes les tâches soient terminées
         await asyncio.gather(*tasks, return_exceptions=True)
-        
+
+        if self.metrics_server:
+            self.metrics_server.close()
+
         # Arrêter le client MQTT
         if self.mqtt_client:
             self.logger.info("Publication du statut déconnecté")
             self.mqtt_client.publish(f"{self.mqtt_prefix}/connected", "0", 0, True)
             self.mqtt_client.loop_stop()
             self.mqtt_client.disconnect()
-        
+
+        for router in self.routers:
+            router.close()
+        self.delivered_index.close()
+        self.inbound_buffer.close()
+        self.outbound_spool.close()
+
         self.logger.info("Arrêt terminé")
 
 if __name__ == "__main__":
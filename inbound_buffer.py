@@ -0,0 +1,105 @@
+import json
+import os
+import sqlite3
+from collections import deque
+
+
+class InboundBuffer:
+    # SMS reçus en attente de publication MQTT (QoS 1) : anneau en mémoire
+    # borné, débordant sur disque au-delà, dans l'ordre d'arrivée. Une entrée
+    # n'est retirée qu'une fois le PUBACK reçu ; le SMS n'est marqué lu sur
+    # le routeur qu'à ce moment-là. Les entrées de l'anneau ne sont pas
+    # persistées : encore non lues sur le routeur, elles seront relues au
+    # redémarrage. Utilisé uniquement depuis la boucle asyncio.
+    def __init__(self, path, memory_size=100, max_entries=5000):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.memory_size = max(1, memory_size)
+        self.max_entries = max_entries
+        self.ring = deque()
+        # Clés des SMS en attente (anneau, disque ou publication en cours)
+        self.keys = set()
+        # Routeur -> nombre de SMS en attente, donc encore non lus sur ce routeur
+        self.per_router = {}
+        self.db = sqlite3.connect(path)
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("PRAGMA synchronous=NORMAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS inbound (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key BLOB NOT NULL UNIQUE,
+            router TEXT NOT NULL,
+            sms_index INTEGER NOT NULL,
+            payload TEXT NOT NULL
+        )""")
+        self.db.commit()
+        # Débordement d'une exécution précédente : repris en tête de file
+        for key, router in self.db.execute("SELECT key, router FROM inbound"):
+            self.keys.add(key)
+            self.per_router[router] = self.per_router.get(router, 0) + 1
+        self.spilled = len(self.keys)
+        self.loaded_id = 0
+
+    def __len__(self):
+        return len(self.keys)
+
+    def __contains__(self, key):
+        return key in self.keys
+
+    def pending(self, router):
+        return self.per_router.get(router, 0)
+
+    def full(self):
+        return len(self.keys) >= self.max_entries
+
+    def add(self, entry):
+        # entry : {"key", "router", "index", "payload"} ; False si le tampon
+        # est plein (le SMS reste alors non lu sur le routeur)
+        if entry["key"] in self.keys:
+            return True
+        if self.full():
+            return False
+        self.keys.add(entry["key"])
+        self.per_router[entry["router"]] = self.per_router.get(entry["router"], 0) + 1
+        if self.spilled or len(self.ring) >= self.memory_size:
+            # Tant que le disque n'est pas vidé, tout y passe (ordre préservé)
+            cursor = self.db.execute("INSERT INTO inbound (key, router, sms_index, payload) VALUES (?, ?, ?, ?)",
+                                     (entry["key"], entry["router"], entry["index"], json.dumps(entry["payload"])))
+            self.db.commit()
+            entry["spill_id"] = cursor.lastrowid
+            self.spilled += 1
+        else:
+            self.ring.append(entry)
+        return True
+
+    def _refill(self):
+        rows = self.db.execute("SELECT id, key, router, sms_index, payload FROM inbound WHERE id > ? ORDER BY id LIMIT ?",
+                               (self.loaded_id, self.memory_size)).fetchall()
+        for spill_id, key, router, sms_index, payload in rows:
+            self.ring.append({"key": key, "router": router, "index": sms_index,
+                              "payload": json.loads(payload), "spill_id": spill_id})
+            self.loaded_id = spill_id
+        self.spilled = max(0, self.spilled - len(rows))
+
+    def pop(self):
+        # Prochain SMS à publier, ou None
+        if not self.ring and self.spilled:
+            self._refill()
+        return self.ring.popleft() if self.ring else None
+
+    def requeue(self, entry):
+        self.ring.appendleft(entry)
+
+    def done(self, entry):
+        # PUBACK reçu : le SMS quitte le tampon
+        self.keys.discard(entry["key"])
+        self.per_router[entry["router"]] -= 1
+        if entry.get("spill_id"):
+            self.db.execute("DELETE FROM inbound WHERE id = ?", (entry["spill_id"],))
+            self.db.commit()
+
+    def stats(self):
+        return {"buffered": len(self.keys), "memory": len(self.ring), "spilled": self.spilled}
+
+    def close(self):
+        self.db.close()
@@ -0,0 +1,192 @@
+import os
+import random
+import sqlite3
+import threading
+import time
+
+QUEUED = "queued"
+SENDING = "sending"
+SENT = "sent"
+FAILED = "failed"
+EXPIRED = "expired"
+
+TERMINAL_STATES = (SENT, FAILED, EXPIRED)
+
+
+class OutboundSpool:
+    # File persistante des SMS sortants. Chaque demande /send y est écrite
+    # avant l'acquittement MQTT puis suit la machine à états
+    # queued -> sending -> sent | queued (nouvelle tentative) | failed | expired.
+    # Utilisée depuis le thread paho (enqueue) et la boucle asyncio : accès
+    # protégés par un verrou.
+    def __init__(self, path, max_attempts=5, base_delay=30, max_delay=3600, expiry=21600):
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.expiry = expiry
+        self._lock = threading.Lock()
+        self.db = sqlite3.connect(path, check_same_thread=False)
+        self.db.row_factory = sqlite3.Row
+        self.db.execute("PRAGMA journal_mode=WAL")
+        self.db.execute("""CREATE TABLE IF NOT EXISTS outbound (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            number TEXT NOT NULL,
+            message TEXT NOT NULL,
+            state TEXT NOT NULL,
+            attempts INTEGER NOT NULL DEFAULT 0,
+            created_at REAL NOT NULL,
+            updated_at REAL NOT NULL,
+            next_attempt_at REAL NOT NULL,
+            last_error TEXT,
+            router TEXT,
+            pooled INTEGER NOT NULL DEFAULT 0,
+            response_topic TEXT,
+            correlation_data BLOB,
+            expires_at REAL,
+            batch TEXT
+        )""")
+        # Files créées par une version antérieure : colonnes ajoutées depuis
+        columns = {row[1] for row in self.db.execute("PRAGMA table_info(outbound)")}
+        for name, definition in (("router", "TEXT"), ("pooled", "INTEGER NOT NULL DEFAULT 0"),
+                                 ("response_topic", "TEXT"), ("correlation_data", "BLOB"), ("expires_at", "REAL"),
+                                 ("batch", "TEXT")):
+            if name not in columns:
+                self.db.execute(f"ALTER TABLE outbound ADD COLUMN {name} {definition}")
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbound_state_idx ON outbound (state)")
+        self.db.execute("CREATE INDEX IF NOT EXISTS outbound_batch_idx ON outbound (batch)")
+        self.db.commit()
+        # Seules les entrées antérieures à l'ouverture relèvent de la reprise
+        self.recovery_max_id = self.db.execute("SELECT COALESCE(MAX(id), 0) FROM outbound").fetchone()[0]
+
+    def _entry(self, row):
+        return dict(row) if row is not None else None
+
+    def get(self, entry_id):
+        with self._lock:
+            row = self.db.execute("SELECT * FROM outbound WHERE id = ?", (entry_id,)).fetchone()
+        return self._entry(row)
+
+    def enqueue(self, number, message, router=None, pooled=False, response_topic=None, correlation_data=None,
+                expires_at=None):
+        return self.enqueue_many([(number, message)], router, pooled, response_topic, correlation_data, expires_at)[0]
+
+    def enqueue_many(self, messages, router=None, pooled=False, response_topic=None, correlation_data=None,
+                     expires_at=None):
+        # messages : [(numéro, texte)] d'une même demande, écrits en une seule
+        # transaction ; à partir de deux, ils partagent un identifiant de lot.
+        # pooled : le routeur d'envoi est choisi (et peut changer) par le pool de SIM ;
+        # response_topic/correlation_data : demande MQTT v5 à laquelle répondre ;
+        # expires_at : échéance propre à la demande, en plus de l'expiration globale
+        now = time.time()
+        batch = None
+        if len(messages) > 1:
+            # Import différé : inutile au démarrage et pour les envois simples
+            import uuid
+            batch = uuid.uuid4().hex
+        with self._lock:
+            ids = [self.db.execute(
+                "INSERT INTO outbound (number, message, state, created_at, updated_at, next_attempt_at, router, pooled, "
+                "response_topic, correlation_data, expires_at, batch) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                (number, message, QUEUED, now, now, now, router, int(pooled), response_topic, correlation_data,
+                 expires_at, batch)).lastrowid for number, message in messages]
+            self.db.commit()
+            # Identifiants consécutifs : insertions sous le verrou
+            rows = self.db.execute("SELECT * FROM outbound WHERE id BETWEEN ? AND ? ORDER BY id",
+                                   (ids[0], ids[-1])).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def batch_entries(self, batch):
+        with self._lock:
+            rows = self.db.execute("SELECT * FROM outbound WHERE batch = ? ORDER BY id", (batch,)).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def _update(self, entry_id, **fields):
+        fields["updated_at"] = time.time()
+        assignments = ", ".join(f"{name} = ?" for name in fields)
+        with self._lock:
+            self.db.execute(f"UPDATE outbound SET {assignments} WHERE id = ?", (*fields.values(), entry_id))
+            self.db.commit()
+
+    def assign(self, entry, router):
+        # Routeur retenu par le pool (premier choix ou bascule après un échec)
+        entry["router"] = router
+        entry["next_attempt_at"] = time.time()
+        self._update(entry["id"], router=router, next_attempt_at=entry["next_attempt_at"])
+
+    def mark_sending(self, *entries):
+        # Destinataires d'une même requête au routeur : une seule transaction
+        now = time.time()
+        for entry in entries:
+            entry["attempts"] += 1
+            entry["state"] = SENDING
+        with self._lock:
+            self.db.executemany("UPDATE outbound SET state = ?, attempts = ?, updated_at = ? WHERE id = ?",
+                                [(SENDING, entry["attempts"], now, entry["id"]) for entry in entries])
+            self.db.commit()
+
+    def mark_sent(self, *entries):
+        now = time.time()
+        for entry in entries:
+            entry["state"] = SENT
+        with self._lock:
+            self.db.executemany("UPDATE outbound SET state = ?, last_error = NULL, updated_at = ? WHERE id = ?",
+                                [(SENT, now, entry["id"]) for entry in entries])
+            self.db.commit()
+
+    def mark_expired(self, entry):
+        entry["state"] = EXPIRED
+        self._update(entry["id"], state=EXPIRED)
+
+    def is_expired(self, entry):
+        now = time.time()
+        if entry.get("expires_at") is not None and now > entry["expires_at"]:
+            return True
+        return self.expiry > 0 and now - entry["created_at"] > self.expiry
+
+    def backoff(self, attempts):
+        # Backoff exponentiel avec jitter (moitié fixe, moitié aléatoire)
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay / 2 + random.uniform(0, delay / 2)
+
+    def mark_failed_attempt(self, entry, error):
+        # Retourne le délai avant la prochaine tentative, ou None si abandon
+        if entry["attempts"] >= self.max_attempts:
+            entry["state"] = FAILED
+            self._update(entry["id"], state=FAILED, last_error=error)
+            return None
+        delay = self.backoff(entry["attempts"])
+        entry["state"] = QUEUED
+        entry["next_attempt_at"] = time.time() + delay
+        self._update(entry["id"], state=QUEUED, last_error=error, next_attempt_at=entry["next_attempt_at"])
+        return delay
+
+    def recover(self):
+        # Au démarrage : un envoi resté "sending" a été interrompu, son issue
+        # est inconnue ; il est remis en file pour une nouvelle tentative
+        with self._lock:
+            self.db.execute("UPDATE outbound SET state = ? WHERE state = ? AND id <= ?",
+                            (QUEUED, SENDING, self.recovery_max_id))
+            self.db.commit()
+            rows = self.db.execute(
+                "SELECT * FROM outbound WHERE state = ? AND id <= ? ORDER BY next_attempt_at, id",
+                (QUEUED, self.recovery_max_id)).fetchall()
+        return [self._entry(row) for row in rows]
+
+    def purge(self, retention):
+        with self._lock:
+            placeholders = ", ".join("?" for _ in TERMINAL_STATES)
+            self.db.execute(f"DELETE FROM outbound WHERE state IN ({placeholders}) AND updated_at < ?",
+                            (*TERMINAL_STATES, time.time() - retention))
+            self.db.commit()
+
+    def counts(self):
+        with self._lock:
+            rows = self.db.execute("SELECT state, COUNT(*) FROM outbound GROUP BY state").fetchall()
+        return {state: count for state, count in rows}
+
+    def close(self):
+        with self._lock:
+            self.db.close()
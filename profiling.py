@@ -0,0 +1,128 @@
+import contextlib
+import io
+import json
+import logging
+import os
+import time
+
+# Outils de diagnostic activables à chaud (signaux) sans redémarrer :
+# profilage cProfile de la boucle asyncio et traces de durée (spans) des
+# requêtes au routeur, de l'analyse XML et des publications MQTT.
+
+NULL_SPAN = contextlib.nullcontext()
+
+
+class Profiler:
+    # Chaque bascule démarre une session cProfile ou l'arrête et écrit les
+    # statistiques (fichier .pstats pour snakeviz/pstats, résumé texte)
+    def __init__(self, directory, logger=None, top=40):
+        self.directory = directory
+        self.logger = logger or logging.getLogger("Profiler")
+        self.top = top
+        self.profile = None
+        self.started_at = None
+
+    @property
+    def active(self):
+        return self.profile is not None
+
+    def toggle(self):
+        return self.stop() if self.active else self.start()
+
+    def start(self):
+        # cProfile et pstats ne sont importés qu'au premier profilage : ils
+        # n'allongent pas le démarrage du bridge
+        import cProfile
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError as e:
+            # Un autre profileur est déjà actif sur ce thread
+            self.logger.error(f"Impossible de démarrer le profilage : {e}")
+            return
+        self.profile = profile
+        self.started_at = time.time()
+        self.logger.info("Profilage démarré (envoyer à nouveau le signal pour l'arrêter)")
+
+    def stop(self):
+        import pstats
+        profile, self.profile = self.profile, None
+        profile.disable()
+        duration = time.time() - self.started_at
+        base = os.path.join(self.directory, f"profile-{time.strftime('%Y%m%d-%H%M%S', time.localtime(self.started_at))}")
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            stats = pstats.Stats(profile)
+            stats.dump_stats(f"{base}.pstats")
+            summary = io.StringIO()
+            pstats.Stats(profile, stream=summary).sort_stats("cumulative").print_stats(self.top)
+            with open(f"{base}.txt", "w") as output:
+                output.write(summary.getvalue())
+        except Exception as e:
+            self.logger.error(f"Impossible d'écrire le profil : {e}")
+            return None
+        self.logger.info(f"Profilage arrêté après {duration:.1f} secondes, statistiques écrites dans {base}.pstats et {base}.txt")
+        return f"{base}.pstats"
+
+
+class StartupTimeline:
+    # Jalons du démarrage à froid, en secondes depuis le lancement du
+    # processus ; seule la première occurrence de chaque jalon compte
+    def __init__(self, origin):
+        self.origin = origin
+        self.marks = {}
+
+    def mark(self, name):
+        if name in self.marks:
+            return False
+        self.marks[name] = round(time.monotonic() - self.origin, 3)
+        return True
+
+    def summary(self):
+        return ", ".join(f"{name} {elapsed:.3f}s" for name, elapsed in self.marks.items())
+
+
+class Span:
+    __slots__ = ("tracer", "name", "fields", "started")
+
+    def __init__(self, tracer, name, fields):
+        self.tracer = tracer
+        self.name = name
+        self.fields = fields
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc is not None:
+            self.fields["error"] = type(exc).__name__
+        self.tracer.record(self.name, time.perf_counter() - self.started, **self.fields)
+        return False
+
+
+class Tracer:
+    # Une ligne JSON par opération : {"span": ..., "duration_ms": ..., champs}.
+    # Désactivé, span() renvoie un contexte vide partagé : coût négligeable
+    # sur les chemins critiques.
+    def __init__(self, logger=None, enabled=False, min_duration=0.0):
+        self.logger = logger or logging.getLogger("Tracer")
+        self.enabled = enabled
+        # Seuil (secondes) sous lequel les spans ne sont pas journalisés
+        self.min_duration = min_duration
+
+    def toggle(self):
+        self.enabled = not self.enabled
+        self.logger.info(f"Traces de durée {'activées' if self.enabled else 'désactivées'}")
+
+    def span(self, name, **fields):
+        if not self.enabled:
+            return NULL_SPAN
+        return Span(self, name, fields)
+
+    def record(self, name, duration, **fields):
+        if not self.enabled or duration < self.min_duration:
+            return
+        record = {"span": name, "duration_ms": round(duration * 1000, 3)}
+        record.update(fields)
+        self.logger.info(json.dumps(record, ensure_ascii=False, default=str))
@@ -0,0 +1,49 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    # Seau à jetons : `burst` envois immédiats possibles, puis un débit
+    # soutenu de `rate_per_minute` jetons par minute.
+    def __init__(self, rate_per_minute, burst=1, clock=time.monotonic):
+        if rate_per_minute <= 0:
+            raise ValueError(f"Débit invalide : {rate_per_minute}")
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1, burst)
+        self.clock = clock
+        self.tokens = float(self.capacity)
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def delay(self, count=1):
+        # Temps d'attente avant de pouvoir consommer `count` jetons. Une demande
+        # supérieure à la capacité n'attend qu'un seau plein et passe en négatif.
+        self._refill()
+        missing = min(count, self.capacity) - self.tokens
+        return max(0.0, missing / self.rate)
+
+    def drain_time(self, count):
+        # Temps nécessaire pour écouler `count` jetons au débit soutenu, sans
+        # le plafond de capacité appliqué par delay() (file d'attente entière)
+        self._refill()
+        return max(0.0, (count - self.tokens) / self.rate)
+
+    def try_acquire(self, count=1):
+        if self.delay(count) > 0:
+            return False
+        self.tokens -= count
+        return True
+
+    async def acquire(self, count=1):
+        waited = 0.0
+        while True:
+            wait = self.delay(count)
+            if wait <= 0:
+                self.tokens -= count
+                return waited
+            await asyncio.sleep(wait)
+            waited += wait
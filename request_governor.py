@@ -0,0 +1,168 @@
+import asyncio
+import time
+from collections import deque
+from rate_limit import TokenBucket
+
+# Files de priorité, de la plus prioritaire à la moins prioritaire
+SEND = "send"
+INBOX = "inbox"
+STATUS = "status"
+TELEMETRY = "telemetry"
+LANES = (SEND, INBOX, STATUS, TELEMETRY)
+# Relevés périodiques abandonnables sous charge : le suivant les remplace
+SHEDDABLE = (STATUS, TELEMETRY)
+
+# Requête -> file. Les tokens de session débloquent toutes les autres
+# requêtes : ils passent en tête, comme les envois.
+PATH_LANES = {
+    "/api/webserver/SesTokInfo": SEND,
+    "/api/sms/send-sms": SEND,
+    "/api/monitoring/check-notifications": INBOX,
+    "/api/sms/sms-count": INBOX,
+    "/api/sms/sms-list": INBOX,
+    "/api/sms/set-read": INBOX,
+    "/api/sms/send-status": INBOX,
+    "/api/monitoring/status": STATUS,
+    "/api/device/signal": TELEMETRY,
+    "/api/device/information": TELEMETRY,
+}
+
+
+def lane_for(path):
+    return PATH_LANES.get(path, STATUS)
+
+
+class RequestShedError(Exception):
+    pass
+
+
+class LaneStats:
+    def __init__(self):
+        self.granted = 0
+        self.shed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.last_wait = 0.0
+
+    def record(self, waited):
+        self.granted += 1
+        self.total_wait += waited
+        self.last_wait = waited
+        self.max_wait = max(self.max_wait, waited)
+
+
+class RequestGovernor:
+    # Point de passage unique des requêtes vers un routeur : au plus
+    # `max_concurrency` requêtes en cours et `rate_per_second` requêtes par
+    # seconde (0 : pas de limite de débit). Un créneau libéré revient
+    # toujours à la file la plus prioritaire en attente. Sous charge (file
+    # plus prioritaire en attente à l'arrivée, ou attente supérieure à
+    # `shed_wait`), les relevés des files `sheddable` (statut, signal et
+    # réseau) sont abandonnés (RequestShedError). Utilisé depuis la boucle asyncio.
+    def __init__(self, max_concurrency=2, rate_per_second=0.0, shed_wait=5.0, on_wait=None, on_shed=None,
+                 sheddable=SHEDDABLE):
+        self.max_concurrency = max(1, max_concurrency)
+        self.sheddable = sheddable
+        self.rate_per_second = rate_per_second
+        self.bucket = TokenBucket(rate_per_second * 60, self.max_concurrency) if rate_per_second > 0 else None
+        self.shed_wait = shed_wait
+        # on_wait(file, attente) à chaque créneau accordé, on_shed(file) à
+        # chaque requête abandonnée (métriques)
+        self.on_wait = on_wait
+        self.on_shed = on_shed
+        self.active = 0
+        self.waiters = {lane: deque() for lane in LANES}
+        self.lanes = {lane: LaneStats() for lane in LANES}
+        self._timer = None
+
+    def pressure(self, lane):
+        # Une file plus prioritaire attend déjà un créneau
+        return any(self.waiters[other] for other in LANES[:LANES.index(lane)])
+
+    async def acquire(self, lane):
+        if lane in self.sheddable and self.pressure(lane):
+            self.shed(lane)
+        if not any(self.waiters.values()) and self.active < self.max_concurrency and self._take_token():
+            self.active += 1
+            self._granted(lane, 0.0)
+            return
+        future = asyncio.get_running_loop().create_future()
+        waiter = (future, time.monotonic())
+        self.waiters[lane].append(waiter)
+        self._dispatch()
+        try:
+            if lane in self.sheddable and self.shed_wait:
+                await asyncio.wait_for(future, self.shed_wait)
+            else:
+                await future
+        except asyncio.TimeoutError:
+            self._forget(lane, waiter)
+            self.shed(lane)
+        except BaseException:
+            if future.done() and not future.cancelled():
+                # Créneau accordé pendant l'annulation : rendu aussitôt
+                self.release()
+            else:
+                self._forget(lane, waiter)
+            raise
+        self._granted(lane, time.monotonic() - waiter[1])
+
+    def release(self):
+        self.active -= 1
+        self._dispatch()
+
+    def shed(self, lane):
+        self.lanes[lane].shed += 1
+        if self.on_shed:
+            self.on_shed(lane)
+        raise RequestShedError(f"routeur saturé, requête {lane} abandonnée")
+
+    def _forget(self, lane, waiter):
+        # Attente abandonnée : le futur annulé peut déjà avoir été écarté par _dispatch
+        if waiter in self.waiters[lane]:
+            self.waiters[lane].remove(waiter)
+
+    def _granted(self, lane, waited):
+        self.lanes[lane].record(waited)
+        if self.on_wait:
+            self.on_wait(lane, waited)
+
+    def _take_token(self):
+        return self.bucket is None or self.bucket.try_acquire()
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def _dispatch(self):
+        while self.active < self.max_concurrency:
+            lane = next((lane for lane in LANES if self.waiters[lane]), None)
+            if lane is None:
+                return
+            future, _ = self.waiters[lane][0]
+            if future.done():
+                # Attente annulée (abandon, annulation) pas encore retirée par acquire
+                self.waiters[lane].popleft()
+                continue
+            if not self._take_token():
+                # Débit épuisé : réveil au prochain jeton
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(self.bucket.delay(), self._wake)
+                return
+            self.waiters[lane].popleft()
+            self.active += 1
+            future.set_result(None)
+
+    def stats(self):
+        stats = {"active": self.active, "max_concurrency": self.max_concurrency,
+                 "rate_per_second": self.rate_per_second, "lanes": {}}
+        for lane, lane_stats in self.lanes.items():
+            stats["lanes"][lane] = {
+                "waiting": len(self.waiters[lane]),
+                "granted": lane_stats.granted,
+                "shed": lane_stats.shed,
+                "avg_wait_ms": round(lane_stats.total_wait / lane_stats.granted * 1000, 1) if lane_stats.granted else 0.0,
+                "max_wait_ms": round(lane_stats.max_wait * 1000, 1),
+                "last_wait_ms": round(lane_stats.last_wait * 1000, 1),
+            }
+        return stats
@@ -0,0 +1,172 @@
+import asyncio
+import heapq
+import itertools
+import logging
+import random
+
+MISSED_SKIP = "skip"
+MISSED_CATCHUP = "catchup"
+
+
+class PeriodicJob:
+    def __init__(self, name, interval, func, jitter=0.0, missed=MISSED_SKIP):
+        if missed not in (MISSED_SKIP, MISSED_CATCHUP):
+            raise ValueError(f"Politique de tick manqué invalide : {missed}")
+        self.name = name
+        self.interval = interval
+        self.func = func
+        self.jitter = jitter
+        self.missed = missed
+        # Échéance théorique (grille sans jitter) de la prochaine exécution
+        self.scheduled = 0
+        self.task = None
+        self.triggered = False
+        self.runs = 0
+        self.errors = 0
+        self.skipped = 0
+        # Exécutions plus longues que la période
+        self.overruns = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        self.last_time = 0.0
+        self.last_lateness = 0.0
+        self.max_lateness = 0.0
+
+    def stats(self):
+        return {
+            "interval": self.interval,
+            "runs": self.runs,
+            "errors": self.errors,
+            "skipped": self.skipped,
+            "overruns": self.overruns,
+            "last_time": round(self.last_time, 4),
+            "avg_time": round(self.total_time / self.runs, 4) if self.runs else 0.0,
+            "max_time": round(self.max_time, 4),
+            "last_lateness": round(self.last_lateness, 4),
+            "max_lateness": round(self.max_lateness, 4),
+        }
+
+
+class Scheduler:
+    # Ordonnanceur à tas d'échéances : la boucle dort exactement jusqu'à la
+    # prochaine échéance au lieu de scruter l'horloge à intervalle fixe.
+    def __init__(self, logger=None, tracer=None):
+        self.logger = logger or logging.getLogger("Scheduler")
+        self.tracer = tracer
+        self.jobs = {}
+        self._heap = []
+        self._counter = itertools.count()
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+
+    def add_job(self, name, interval, func, jitter=0.0, missed=MISSED_SKIP, delay=0.0):
+        job = PeriodicJob(name, interval, func, jitter, missed)
+        self.jobs[name] = job
+        job.scheduled = self._now() + delay
+        self._push(job)
+        return job
+
+    def set_interval(self, name, interval):
+        # La nouvelle période s'applique à partir de la prochaine échéance
+        job = self.jobs[name]
+        if job.interval == interval:
+            return
+        previous = job.scheduled - job.interval
+        job.interval = interval
+        if job.task is None:
+            job.scheduled = max(self._now(), previous + interval)
+            self._push(job)
+
+    def trigger(self, name):
+        # Avance la prochaine exécution à maintenant (ou dès la fin de
+        # l'exécution en cours) ; la grille reprend ensuite depuis ce point
+        job = self.jobs[name]
+        if job.task is not None:
+            job.triggered = True
+            return
+        job.scheduled = self._now()
+        self._push(job, jitter=False)
+
+    def stats(self):
+        return {name: job.stats() for name, job in self.jobs.items()}
+
+    def stop(self):
+        self._stopped = True
+        self._wakeup.set()
+
+    def _now(self):
+        return asyncio.get_event_loop().time()
+
+    def _push(self, job, jitter=True):
+        # Les entrées périmées (job replanifié entre-temps) sont ignorées au dépilage
+        offset = random.uniform(0, job.jitter) if job.jitter and jitter else 0.0
+        heapq.heappush(self._heap, (job.scheduled + offset, next(self._counter), job, job.scheduled))
+        self._wakeup.set()
+
+    async def run(self):
+        try:
+            while not self._stopped:
+                self._wakeup.clear()
+                if not self._heap:
+                    await self._wakeup.wait()
+                    continue
+                deadline, _, job, scheduled = self._heap[0]
+                delay = deadline - self._now()
+                if delay > 0:
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                heapq.heappop(self._heap)
+                if scheduled != job.scheduled or job.task is not None:
+                    continue
+                self._start(job, deadline)
+        finally:
+            for job in self.jobs.values():
+                if job.task is not None:
+                    job.task.cancel()
+
+    def _start(self, job, deadline):
+        lateness = max(0.0, self._now() - deadline)
+        job.last_lateness = lateness
+        job.max_lateness = max(job.max_lateness, lateness)
+        job.task = asyncio.ensure_future(self._execute(job))
+
+    async def _execute(self, job):
+        started = self._now()
+        try:
+            await job.func()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            job.errors += 1
+            self.logger.error(f"Erreur dans la tâche planifiée '{job.name}' : {e}")
+        finally:
+            elapsed = self._now() - started
+            job.runs += 1
+            job.last_time = elapsed
+            job.total_time += elapsed
+            job.max_time = max(job.max_time, elapsed)
+            if elapsed > job.interval:
+                job.overruns += 1
+            job.task = None
+            if self.tracer:
+                self.tracer.record("job", elapsed, job=job.name, lateness_ms=round(job.last_lateness * 1000, 3))
+        self._reschedule(job)
+
+    def _reschedule(self, job):
+        now = self._now()
+        if job.triggered:
+            job.triggered = False
+            job.scheduled = now
+            self._push(job, jitter=False)
+            return
+        job.scheduled += job.interval
+        if job.scheduled <= now and job.missed == MISSED_SKIP:
+            # Ticks manqués abandonnés : on se recale sur la grille
+            missed = int((now - job.scheduled) // job.interval) + 1
+            job.skipped += missed
+            job.scheduled += missed * job.interval
+            self.logger.debug(f"Tâche '{job.name}' : {missed} tick(s) manqué(s) ignoré(s)")
+        self._push(job)
@@ -61,7 +61,7 @@ Description=Huawei SMS MQTT Bridge
 After=network.target
 
 [Service]
-ExecStart=/opt/huawei_sms_mqtt_bridge/venv/bin/python /opt/huawei_sms_mqtt_bridge/huawei_sms_mqtt_bridge.py
+ExecStart=/opt/huawei_sms_mqtt_bridge/venv/bin/python -m huawei_sms_mqtt_bridge
 WorkingDirectory=/opt/huawei_sms_mqtt_bridge
 User=$USER
 Group=$USER
@@ -0,0 +1,117 @@
+from field_changes import parse_number
+
+LEAST_LOADED = "least_loaded"
+WEIGHTED_ROUND_ROBIN = "weighted_round_robin"
+STRATEGIES = (LEAST_LOADED, WEIGHTED_ROUND_ROBIN)
+
+# Poids des derniers envois dans le taux d'échec (moyenne mobile exponentielle)
+FAILURE_ALPHA = 0.2
+# Un modem dégradé garde une part minimale du trafic pour que son état
+# puisse être réévalué
+MIN_HEALTH = 0.05
+
+# Plages (dBm) ramenées à une qualité 0..1 : RSRP en LTE, sinon RSSI
+SIGNAL_RANGES = (("rsrp", -120.0, -80.0), ("rssi", -110.0, -60.0))
+
+
+def signal_quality(signal_info):
+    for key, low, high in SIGNAL_RANGES:
+        value = parse_number(signal_info.get(key))
+        if value is not None:
+            return min(1.0, max(MIN_HEALTH, (value - low) / (high - low)))
+    return 1.0
+
+
+class PoolMember:
+    # Vue d'un modem pour la répartition : débit disponible (seau à jetons),
+    # segments en attente, disponibilité, qualité du signal et taux d'échec
+    def __init__(self, name, bucket, weight=1.0):
+        self.name = name
+        self.bucket = bucket
+        self.weight = weight
+        self.available = True
+        self.pending = 0
+        self.signal_quality = 1.0
+        self.failure_rate = 0.0
+        self.current_weight = 0.0
+        self.dispatched = 0
+        self.sent = 0
+        self.failed = 0
+
+    def health(self):
+        return max(MIN_HEALTH, (1.0 - self.failure_rate) * self.signal_quality)
+
+    def record(self, success):
+        if success:
+            self.sent += 1
+        else:
+            self.failed += 1
+        self.failure_rate += FAILURE_ALPHA * ((0.0 if success else 1.0) - self.failure_rate)
+
+    def stats(self):
+        return {
+            "available": self.available,
+            "weight": self.weight,
+            "pending": self.pending,
+            "signal_quality": round(self.signal_quality, 3),
+            "failure_rate": round(self.failure_rate, 3),
+            "dispatched": self.dispatched,
+            "sent": self.sent,
+            "failed": self.failed,
+        }
+
+
+class SimPool:
+    # Répartition des SMS sortants entre plusieurs modems.
+    # least_loaded : modem pouvant envoyer le plus tôt compte tenu de son débit
+    # et de sa file, pondéré par sa santé. weighted_round_robin : tourniquet
+    # pondéré lissé (poids configuré x santé).
+    def __init__(self, members, strategy=LEAST_LOADED):
+        if strategy not in STRATEGIES:
+            raise ValueError(f"Stratégie de répartition invalide : {strategy}")
+        self.members = list(members)
+        self.strategy = strategy
+        self._cursor = 0
+
+    def choose(self, segments=1, exclude=(), available_only=False):
+        candidates = [member for member in self.members if member.name not in exclude]
+        available = [member for member in candidates if member.available]
+        # Aucun modem disponible : on garde la file plutôt que de rejeter le SMS
+        candidates = available if available or available_only else candidates
+        if not candidates:
+            return None
+        if self.strategy == WEIGHTED_ROUND_ROBIN:
+            member = self._weighted_round_robin(candidates)
+        else:
+            member = self._least_loaded(candidates, segments)
+        member.dispatched += 1
+        return member
+
+    def _least_loaded(self, candidates, segments):
+        # À égalité, départage tournant pour ne pas favoriser le premier modem
+        self._cursor = (self._cursor + 1) % len(candidates)
+        count = len(candidates)
+
+        def cost(item):
+            position, member = item
+            health = member.health()
+            return (member.bucket.drain_time(member.pending + segments) / health,
+                    member.pending / health,
+                    (position - self._cursor) % count)
+
+        return min(enumerate(candidates), key=cost)[1]
+
+    def _weighted_round_robin(self, candidates):
+        total = 0.0
+        chosen = None
+        for member in candidates:
+            effective = member.weight * member.health()
+            member.current_weight += effective
+            total += effective
+            if chosen is None or member.current_weight > chosen.current_weight:
+                chosen = member
+        chosen.current_weight -= total
+        return chosen
+
+    def stats(self):
+        return {member.name: member.stats() for member in self.members}
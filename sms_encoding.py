@@ -0,0 +1,119 @@
+import unicodedata
+
+# Alphabet GSM 03.38 : table de base (1 septet) et table d'extension
+# (2 septets : caractère d'échappement + caractère)
+GSM_BASIC = frozenset(
+    "@£$¥èéùìòÇ\nØø\rÅåΔ_ΦΓΛΩΠΨΣΘΞÆæßÉ !\"#¤%&'()*+,-./0123456789:;<=>?"
+    "¡ABCDEFGHIJKLMNOPQRSTUVWXYZÄÖÑÜ§¿abcdefghijklmnopqrstuvwxyzäöñüà"
+)
+GSM_EXTENSION = frozenset("\f^{}\\[~]|€")
+ASCII_EXTENSION = "^{}\\[~]|\f"
+# Caractères ASCII absents de l'alphabet GSM (contrôles, accent grave)
+ASCII_NON_GSM = {code: None for code in range(128)
+                 if chr(code) not in GSM_BASIC and chr(code) not in GSM_EXTENSION}
+
+GSM7 = "GSM-7"
+UCS2 = "UCS-2"
+
+# Capacité d'un segment (SMS simple, puis SMS concaténé avec en-tête UDH)
+GSM7_SINGLE, GSM7_MULTI = 160, 153
+UCS2_SINGLE, UCS2_MULTI = 70, 67
+
+# Remplacements usuels pour rester dans l'alphabet GSM-7
+TRANSLITERATIONS = {
+    "‘": "'", "’": "'", "‚": "'", "‛": "'", "′": "'",
+    "“": '"', "”": '"', "„": '"', "‟": '"', "″": '"', "«": '"', "»": '"',
+    "–": "-", "—": "-", "‐": "-", "‑": "-", "−": "-",
+    "…": "...", "•": "-", "·": ".",
+    "\u00a0": " ", "\u2009": " ", "\u202f": " ", "\t": " ",
+    "œ": "oe", "Œ": "OE", "`": "'",
+}
+
+
+class SmsPlan:
+    def __init__(self, text, encoding, units, segments):
+        self.text = text
+        self.encoding = encoding
+        # Septets (GSM-7) ou unités UTF-16 (UCS-2)
+        self.units = units
+        self.segments = segments
+
+    def as_dict(self):
+        return {"encoding": self.encoding, "units": self.units, "segments": self.segments}
+
+
+def is_gsm7(text):
+    if text.isascii():
+        return len(text.translate(ASCII_NON_GSM)) == len(text)
+    return all(char in GSM_BASIC or char in GSM_EXTENSION for char in text)
+
+
+def character_count(text):
+    # Longueur telle que comptée par l'interface web HiLink (unités UTF-16)
+    return len(text.encode('utf-16-le')) // 2
+
+
+def _gsm7_segments(text, septets):
+    if septets <= GSM7_SINGLE:
+        return 1
+    if septets == len(text):
+        return -(-septets // GSM7_MULTI)
+    # Un caractère d'extension ne peut pas être coupé entre deux segments
+    segments, used = 1, 0
+    for char in text:
+        width = 2 if char in GSM_EXTENSION else 1
+        if used + width > GSM7_MULTI:
+            segments += 1
+            used = 0
+        used += width
+    return segments
+
+
+def _ucs2_segments(text, units):
+    if units <= UCS2_SINGLE:
+        return 1
+    if units == len(text):
+        return -(-units // UCS2_MULTI)
+    # Une paire de substitution UTF-16 ne peut pas être coupée entre deux segments
+    segments, used = 1, 0
+    for char in text:
+        width = 2 if ord(char) > 0xFFFF else 1
+        if used + width > UCS2_MULTI:
+            segments += 1
+            used = 0
+        used += width
+    return segments
+
+
+def transliterate(text):
+    result = []
+    for char in text:
+        if char in GSM_BASIC or char in GSM_EXTENSION:
+            result.append(char)
+        elif char in TRANSLITERATIONS:
+            result.append(TRANSLITERATIONS[char])
+        else:
+            # Lettres accentuées : forme décomposée sans les diacritiques
+            decomposed = "".join(c for c in unicodedata.normalize("NFKD", char)
+                                 if not unicodedata.combining(c))
+            if decomposed and all(c in GSM_BASIC or c in GSM_EXTENSION for c in decomposed):
+                result.append(decomposed)
+            else:
+                result.append(char)
+    return "".join(result)
+
+
+def plan(text, allow_transliteration=False):
+    if allow_transliteration and not is_gsm7(text):
+        candidate = transliterate(text)
+        # On ne garde la translittération que si elle évite l'UCS-2
+        if is_gsm7(candidate):
+            text = candidate
+    if text.isascii() and len(text.translate(ASCII_NON_GSM)) == len(text):
+        septets = len(text) + sum(text.count(char) for char in ASCII_EXTENSION)
+        return SmsPlan(text, GSM7, septets, _gsm7_segments(text, septets))
+    if is_gsm7(text):
+        septets = len(text) + sum(1 for char in text if char in GSM_EXTENSION)
+        return SmsPlan(text, GSM7, septets, _gsm7_segments(text, septets))
+    units = character_count(text)
+    return SmsPlan(text, UCS2, units, _ucs2_segments(text, units))
@@ -0,0 +1,55 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hilink_xml import HiLinkError  # noqa: E402
+from huawei_sms_mqtt_bridge import HuaweiSMSMQTTBridge  # noqa: E402
+
+
+class DeliveryTrackingTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.environ = dict(os.environ)
+        os.environ.update(MQTT_TOPIC="huawei", MQTT_IP="127.0.0.1", CLIENTID="test", MQTT_ACCOUNT="user",
+                          MQTT_PASSWORD="secret", HUAWEI_ROUTERS="sim1=127.0.0.1:1", DELIVERY_TRACKING="true",
+                          SEND_STATUS_INTERVAL="0.01",
+                          STATE_DIR=self.state_dir.name, DEBUG_LEVEL="CRITICAL")
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.state_dir.cleanup()
+
+    async def test_send_status_unsupported(self):
+        # Firmware sans send-status (100002) : une seule interrogation, puis
+        # seuls les accusés de réception concluent
+        bridge = HuaweiSMSMQTTBridge()
+        worker = bridge.routers[0]
+        requests = []
+
+        async def request(path, data=None):
+            requests.append(path)
+            raise HiLinkError("100002")
+
+        worker.session.request = request
+        follow = asyncio.create_task(worker.follow_deliveries())
+        try:
+            for number in ("+33600000001", "+33600000002", "+33600000003"):
+                worker.delivery.track([{"id": number, "number": number}])
+                await asyncio.sleep(0.05)
+            self.assertEqual(requests, ["/api/sms/send-status"])
+            self.assertFalse(worker.send_status_supported)
+            self.assertEqual(worker.delivery.stats()["awaiting_report"], 3)
+        finally:
+            bridge.running = False
+            follow.cancel()
+            await asyncio.gather(follow, return_exceptions=True)
+            worker.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,126 @@
+import asyncio
+import os
+import random
+import sys
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from request_governor import RequestGovernor, RequestShedError  # noqa: E402
+
+
+class RequestGovernorTest(unittest.IsolatedAsyncioTestCase):
+    async def test_priority_order(self):
+        governor = RequestGovernor(1, shed_wait=0)
+        await governor.acquire("send")
+        order = []
+
+        async def request(lane):
+            await governor.acquire(lane)
+            order.append(lane)
+            governor.release()
+
+        tasks = [asyncio.create_task(request(lane)) for lane in ("telemetry", "status", "inbox", "send")]
+        await asyncio.sleep(0)
+        governor.release()
+        await asyncio.gather(*tasks)
+        self.assertEqual(order, ["send", "inbox", "status", "telemetry"])
+        self.assertEqual(governor.active, 0)
+
+    async def test_shed_on_pressure(self):
+        governor = RequestGovernor(1)
+        await governor.acquire("telemetry")
+        send = asyncio.create_task(governor.acquire("send"))
+        await asyncio.sleep(0)
+        with self.assertRaises(RequestShedError):
+            await governor.acquire("status")
+        governor.release()
+        await send
+        governor.release()
+        self.assertEqual(governor.active, 0)
+        self.assertEqual(governor.stats()["lanes"]["status"]["shed"], 1)
+
+    async def test_no_shedding(self):
+        governor = RequestGovernor(1, shed_wait=0, sheddable=())
+        await governor.acquire("telemetry")
+        send = asyncio.create_task(governor.acquire("send"))
+        await asyncio.sleep(0)
+        status = asyncio.create_task(governor.acquire("status"))
+        await asyncio.sleep(0)
+        governor.release()
+        await send
+        governor.release()
+        await status
+        governor.release()
+        self.assertEqual(governor.active, 0)
+        self.assertEqual(governor.stats()["lanes"]["status"]["shed"], 0)
+
+    async def test_shed_after_wait(self):
+        governor = RequestGovernor(1, shed_wait=0.05)
+        await governor.acquire("inbox")
+        with self.assertRaises(RequestShedError):
+            await governor.acquire("telemetry")
+        self.assertEqual(len(governor.waiters["telemetry"]), 0)
+        governor.release()
+        self.assertEqual(governor.active, 0)
+
+    async def test_release_while_waiter_cancelled(self):
+        # Futur annulé (abandon ou annulation) encore en file au moment d'un
+        # release : le créneau ne doit pas lui être attribué
+        for lane in ("telemetry", "inbox"):
+            governor = RequestGovernor(1, shed_wait=0.05)
+            await governor.acquire("send")
+            waiter = asyncio.create_task(governor.acquire(lane))
+            await asyncio.sleep(0)
+            governor.waiters[lane][0][0].cancel()
+            governor.release()
+            results = await asyncio.gather(waiter, return_exceptions=True)
+            self.assertIsInstance(results[0], asyncio.CancelledError)
+            self.assertEqual(governor.active, 0)
+            self.assertEqual(len(governor.waiters[lane]), 0)
+            await governor.acquire("send")
+            governor.release()
+            self.assertEqual(governor.active, 0)
+
+    async def test_cancel_after_grant(self):
+        # Créneau accordé puis tâche annulée avant sa reprise : créneau rendu
+        governor = RequestGovernor(1)
+        await governor.acquire("send")
+        waiter = asyncio.create_task(governor.acquire("inbox"))
+        await asyncio.sleep(0)
+        governor.release()
+        self.assertEqual(governor.active, 1)
+        waiter.cancel()
+        await asyncio.gather(waiter, return_exceptions=True)
+        self.assertEqual(governor.active, 0)
+
+    async def test_random_interleavings(self):
+        rng = random.Random(1)
+        governor = RequestGovernor(1, shed_wait=0.01)
+
+        async def request(lane):
+            try:
+                await governor.acquire(lane)
+            except RequestShedError:
+                return
+            try:
+                await asyncio.sleep(rng.choice((0, 0.005, 0.01)))
+            finally:
+                governor.release()
+
+        tasks = [asyncio.create_task(request(rng.choice(("send", "inbox", "status", "telemetry"))))
+                 for _ in range(200)]
+        for task in tasks:
+            if rng.random() < 0.2:
+                await asyncio.sleep(rng.choice((0, 0.005)))
+                task.cancel()
+        results = await asyncio.gather(*tasks, return_exceptions=True)
+        unexpected = [result for result in results
+                      if isinstance(result, BaseException) and not isinstance(result, asyncio.CancelledError)]
+        self.assertEqual(unexpected, [])
+        self.assertEqual(governor.active, 0)
+        self.assertFalse(any(governor.waiters.values()))
+
+
+if __name__ == "__main__":
+    unittest.main()
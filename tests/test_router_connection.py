@@ -0,0 +1,51 @@
+import asyncio
+import os
+import sys
+import tempfile
+import unittest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+from fake_hilink import FakeHiLinkServer  # noqa: E402
+from huawei_sms_mqtt_bridge import HuaweiSMSMQTTBridge  # noqa: E402
+
+
+class RouterConnectionTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.router = FakeHiLinkServer().start()
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.environ = dict(os.environ)
+        os.environ.update(MQTT_TOPIC="huawei", MQTT_IP="127.0.0.1", CLIENTID="test", MQTT_ACCOUNT="user",
+                          MQTT_PASSWORD="secret", HUAWEI_ROUTERS=f"sim1={self.router.address}",
+                          STATE_DIR=self.state_dir.name, DEBUG_LEVEL="CRITICAL")
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.state_dir.cleanup()
+        self.router.stop()
+
+    async def test_check_keeps_cached_tokens(self):
+        # Vérification périodique, circuit fermé : les tokens en cache sont
+        # réutilisés, SesTokInfo n'est relu qu'à l'ouverture de la session
+        bridge = HuaweiSMSMQTTBridge()
+        bridge.router_check_interval = 0.05
+        worker = bridge.routers[0]
+        try:
+            await worker.get_session_token()
+            check = asyncio.create_task(worker.check_router_connection())
+            await asyncio.sleep(0.4)
+            bridge.running = False
+            check.cancel()
+            await asyncio.gather(check, return_exceptions=True)
+            requests = self.router.state.requests
+            self.assertEqual(requests.get("/api/webserver/SesTokInfo"), 1)
+            self.assertGreater(requests.get("/api/monitoring/status", 0), 1)
+        finally:
+            worker.close()
+
+
+if __name__ == "__main__":
+    unittest.main()
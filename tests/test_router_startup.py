@@ -0,0 +1,39 @@
+import os
+import sys
+import tempfile
+import unittest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from huawei_sms_mqtt_bridge import HuaweiSMSMQTTBridge  # noqa: E402
+
+
+class RouterStartupTest(unittest.IsolatedAsyncioTestCase):
+    def setUp(self):
+        self.state_dir = tempfile.TemporaryDirectory()
+        self.environ = dict(os.environ)
+        os.environ.update(MQTT_TOPIC="huawei", MQTT_IP="127.0.0.1", CLIENTID="test", MQTT_ACCOUNT="user",
+                          MQTT_PASSWORD="secret", HUAWEI_ROUTERS="sim1=127.0.0.1:1", ROUTER_TIMEOUT="1",
+                          STATE_DIR=self.state_dir.name, DEBUG_LEVEL="CRITICAL")
+
+    def tearDown(self):
+        os.environ.clear()
+        os.environ.update(self.environ)
+        self.state_dir.cleanup()
+
+    async def test_router_down_before_mqtt_client(self):
+        # Routeur injoignable au démarrage : le circuit s'ouvre avant la
+        # création du client MQTT, sans arrêter le bridge
+        bridge = HuaweiSMSMQTTBridge()
+        router = bridge.routers[0]
+        try:
+            self.assertIsNone(bridge.mqtt_client)
+            await bridge.open_router_sessions()
+            self.assertFalse(router.breaker.closed)
+            self.assertFalse(router.router_connected)
+        finally:
+            router.close()
+
+
+if __name__ == "__main__":
+    unittest.main()